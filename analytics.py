@@ -0,0 +1,89 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+# Defaults of networkx.pagerank
+PAGERANK_ALPHA = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOL = 1e-06
+
+
+def adjacency_matrix(node_count, sources, targets, weights, directed=True):
+    """
+    Weighted adjacency matrix of a graph as CSR. Undirected edges are set in both directions and self-loops once,
+    like networkx.to_scipy_sparse_array.
+    """
+    matrix = sparse.csr_matrix((np.asarray(weights, dtype=np.int64), (np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))),
+                               shape=(node_count, node_count))
+    if not directed:
+        matrix = (matrix + matrix.T - sparse.diags(matrix.diagonal(), dtype=matrix.dtype)).tocsr()
+    matrix.sort_indices()
+    return matrix
+
+def pagerank(matrix, alpha=PAGERANK_ALPHA, max_iter=PAGERANK_MAX_ITER, tol=PAGERANK_TOL):
+    """
+    Weighted PageRank by power iteration, the same iteration as networkx.pagerank: dangling nodes spread their rank
+    evenly and it stops once the scores change by less than node count * tol. Returns (scores, converged).
+    """
+    node_count = matrix.shape[0]
+    if node_count == 0:
+        return np.empty(0), True
+    out_weights = np.asarray(matrix.sum(axis=1), dtype=float).ravel()
+    dangling = out_weights == 0
+    inverse = np.divide(1.0, out_weights, out=np.zeros(node_count), where=~dangling)
+    # scores @ transition matrix, as a product of the transposed matrix with the scores
+    transposed = (sparse.diags(inverse) @ matrix.astype(float)).T.tocsr()
+    scores = np.full(node_count, 1.0 / node_count)
+    for _ in range(max_iter):
+        previous = scores
+        scores = alpha * (transposed @ previous + previous[dangling].sum() / node_count) + (1 - alpha) / node_count
+        if np.abs(scores - previous).sum() < node_count * tol:
+            return scores, True
+    return scores, False
+
+def degrees(matrix, directed=True):
+    """
+    {name: array} of the degrees of every node, edge counts and weights. Directed graphs have in and out degrees,
+    self-loops of undirected graphs count twice as in networkx.
+    """
+    if directed:
+        return {
+            "inDegree": np.bincount(matrix.indices, minlength=matrix.shape[0]),
+            "outDegree": np.diff(matrix.indptr),
+            "weightedInDegree": np.asarray(matrix.sum(axis=0)).ravel(),
+            "weightedOutDegree": np.asarray(matrix.sum(axis=1)).ravel()
+        }
+    diagonal = matrix.diagonal()
+    return {"degree": np.diff(matrix.indptr) + (diagonal != 0), "weightedDegree": np.asarray(matrix.sum(axis=1)).ravel() + diagonal}
+
+def components(matrix, directed=True):
+    """
+    Connected components, weakly connected ones for a directed graph. Returns (component of every node, size of every
+    component), components are numbered by decreasing size and then by their first node.
+    """
+    node_count = matrix.shape[0]
+    count, labels = csgraph.connected_components(matrix, directed=directed, connection="weak")
+    sizes = np.bincount(labels, minlength=count)
+    first_nodes = np.full(count, node_count)
+    np.minimum.at(first_nodes, labels, np.arange(node_count))
+    order = np.lexsort((first_nodes, -sizes))
+    numbers = np.empty(count, dtype=np.int64)
+    numbers[order] = np.arange(count)
+    return numbers[labels], sizes[order]
+
+def graph_metrics(node_count, sources, targets, weights, directed=True):
+    """
+    PageRank, degrees and components of a graph given as edge arrays. Returns {name: array over the nodes} and
+    {"componentSizes", "pagerankConverged"}.
+    """
+    matrix = adjacency_matrix(node_count, sources, targets, weights, directed)
+    scores, converged = pagerank(matrix)
+    component, component_sizes = components(matrix, directed)
+    node_metrics = {"pagerank": scores, **degrees(matrix, directed), "component": component}
+    return node_metrics, {"componentSizes": component_sizes, "pagerankConverged": converged}
+
+def ranking(keys, top_k):
+    """
+    Indexes of the top_k largest values, sorted by the first key, then the next ones, then by node.
+    """
+    return np.lexsort((np.arange(len(keys[0])), *(-np.asarray(key) for key in reversed(keys))))[:top_k]
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+
+INDEX_VERSION = 1
+
+
+def index_path(index_dir, file_path):
+    source = os.path.abspath(file_path)
+    key = hashlib.sha1(source.encode()).hexdigest()[:16]
+    return os.path.join(index_dir, f"{os.path.basename(file_path)}-{key}.json")
+
+def source_info(file_path, chunk_bytes):
+    stat = os.stat(file_path)
+    return {
+        "version": INDEX_VERSION,
+        "source": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_bytes": chunk_bytes
+    }
+
+def write_index(path, info, blocks, chunk_rows):
+    """
+    Write the index of a file. chunk_rows yields (first block, last block, rows) for consecutive chunks of blocks,
+    rows being the (day ordinal, lowercase hashtags) of the tweets that start inside the chunk. Each chunk keeps
+    its date range, and every hashtag the list of chunks where it appears.
+    """
+    chunks = []
+    hashtags = {}
+    for chunk_id, (first_block, last_block, rows) in enumerate(chunk_rows):
+        first_day = last_day = None
+        for day, tweet_hashtags in rows:
+            if first_day is None or day < first_day:
+                first_day = day
+            if last_day is None or day > last_day:
+                last_day = day
+            for hashtag in tweet_hashtags:
+                chunk_ids = hashtags.setdefault(hashtag, [])
+                if not chunk_ids or chunk_ids[-1] != chunk_id:
+                    chunk_ids.append(chunk_id)
+        chunks.append([first_block, last_block, first_day, last_day])
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump({"info": info, "blocks": blocks, "chunks": chunks, "hashtags": hashtags}, file)
+    os.replace(temporary_path, path)
+
+def read_index(path, file_path):
+    """
+    Return the index of file_path, or None if there is none or the file changed since it was built.
+    """
+    try:
+        with open(path) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(file_path)
+    info = index["info"]
+    if info["version"] != INDEX_VERSION or info["size"] != stat.st_size or info["mtime_ns"] != stat.st_mtime_ns:
+        return None
+    index["blocks"] = [tuple(block) for block in index["blocks"]]
+    return index
+
+def matching_chunks(index, start_day, end_day, hashtags):
+    """
+    Ids of the chunks that may hold tweets between the two day ordinals (inclusive) with one of the hashtags.
+    """
+    chunk_ids = {chunk_id for chunk_id, (_, _, first_day, last_day) in enumerate(index["chunks"])
+                 if first_day is not None and first_day <= end_day and last_day >= start_day}
+    if hashtags:
+        tagged = set()
+        for hashtag in hashtags:
+            tagged.update(index["hashtags"].get(hashtag, ()))
+        chunk_ids &= tagged
+    return sorted(chunk_ids)
+
+def block_ranges(index, chunk_ids, first_block=0, last_block=None):
+    """
+    Merge the matching chunks into (first block, last block) ranges, clipped to the blocks first_block..last_block.
+    """
+    if last_block is None:
+        last_block = len(index["blocks"]) - 1
+    ranges = []
+    for chunk_id in chunk_ids:
+        chunk_first, chunk_last = index["chunks"][chunk_id][:2]
+        chunk_first, chunk_last = max(chunk_first, first_block), min(chunk_last, last_block)
+        if chunk_first > chunk_last:
+            continue
+        if ranges and ranges[-1][1] + 1 == chunk_first:
+            ranges[-1][1] = chunk_last
+        else:
+            ranges.append([chunk_first, chunk_last])
+    return [tuple(block_range) for block_range in ranges]
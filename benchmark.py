@@ -0,0 +1,610 @@
+import os
+import gc
+import sys
+import bz2
+import json
+import pickle
+import time
+import random
+import resource
+import shlex
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import multiprocessing
+from array import array
+from collections import Counter
+import networkx as nx
+import bz2_blocks
+import profiling
+import writers
+import generadorp
+import decoders
+import sketches
+import analytics
+import synthetic_corpus
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_FLAGS = ["-grt", "-jrt", "-gm", "-jm", "-gcrt", "-jcrt"]
+
+
+def time_lines(lines):
+    """
+    Consume an iterator of lines, returns (seconds, line count, characters read).
+    """
+    start_time = time.perf_counter()
+    line_count = 0
+    byte_count = 0
+    for line in lines:
+        line_count += 1
+        byte_count += len(line)
+    return time.perf_counter() - start_time, line_count, byte_count
+
+def print_result(name, seconds, line_count, byte_count, baseline=None):
+    speedup = f" x{baseline / seconds:.2f}" if baseline else ""
+    print(f"{name:<24} {seconds:8.3f}s {line_count / seconds:12.0f} lines/s {byte_count / seconds / 1e6:8.1f} MB/s{speedup}")
+
+def read_single_stream(file_path):
+    with bz2.open(file_path, "rt") as f:
+        yield from f
+
+def benchmark_bz2(args):
+    for file_path in args.files:
+        print(f"{file_path} ({os.path.getsize(file_path) / 1e6:.1f} MB compressed)")
+        seconds, line_count, byte_count = time_lines(read_single_stream(file_path))
+        print_result("single stream", seconds, line_count, byte_count)
+        baseline = seconds
+        for processes in args.processes:
+            seconds, parallel_count, byte_count = time_lines(bz2_blocks.read_lines_parallel(file_path, processes))
+            if parallel_count != line_count:
+                print(f"line count mismatch: {parallel_count} != {line_count}")
+            print_result(f"block pool ({processes} procs)", seconds, parallel_count, byte_count, baseline)
+
+def measure_in_child(function, *args):
+    """
+    Run function in a forked process, returns (seconds, peak RSS growth in MB) so every writer starts from the same memory.
+    """
+    def child(queue):
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start_time = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - start_time
+        queue.put((seconds, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024))
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=child, args=(queue,))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def synthetic_graph(node_count, edge_count, seed=0):
+    """
+    Names and edge arrays with a skewed degree distribution, like the aggregates of generadorp.py.
+    """
+    rng = random.Random(seed)
+    names = [f"user{index}" for index in range(node_count)]
+    edges = {}
+    while len(edges) < edge_count:
+        source = min(int(rng.paretovariate(0.8)), node_count) - 1
+        target = rng.randrange(node_count)
+        if source != target:
+            edges[(source, target)] = edges.get((source, target), 0) + rng.randint(1, 5)
+    return names, array("i", [source for source, _ in edges]), array("i", [target for _, target in edges]), array("q", edges.values())
+
+def synthetic_mentions(names, edge_count, seed=0):
+    rng = random.Random(seed)
+    users = {}
+    for _ in range(edge_count):
+        mentioned_user = names[min(int(rng.paretovariate(0.8)), len(names)) - 1]
+        user_data = users.setdefault(mentioned_user, {"username": mentioned_user, "receivedMentions": 0, "mentions": {}})
+        user_data["mentions"].setdefault(rng.choice(names), []).append(str(rng.getrandbits(60)))
+        user_data["receivedMentions"] += 1
+    return {"mentions": [{"username": user_data["username"], "receivedMentions": user_data["receivedMentions"],
+                          "mentions": [{"mentionBy": name, "tweets": tweets} for name, tweets in user_data["mentions"].items()]}
+                         for user_data in users.values()]}
+
+def write_networkx_gexf(graph_arrays, output_path):
+    names, sources, targets, weights = graph_arrays
+    graph = nx.DiGraph()
+    graph.add_nodes_from(names)
+    graph.add_weighted_edges_from((names[source], names[target], weight) for source, target, weight in zip(sources, targets, weights))
+    nx.write_gexf(graph, output_path)
+
+def write_streaming_gexf(graph_arrays, output_path, compact=False, compression=None):
+    file, _ = writers.open_output(output_path, compression)
+    with file:
+        writers.write_gexf(file, *graph_arrays, directed=True, compact=compact)
+
+def write_json_dump(data, output_path):
+    with open(output_path, "w") as file:
+        json.dump(data, file, indent=4)
+
+def write_streaming_json(data, output_path, compact=False, compression=None):
+    file, _ = writers.open_output(output_path, compression)
+    with file:
+        (key, items), = data.items()
+        writers.write_json_list(file, key, items, compact)
+
+def benchmark_writers(args):
+    graph_arrays = synthetic_graph(args.nodes, args.edges)
+    mentions = synthetic_mentions(graph_arrays[0], args.edges)
+    print(f"graph with {args.nodes} nodes and {len(graph_arrays[1])} edges, mention JSON with {args.edges} mentions")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, function, data, extension, kwargs in [
+            ("networkx write_gexf", write_networkx_gexf, graph_arrays, ".gexf", {}),
+            ("streaming gexf", write_streaming_gexf, graph_arrays, ".gexf", {}),
+            ("streaming gexf compact", write_streaming_gexf, graph_arrays, ".gexf", {"compact": True}),
+            ("streaming gexf gzip", write_streaming_gexf, graph_arrays, ".gexf", {"compression": "gzip"}),
+            ("json.dump indent=4", write_json_dump, mentions, ".json", {}),
+            ("streaming json", write_streaming_json, mentions, ".json", {}),
+            ("streaming json compact", write_streaming_json, mentions, ".json", {"compact": True}),
+            ("streaming json gzip", write_streaming_json, mentions, ".json", {"compression": "gzip"}),
+        ]:
+            output_path = os.path.join(directory, name.replace(" ", "_") + extension)
+            seconds, peak_rss = measure_in_child(lambda: function(data, output_path, **kwargs))
+            written = sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory) if file.startswith(name.replace(" ", "_")))
+            print(f"{name:<24} {seconds:8.3f}s peak RSS +{peak_rss:8.1f} MB {written / 1e6:8.1f} MB written")
+
+def legacy_update_retweet_json_data(retweets_data, user_screen_name, original_tweet_id, original_user_screen_name):
+    """
+    List based bookkeeping used before, kept to compare against.
+    """
+    if original_user_screen_name not in retweets_data:
+        retweets_data[original_user_screen_name] = {'username': original_user_screen_name, "receivedRetweets": 0, "tweets": {}}
+    tweets = retweets_data[original_user_screen_name]["tweets"]
+    if original_tweet_id not in tweets:
+        tweets[original_tweet_id] = {"retweetedBy": []}
+    if user_screen_name not in tweets[original_tweet_id]["retweetedBy"]:
+        tweets[original_tweet_id]["retweetedBy"].append(user_screen_name)
+        retweets_data[original_user_screen_name]["receivedRetweets"] += 1
+
+def legacy_update_mention_json_data(mentions_data, user_screen_name, mentioned_user, tweet_id):
+    if mentioned_user not in mentions_data:
+        mentions_data[mentioned_user] = {"username": mentioned_user, "receivedMentions": 0, "mentions": []}
+    for mention in mentions_data[mentioned_user]["mentions"]:
+        if mention["mentionBy"] == user_screen_name:
+            mention["tweets"].append(tweet_id)
+            break
+    else:
+        mentions_data[mentioned_user]["mentions"].append({"mentionBy": user_screen_name, "tweets": [tweet_id]})
+    mentions_data[mentioned_user]["receivedMentions"] += 1
+
+def legacy_retweet_json(records):
+    retweets_data = {}
+    for record in records:
+        if record.retweeted:
+            legacy_update_retweet_json_data(retweets_data, record.user, record.original_tweet_id, record.author)
+    return {'retweets': sorted(retweets_data.values(), key=lambda x: x['receivedRetweets'], reverse=True)}
+
+def legacy_mention_json(records):
+    mentions_data = {}
+    for record in records:
+        if not record.retweeted and record.user:
+            for mentioned_user in record.mentions:
+                legacy_update_mention_json_data(mentions_data, record.user, mentioned_user, record.tweet_id)
+    return {'mentions': sorted(mentions_data.values(), key=lambda x: x['receivedMentions'], reverse=True)}
+
+def indexed_json(records, name, build):
+    aggregates = generadorp.new_aggregates([name])
+    for record in records:
+        generadorp.update_aggregates(aggregates, record)
+    return build(aggregates[name], aggregates["symbols"])
+
+def heavy_hitter_records(record_count, user_count, heavy_hitters, seed=0):
+    """
+    Half retweets and half tweets with mentions, most of them aimed at a few heavy hitter accounts.
+    """
+    rng = random.Random(seed)
+    records = []
+    for index in range(record_count):
+        user = f"user{rng.randrange(user_count)}"
+        target = f"star{rng.randrange(heavy_hitters)}" if rng.random() < 0.8 else f"user{rng.randrange(user_count)}"
+        if index % 2:
+            records.append(generadorp.TweetRecord(str(index), user, True, target, f"{target}-{rng.randrange(20)}", (), index))
+        else:
+            records.append(generadorp.TweetRecord(str(index), user, False, None, None, (target,), index))
+    return records
+
+def benchmark_builders(args):
+    records = heavy_hitter_records(args.records, args.users, args.heavy_hitters)
+    print(f"{args.records} records, {args.users} users, {args.heavy_hitters} heavy hitters")
+    for name, legacy, update, build in [
+        ("retweet JSON", legacy_retweet_json, "retweet_json", generadorp.build_retweet_json),
+        ("mention JSON", legacy_mention_json, "mention_json", generadorp.build_mention_json),
+    ]:
+        start_time = time.perf_counter()
+        legacy_output = legacy(records)
+        legacy_seconds = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        indexed_output = indexed_json(records, update, build)
+        indexed_seconds = time.perf_counter() - start_time
+        same = json.dumps(legacy_output) == json.dumps(indexed_output)
+        print(f"{name:<14} list scan {legacy_seconds:8.3f}s indexed {indexed_seconds:8.3f}s x{legacy_seconds / indexed_seconds:.1f} identical output: {same}")
+
+def read_lines(file_paths, line_limit=None):
+    lines = []
+    for file_path in file_paths:
+        with bz2.open(file_path, "rt") as f:
+            for line in f:
+                if line_limit is not None and len(lines) >= line_limit:
+                    return lines
+                lines.append(line.strip())
+    return lines
+
+def iter_records(lines, decode):
+    """
+    Decode every line and extract its record, as process_line and process_lines do without the filters.
+    """
+    for line in lines:
+        try:
+            tweet = decode(line)
+        except ValueError:
+            continue
+        if tweet.get("created_at"):
+            yield generadorp.extract_record(tweet)
+
+def decode_records(lines, decode):
+    return list(iter_records(lines, decode))
+
+def benchmark_decoders(args):
+    lines = read_lines(args.files, args.lines)
+    byte_count = sum(len(line) for line in lines)
+    print(f"{len(lines)} lines from {len(args.files)} files, decoded in memory")
+    baseline = None
+    expected = None
+    for name in args.decoders or decoders.available_decoders()[::-1]:
+        try:
+            _, decode = decoders.get_decoder(name)
+        except ImportError:
+            print(f"{name:<24} not installed")
+            continue
+        start_time = time.perf_counter()
+        records = decode_records(lines, decode)
+        seconds = time.perf_counter() - start_time
+        print_result(name, seconds, len(lines), byte_count, baseline)
+        if baseline is None:
+            baseline, expected = seconds, records
+        elif records != expected:
+            print(f"{name} records differ from {args.decoders[0] if args.decoders else 'json'}")
+
+def string_graph_node(graph_data, name):
+    node_id = graph_data["index"].get(name)
+    if node_id is None:
+        node_id = graph_data["index"][name] = len(graph_data["names"])
+        graph_data["names"].append(name)
+    return node_id
+
+def string_graph_edge(graph_data, source, target):
+    generadorp.add_edge_ids(graph_data, string_graph_node(graph_data, source), string_graph_node(graph_data, target))
+
+def string_graph_data(directed=True):
+    """
+    Aggregates keyed by screen names and tweet ids, the layout used before the symbol tables, kept to compare against.
+    """
+    return {"directed": directed, "names": [], "index": {}, "edges": {}, "sources": array("i"), "targets": array("i"), "weights": array("q")}
+
+def string_retweet_graph(graph_data, record):
+    if record.retweeted:
+        string_graph_edge(graph_data, record.user, record.author)
+
+def string_mention_graph(graph_data, record):
+    if not record.retweeted and record.user:
+        if record.user != "null":
+            string_graph_node(graph_data, record.user)
+        for mentioned_user in record.mentions:
+            string_graph_edge(graph_data, record.user, mentioned_user)
+
+def string_coretweet_graph(graph_data, record):
+    if record.retweeted and record.user and record.author not in ("null", record.user) and record.user != "null":
+        string_graph_edge(graph_data, record.author, record.user)
+
+def string_retweet_json(retweets_data, record):
+    if record.retweeted:
+        user_data = retweets_data.get(record.author)
+        if user_data is None:
+            user_data = retweets_data[record.author] = {'username': record.author, "receivedRetweets": 0, "tweets": {}}
+        retweeted_by = user_data["tweets"].setdefault(record.original_tweet_id, {})
+        if record.user not in retweeted_by:
+            retweeted_by[record.user] = None
+            user_data["receivedRetweets"] += 1
+
+def string_mention_json(mentions_data, record):
+    if not record.retweeted and record.user:
+        for mentioned_user in record.mentions:
+            user_data = mentions_data.get(mentioned_user)
+            if user_data is None:
+                user_data = mentions_data[mentioned_user] = {"username": mentioned_user, "receivedMentions": 0, "mentions": {}}
+            user_data["mentions"].setdefault(record.user, []).append(record.tweet_id)
+            user_data["receivedMentions"] += 1
+
+def string_coretweet_json(retweet_dict, record):
+    if record.retweeted and record.user is not None and record.author not in ("null", record.user) and record.user != "null":
+        retweet_dict.setdefault(record.user, set()).add(record.author)
+
+# (constructor, update) of each aggregate in the string layout
+STRING_AGGREGATES = {
+    "retweet_graph": (string_graph_data, string_retweet_graph),
+    "retweet_json": (dict, string_retweet_json),
+    "mention_graph": (string_graph_data, string_mention_graph),
+    "mention_json": (dict, string_mention_json),
+    "coretweet_graph": (lambda: string_graph_data(directed=False), string_coretweet_graph),
+    "coretweet_json": (dict, string_coretweet_json),
+}
+
+def string_aggregates(lines, decode, names):
+    aggregates = {name: STRING_AGGREGATES[name][0]() for name in names}
+    for record in iter_records(lines, decode):
+        for name, data in aggregates.items():
+            STRING_AGGREGATES[name][1](data, record)
+    return aggregates
+
+def interned_aggregates(lines, decode, names):
+    aggregates = generadorp.new_aggregates(names)
+    for record in iter_records(lines, decode):
+        generadorp.update_aggregates(aggregates, record)
+    return aggregates
+
+def traced_aggregates(build, *args):
+    """
+    Build aggregates with tracemalloc on, returns (bytes still allocated once built, pickled bytes). The lines are
+    decoded inside, so strings only count if the aggregates keep them.
+    """
+    gc.collect()
+    tracemalloc.start()
+    aggregates = build(*args)
+    gc.collect()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated, len(pickle.dumps(aggregates, protocol=pickle.HIGHEST_PROTOCOL))
+
+def benchmark_symbols(args):
+    lines = read_lines(args.files, args.lines)
+    _, decode = decoders.get_decoder(args.decoder)
+    print(f"{len(lines)} lines from {len(args.files)} files")
+    print(f"{'aggregates':<16} {'strings':>11} {'interned':>11} {'saved':>6} {'pickled strings':>16} {'pickled interned':>17}")
+    for names in [[name] for name in args.aggregates] + [args.aggregates]:
+        string_bytes, string_pickled = traced_aggregates(string_aggregates, lines, decode, names)
+        interned_bytes, interned_pickled = traced_aggregates(interned_aggregates, lines, decode, names)
+        label = names[0] if len(names) == 1 else "all"
+        print(f"{label:<16} {string_bytes / 1e6:8.1f} MB {interned_bytes / 1e6:8.1f} MB {1 - interned_bytes / string_bytes:>6.0%} "
+              f"{string_pickled / 1e6:13.1f} MB {interned_pickled / 1e6:14.1f} MB")
+
+def ranked_output(kind, name, aggregates, args):
+    """
+    (key, count) entries of the exact or sketched output of kind, keys of co-retweets are author pairs.
+    """
+    data, symbol_tables = aggregates[name], aggregates["symbols"]
+    if kind == "retweets":
+        if name == "retweet_json":
+            return [(entry["username"], entry["receivedRetweets"]) for entry in generadorp.iter_retweet_json(data, symbol_tables)]
+        return [(entry["username"], entry["totalRetweets"]) for entry in generadorp.build_retweet_top_json(data, args.top_k)["retweets"]]
+    if kind == "mentions":
+        if name == "mention_json":
+            return [(entry["username"], entry["receivedMentions"]) for entry in generadorp.iter_mention_json(data, symbol_tables)]
+        return [(entry["username"], entry["receivedMentions"]) for entry in generadorp.build_mention_top_json(data, args.top_k)["mentions"]]
+    if name == "coretweet_json":
+        coretweet_json = generadorp.build_coretweet_json(data, symbol_tables, top_k=args.top_k)
+    else:
+        coretweet_json = generadorp.build_coretweet_top_json(data, args.top_k)
+    return [((entry["authors"]["u1"], entry["authors"]["u2"]), entry["totalCoretweets"]) for entry in coretweet_json["coretweets"]]
+
+def aggregate_records(records, names):
+    aggregates = generadorp.new_aggregates(names)
+    for record in records:
+        generadorp.update_aggregates(aggregates, record)
+    return aggregates
+
+def timed_output(kind, name, records, args):
+    """
+    Aggregate the records and build the output, returns (seconds, ranked entries, bytes allocated by the aggregates).
+    """
+    start_time = time.perf_counter()
+    entries = ranked_output(kind, name, aggregate_records(records, [name]), args)
+    seconds = time.perf_counter() - start_time
+    allocated, _ = traced_aggregates(aggregate_records, records, [name])
+    return seconds, entries, allocated
+
+def benchmark_sketches(args):
+    lines = read_lines(args.files, args.lines)
+    _, decode = decoders.get_decoder(args.decoder)
+    records = decode_records(lines, decode)
+    del lines
+    sketch_args = {"sketch_error": args.error, "sketch_precision": args.precision}
+    print(f"{len(records)} tweets, top {args.top_k}, error {args.error}, precision {args.precision}")
+    print(f"{'output':<11} {'exact':>9} {'sketch':>9} {'exact memory':>13} {'sketch memory':>14} {'recall':>7} {'mean error':>11} {'max error':>10}")
+    for kind, exact_name, sketch_name in [("retweets", "retweet_json", "retweet_sketch"), ("mentions", "mention_json", "mention_sketch"),
+                                          ("coretweets", "coretweet_json", "coretweet_sketch")]:
+        exact_seconds, exact_entries, exact_bytes = timed_output(kind, exact_name, records, args)
+        sketch_seconds, sketch_entries, sketch_bytes = timed_output(kind, generadorp.aggregate_key(sketch_name, sketch_args), records, args)
+        exact_counts = dict(exact_entries)
+        if kind == "retweets":
+            # The sketch counts every retweet, the retweet JSON a retweeter once per tweet
+            exact_counts = Counter(record.author for record in records if record.retweeted and record.author is not None)
+            exact_entries = sorted(exact_counts.items(), key=lambda item: (-item[1], item[0]))
+        top_keys = {key for key, _ in exact_entries[:args.top_k]}
+        recall = len(top_keys & {key for key, _ in sketch_entries}) / len(top_keys) if top_keys else 1.0
+        # Only the top pairs of co-retweets are known exactly
+        errors = [abs(count - exact_counts[key]) / exact_counts[key] for key, count in sketch_entries if key in exact_counts]
+        print(f"{kind:<11} {exact_seconds:8.2f}s {sketch_seconds:8.2f}s {exact_bytes / 1e6:10.1f} MB {sketch_bytes / 1e6:11.1f} MB {recall:>7.0%} "
+              f"{sum(errors) / max(len(errors), 1):>11.2%} {max(errors, default=0):>10.2%}")
+
+def networkx_metrics(graph_arrays):
+    """
+    PageRank, in/out degrees and weakly connected components with the networkx built-ins.
+    """
+    names, sources, targets, weights = graph_arrays
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(len(names)))
+    graph.add_weighted_edges_from(zip(sources, targets, weights))
+    pagerank = nx.pagerank(graph)
+    degrees = (dict(graph.in_degree()), dict(graph.out_degree()), dict(graph.in_degree(weight="weight")), dict(graph.out_degree(weight="weight")))
+    return pagerank, degrees, list(nx.weakly_connected_components(graph))
+
+def sparse_metrics(graph_arrays):
+    names, sources, targets, weights = graph_arrays
+    return analytics.graph_metrics(len(names), sources, targets, weights, directed=True)
+
+def benchmark_analytics(args):
+    graph_arrays = synthetic_graph(args.nodes, args.edges)
+    print(f"graph with {args.nodes} nodes and {len(graph_arrays[1])} edges")
+    networkx_seconds, networkx_rss = measure_in_child(networkx_metrics, graph_arrays)
+    sparse_seconds, sparse_rss = measure_in_child(sparse_metrics, graph_arrays)
+    print(f"{'networkx':<16} {networkx_seconds:8.3f}s peak RSS +{networkx_rss:8.1f} MB")
+    print(f"{'scipy sparse':<16} {sparse_seconds:8.3f}s peak RSS +{sparse_rss:8.1f} MB x{networkx_seconds / sparse_seconds:.2f}")
+
+    pagerank, degrees, networkx_components = networkx_metrics(graph_arrays)
+    node_metrics, graph_stats = sparse_metrics(graph_arrays)
+    nodes = range(args.nodes)
+    pagerank_error = max((abs(pagerank[node] - node_metrics["pagerank"][node]) for node in nodes), default=0)
+    same_degrees = all(degrees[index][node] == node_metrics[name][node] for index, name in
+                       enumerate(["inDegree", "outDegree", "weightedInDegree", "weightedOutDegree"]) for node in nodes)
+    same_components = sorted(map(len, networkx_components), reverse=True) == graph_stats["componentSizes"].tolist() and \
+        all(len({node_metrics["component"][node] for node in component}) == 1 for component in networkx_components)
+    print(f"max PageRank difference {pagerank_error:.2e}, same degrees {same_degrees}, same components {same_components}")
+
+def corpus_dir(work_dir, args, tweet_count):
+    """
+    Generate the corpus of a size once, later runs with the same arguments reuse it.
+    """
+    path = os.path.join(work_dir, f"corpus-{tweet_count}-{args.users}-{args.files}-{args.skew}-{args.file_skew}-{args.seed}")
+    if not os.path.exists(os.path.join(path, "corpus.json")):
+        synthetic_corpus.generate_corpus(path, tweet_count, args.users, args.files, retweet_skew=args.skew, mention_skew=args.skew,
+                                         file_skew=args.file_skew, seed=args.seed)
+    return path
+
+def run_parallel(launcher, ranks, corpus, flags):
+    """
+    Run generadorp.py on corpus with a number of ranks, returns (wall seconds, report of --metrics).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        report_path = os.path.join(directory, "metrics.json")
+        command = shlex.split(launcher.format(ranks=ranks)) + [sys.executable, os.path.join(REPO_DIR, "generadorp.py"), "-d", corpus,
+                                                               *flags, "--metrics", report_path]
+        start_time = time.perf_counter()
+        subprocess.run(command, cwd=directory, check=True, stdout=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start_time
+        with open(report_path) as file:
+            return seconds, json.load(file)
+
+def run_serial(corpus):
+    """
+    Run the sequential generador.py on corpus, returns (wall seconds, peak RSS in MB). Its command line always reads
+    a fixed path, so process_tweets is called directly.
+    """
+    code = ("import sys, resource; sys.path.insert(0, sys.argv[1]); import generador; "
+            "generador.process_tweets(sys.argv[2], None, None, None); "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)")
+    with tempfile.TemporaryDirectory() as directory:
+        start_time = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code, REPO_DIR, corpus], cwd=directory, check=True, capture_output=True, text=True)
+        return time.perf_counter() - start_time, float(result.stdout.split()[-1])
+
+def benchmark_scaling(args):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="generadorp-bench-")
+    results = []
+    print(f"{'program':<12} {'tweets':>10} {'ranks':>5} {'seconds':>9} {'tweets/s':>10} {'efficiency':>10} {'peak RSS/rank':>14} {'RSS all ranks':>14}")
+    for tweet_count in args.sizes:
+        corpus = corpus_dir(work_dir, args, tweet_count)
+        base_seconds = None
+        for ranks in args.ranks:
+            seconds, report = min((run_parallel(args.launcher, ranks, corpus, args.flags) for _ in range(args.repeat)), key=lambda run: run[0])
+            if base_seconds is None:
+                base_ranks, base_seconds = ranks, seconds
+            # Strong scaling efficiency against the first rank count
+            efficiency = base_seconds * base_ranks / (seconds * ranks)
+            # Each rank with the workers of its pool
+            rss = [profiling.rank_rss_mb(rank_report) for rank_report in report["per_rank"]]
+            results.append({"program": "generadorp", "tweets": tweet_count, "ranks": ranks, "seconds": seconds,
+                            "tweets_per_second": tweet_count / seconds, "efficiency": efficiency,
+                            "peak_rss_mb_max": max(rss), "peak_rss_mb_total": sum(rss), "stages": report["stages"]})
+            print(f"{'generadorp':<12} {tweet_count:>10} {ranks:>5} {seconds:>9.2f} {tweet_count / seconds:>10.0f} {efficiency:>10.2f} {max(rss):>11.0f} MB {sum(rss):>11.0f} MB")
+
+        if args.serial and tweet_count <= args.serial_max_tweets:
+            seconds, rss = min(run_serial(corpus) for _ in range(args.repeat))
+            results.append({"program": "generador", "tweets": tweet_count, "ranks": 1, "seconds": seconds,
+                            "tweets_per_second": tweet_count / seconds, "peak_rss_mb_max": rss})
+            print(f"{'generador':<12} {tweet_count:>10} {1:>5} {seconds:>9.2f} {tweet_count / seconds:>10.0f} {'':>10} {rss:>11.0f} MB")
+
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump({"arguments": {key: value for key, value in vars(args).items() if key != "run"}, "results": results}, file, indent=4)
+    if not args.work_dir:
+        print(f"corpora kept in {work_dir}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks for generadorp.py")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    bz2_parser = subparsers.add_parser("bz2", help="Single stream bz2 reader against block level parallel decompression")
+    bz2_parser.add_argument("files", nargs="+", help=".json.bz2 files to read")
+    bz2_parser.add_argument("-p", "--processes", type=int, nargs="+", default=[os.cpu_count()], help="Pool sizes to try")
+    bz2_parser.set_defaults(run=benchmark_bz2)
+
+    writers_parser = subparsers.add_parser("writers", help="networkx/json.dump writers against the streaming writers")
+    writers_parser.add_argument("--nodes", type=int, default=100000, help="Nodes of the synthetic graph")
+    writers_parser.add_argument("--edges", type=int, default=1000000, help="Edges of the synthetic graph and mentions of the JSON")
+    writers_parser.set_defaults(run=benchmark_writers)
+
+    builders_parser = subparsers.add_parser("builders", help="List scans against indexed bookkeeping in the retweet and mention JSON builders")
+    builders_parser.add_argument("--records", type=int, default=200000, help="Synthetic tweet records")
+    builders_parser.add_argument("--users", type=int, default=50000, help="Distinct users")
+    builders_parser.add_argument("--heavy-hitters", type=int, default=5, help="Accounts receiving most retweets and mentions")
+    builders_parser.set_defaults(run=benchmark_builders)
+
+    decoders_parser = subparsers.add_parser("decoders", help="Lines per second of each JSON decoding backend")
+    decoders_parser.add_argument("files", nargs="+", help=".json.bz2 files to read")
+    decoders_parser.add_argument("--decoders", nargs="+", choices=decoders.DECODER_PREFERENCE, help="Backends to try, the first one is the baseline (default: every installed backend, json first)")
+    decoders_parser.add_argument("--lines", type=int, help="Only decode the first lines of the files")
+    decoders_parser.set_defaults(run=benchmark_decoders)
+
+    symbols_parser = subparsers.add_parser("symbols", help="Memory of the aggregates keyed by strings against the interned symbol tables")
+    symbols_parser.add_argument("files", nargs="+", help=".json.bz2 files to read")
+    symbols_parser.add_argument("--lines", type=int, help="Only aggregate the first lines of the files")
+    symbols_parser.add_argument("--aggregates", nargs="+", choices=list(STRING_AGGREGATES), default=list(STRING_AGGREGATES),
+                                help="Aggregates to measure one by one and then together (default: every output)")
+    symbols_parser.add_argument("--decoder", default="json", choices=decoders.DECODER_PREFERENCE, help="JSON decoding backend")
+    symbols_parser.set_defaults(run=benchmark_symbols)
+
+    sketches_parser = subparsers.add_parser("sketches", help="Time, memory and accuracy of the top-k sketches against the exact JSON outputs")
+    sketches_parser.add_argument("files", nargs="+", help=".json.bz2 files to read")
+    sketches_parser.add_argument("--lines", type=int, help="Only aggregate the first lines of the files")
+    sketches_parser.add_argument("--top-k", type=int, default=100, help="Entries compared")
+    sketches_parser.add_argument("--error", type=float, default=sketches.DEFAULT_ERROR, help="Error of the heavy-hitter summaries")
+    sketches_parser.add_argument("--precision", type=int, default=sketches.DEFAULT_PRECISION, help="Precision of the HyperLogLogs")
+    sketches_parser.add_argument("--decoder", default="json", choices=decoders.DECODER_PREFERENCE, help="JSON decoding backend")
+    sketches_parser.set_defaults(run=benchmark_sketches)
+
+    analytics_parser = subparsers.add_parser("analytics", help="networkx PageRank, degrees and components against the sparse matrix analytics stage")
+    analytics_parser.add_argument("--nodes", type=int, default=100000, help="Nodes of the synthetic graph")
+    analytics_parser.add_argument("--edges", type=int, default=1000000, help="Edges of the synthetic graph")
+    analytics_parser.set_defaults(run=benchmark_analytics)
+
+    scaling_parser = subparsers.add_parser("scaling", help="Throughput, scaling efficiency and peak memory of generadorp.py on synthetic corpora")
+    scaling_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="Tweets of each corpus")
+    scaling_parser.add_argument("--ranks", type=int, nargs="+", default=[1, 2, 4], help="Rank counts to run, efficiency is relative to the first one")
+    scaling_parser.add_argument("--users", type=int, default=10000, help="Users of the corpora")
+    scaling_parser.add_argument("--files", type=int, default=16, help="Files of each corpus")
+    scaling_parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of retweeted and mentioned users")
+    scaling_parser.add_argument("--file-skew", type=float, default=0.0, help="Zipf exponent of the file sizes")
+    scaling_parser.add_argument("--seed", type=int, default=0, help="Seed of the corpora")
+    scaling_parser.add_argument("--flags", nargs="+", default=OUTPUT_FLAGS, help="generadorp.py arguments, every output by default")
+    scaling_parser.add_argument("--launcher", default="mpirun -np {ranks}", help="MPI launcher command, {ranks} is replaced by the rank count")
+    scaling_parser.add_argument("--repeat", type=int, default=1, help="Runs of each configuration, the fastest one is kept")
+    scaling_parser.add_argument("--serial", action="store_true", help="Also run the sequential generador.py")
+    scaling_parser.add_argument("--serial-max-tweets", type=int, default=100000, help="Largest corpus given to generador.py, its co-retweet graph is quadratic")
+    scaling_parser.add_argument("--work-dir", help="Directory where the corpora are generated and reused (default: a new temporary directory)")
+    scaling_parser.add_argument("--report", help="Write the results as JSON")
+    scaling_parser.set_defaults(run=benchmark_scaling)
+
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
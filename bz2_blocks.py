@@ -0,0 +1,153 @@
+import bz2
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+
+# 48 bit magic numbers that start every compressed block and end every stream, they are not byte aligned
+BLOCK_MAGIC = 0x314159265359
+END_OF_STREAM_MAGIC = 0x177245385090
+
+
+def open_data(file_path):
+    """
+    Memory map a compressed file so slices can be read without loading the whole file.
+    """
+    with open(file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read_bits(data, start_bit, bit_count):
+    first_byte = start_bit // 8
+    last_byte = (start_bit + bit_count + 7) // 8
+    value = int.from_bytes(data[first_byte:last_byte], "big")
+    return (value >> (last_byte * 8 - start_bit - bit_count)) & ((1 << bit_count) - 1)
+
+def find_magic(data, magic):
+    """
+    Bit offsets of every occurrence of a 48 bit magic number. For each of the 8 possible bit alignments
+    the fully known bytes of the shifted magic are searched as a byte string and then checked bit by bit.
+    """
+    offsets = []
+    for shift in range(8):
+        pattern = (magic << (8 - shift)).to_bytes(7, "big")
+        known = pattern[:6] if shift == 0 else pattern[1:6]
+        skipped = 0 if shift == 0 else 1
+        position = data.find(known)
+        while position >= 0:
+            start_bit = (position - skipped) * 8 + shift
+            if start_bit >= 0 and read_bits(data, start_bit, 48) == magic:
+                offsets.append(start_bit)
+            position = data.find(known, position + 1)
+    return sorted(offsets)
+
+def find_blocks(data):
+    """
+    Return the (start bit, end bit) of every compressed block in a bz2 file, following all the streams of the file.
+    """
+    block_offsets = find_magic(data, BLOCK_MAGIC)
+    end_offsets = find_magic(data, END_OF_STREAM_MAGIC)
+    boundaries = sorted(block_offsets + end_offsets)
+    block_starts = set(block_offsets)
+    blocks = []
+    for start_bit, end_bit in zip(boundaries, boundaries[1:]):
+        if start_bit in block_starts:
+            blocks.append((start_bit, end_bit))
+    if boundaries and boundaries[-1] in block_starts:
+        raise ValueError("bz2 data ends without an end of stream marker")
+    return blocks
+
+def decompress_block(data, start_bit, end_bit):
+    """
+    Decompress a single block by wrapping it in a stream of its own. The stream CRC of a one block stream
+    is the block CRC, which is stored right after the block magic.
+    """
+    bit_count = end_bit - start_bit
+    block = read_bits(data, start_bit, bit_count)
+    block_crc = (block >> (bit_count - 80)) & 0xFFFFFFFF
+    stream = (((block << 48) | END_OF_STREAM_MAGIC) << 32) | block_crc
+    total_bits = bit_count + 80
+    padding = -total_bits % 8
+    return bz2.decompress(b"BZh9" + (stream << padding).to_bytes((total_bits + padding) // 8, "big"))
+
+def split_blocks(blocks, chunk_bytes):
+    """
+    Group consecutive blocks into (first block, last block) chunks of about chunk_bytes compressed bytes.
+    """
+    chunks = []
+    first_block = 0
+    chunk_start = blocks[0][0] if blocks else 0
+    for index, (_, end_bit) in enumerate(blocks):
+        if (end_bit - chunk_start) // 8 >= chunk_bytes or index == len(blocks) - 1:
+            chunks.append((first_block, index))
+            first_block = index + 1
+            chunk_start = end_bit
+    return chunks
+
+def read_chunk_lines(data, blocks, first_block, last_block, encoding="utf-8"):
+    """
+    Yield the lines that start inside blocks first_block..last_block. Blocks cut lines at any byte, so a chunk
+    skips its first (partial) line, which belongs to the previous chunk, and reads the following blocks until
+    its last line is complete. A line starting exactly where the next chunk begins belongs to this chunk.
+    """
+    skipping = first_block > 0
+    own_end = None
+    offset = 0
+    carry = b""
+    for block_index in range(first_block, len(blocks)):
+        if block_index > last_block and own_end is None:
+            own_end = offset + len(carry)
+        text = carry + decompress_block(data, *blocks[block_index])
+        position = 0
+        if skipping:
+            newline = text.find(b"\n")
+            if newline < 0:
+                offset += len(text)
+                carry = b""
+                continue
+            position = newline + 1
+            skipping = False
+
+        while True:
+            if own_end is not None and offset + position > own_end:
+                return
+            newline = text.find(b"\n", position)
+            if newline < 0:
+                break
+            yield text[position:newline + 1].decode(encoding)
+            position = newline + 1
+
+        offset += position
+        carry = text[position:]
+
+    if carry and not skipping and (own_end is None or offset <= own_end):
+        yield carry.decode(encoding)
+
+def decompress_file_block(args):
+    file_path, start_bit, end_bit = args
+    data = open_data(file_path)
+    try:
+        return decompress_block(data, start_bit, end_bit)
+    finally:
+        data.close()
+
+def read_lines_parallel(file_path, processes=None, encoding="utf-8"):
+    """
+    Decompress the blocks of a bz2 file with a process pool and yield its lines in order.
+    """
+    data = open_data(file_path)
+    try:
+        blocks = find_blocks(data)
+    finally:
+        data.close()
+
+    carry = b""
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for block_data in executor.map(decompress_file_block, [(file_path, start_bit, end_bit) for start_bit, end_bit in blocks]):
+            text = carry + block_data
+            position = 0
+            newline = text.find(b"\n")
+            while newline >= 0:
+                yield text[position:newline + 1].decode(encoding)
+                position = newline + 1
+                newline = text.find(b"\n", position)
+            carry = text[position:]
+    if carry:
+        yield carry.decode(encoding)
@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import sparse
+
+BLOCK_ROWS = 1024
+
+
+def incidence_matrix(rows, columns, author_count, retweeter_count):
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(author_count, retweeter_count))
+    matrix.sort_indices()
+    return matrix
+
+def row_blocks(row_count, rank=0, size=1, block_rows=BLOCK_ROWS):
+    """
+    Row blocks handled by a rank, blocks are dealt round robin so ranks get a mix of light and heavy authors.
+    """
+    blocks = [(start, min(start + block_rows, row_count)) for start in range(0, row_count, block_rows)]
+    return blocks[rank::size]
+
+def prune_top_k(first, second, counts, top_k):
+    """
+    Keep the top_k pairs with more co-retweets, ties are broken by the author indexes.
+    """
+    order = np.lexsort((second, first, -counts))[:top_k]
+    return first[order], second[order], counts[order]
+
+def block_pairs(matrix, transposed, start, end, min_support):
+    """
+    Co-retweet counts of the pairs (i, j) with start <= i < end and i < j, as the product of the rows with the
+    transposed matrix.
+    """
+    product = (matrix[start:end] @ transposed).tocoo()
+    first = product.row.astype(np.int64) + start
+    second = product.col.astype(np.int64)
+    counts = product.data.astype(np.int64)
+    keep = (second > first) & (counts >= min_support)
+    return first[keep], second[keep], counts[keep]
+
+def compute_pairs(matrix, blocks, min_support=1, top_k=None):
+    """
+    Return (first author, second author, count, retweeter indexes) for the pairs of the given row blocks.
+    """
+    transposed = matrix.T.tocsc()
+    firsts, seconds, all_counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    kept = 0
+    for start, end in blocks:
+        first, second, counts = block_pairs(matrix, transposed, start, end, min_support)
+        firsts.append(first)
+        seconds.append(second)
+        all_counts.append(counts)
+        kept += len(counts)
+        if top_k is not None and kept > 2 * top_k:
+            first, second, counts = prune_top_k(np.concatenate(firsts), np.concatenate(seconds), np.concatenate(all_counts), top_k)
+            firsts, seconds, all_counts = [first], [second], [counts]
+            kept = len(counts)
+
+    first, second, counts = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(all_counts)
+    if top_k is not None:
+        first, second, counts = prune_top_k(first, second, counts, top_k)
+
+    return [(i, j, count, common_retweeters(matrix, i, j)) for i, j, count in zip(first.tolist(), second.tolist(), counts.tolist())]
+
+def common_retweeters(matrix, i, j):
+    indptr, indices = matrix.indptr, matrix.indices
+    return np.intersect1d(indices[indptr[i]:indptr[i + 1]], indices[indptr[j]:indptr[j + 1]], assume_unique=True)
+
+def distributed_pairs(comm, incidence, min_support=1, top_k=None):
+    """
+    Split the author rows between the ranks of comm. incidence is the (authors, retweeters, matrix) of
+    generadorp.coretweet_incidence, only read on rank 0, which gets (authors, retweeters, pairs), the other ranks
+    get None.
+    """
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    authors, retweeters, matrix = incidence if rank == 0 else (None, None, None)
+    matrix = comm.bcast(matrix, root=0)
+    pairs = compute_pairs(matrix, row_blocks(matrix.shape[0], rank, size), min_support, top_k)
+    all_pairs = comm.gather(pairs, root=0)
+    if rank != 0:
+        return None
+
+    return authors, retweeters, merge_pairs(all_pairs, top_k)
+
+def pool_pairs(pool, workers, incidence, min_support=1, top_k=None):
+    """
+    Same as distributed_pairs, with the author rows split between the workers of a process pool.
+    """
+    authors, retweeters, matrix = incidence
+    futures = [pool.submit(compute_pairs, matrix, row_blocks(matrix.shape[0], worker, workers), min_support, top_k)
+               for worker in range(workers)]
+    return authors, retweeters, merge_pairs([future.result() for future in futures], top_k)
+
+def merge_pairs(all_pairs, top_k=None):
+    pairs = [pair for rank_pairs in all_pairs for pair in rank_pairs]
+    pairs.sort(key=lambda pair: (-pair[2], pair[0], pair[1]))
+    if top_k is not None:
+        pairs = pairs[:top_k]
+    return pairs
+
+def pairs_to_json(authors, retweeters, pairs):
+    """
+    Yield the co-retweet JSON entries of the pairs, which come sorted by the total number of co-retweets (see
+    merge_pairs).
+    """
+    for first, second, count, common in pairs:
+        yield {
+            'authors': {'u1': authors[first], 'u2': authors[second]},
+            'totalCoretweets': count,
+            'retweeters': [retweeters[retweeter] for retweeter in common.tolist()]
+        }
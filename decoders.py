@@ -0,0 +1,127 @@
+import json
+
+# Backends tried by "auto", fastest first. Only json is always available
+DECODER_PREFERENCE = ["msgspec", "simdjson", "orjson", "json"]
+DECODER_CHOICES = ["auto"] + DECODER_PREFERENCE
+
+
+def decode_json(line):
+    return json.loads(line)
+
+def orjson_decoder():
+    import orjson
+    return orjson.loads
+
+def msgspec_decoder():
+    """
+    Typed decoder that only reads the fields generadorp.py uses and skips the rest of the tweet. Fields the
+    builders index directly are required, so a tweet missing them fails here and goes through the stdlib.
+    """
+    import msgspec
+
+    class User(msgspec.Struct):
+        screen_name: str
+
+    class Hashtag(msgspec.Struct):
+        text: str
+
+    class Entities(msgspec.Struct):
+        hashtags: list[Hashtag] = []
+        user_mentions: list[User] = []
+
+    class RetweetedStatus(msgspec.Struct):
+        id_str: str
+        user: User
+
+    class Tweet(msgspec.Struct):
+        created_at: str | None = None
+        id_str: str | None = None
+        user: User | None = None
+        retweeted_status: RetweetedStatus | None = None
+        entities: Entities | None = None
+
+    decoder = msgspec.json.Decoder(Tweet)
+
+    def decode(line):
+        tweet = decoder.decode(line)
+        fields = {"created_at": tweet.created_at, "id_str": tweet.id_str}
+        if tweet.user is not None:
+            fields["user"] = {"screen_name": tweet.user.screen_name}
+        if tweet.retweeted_status is not None:
+            fields["retweeted_status"] = {"id_str": tweet.retweeted_status.id_str,
+                                          "user": {"screen_name": tweet.retweeted_status.user.screen_name}}
+        if tweet.entities is not None:
+            fields["entities"] = {"hashtags": [{"text": hashtag.text} for hashtag in tweet.entities.hashtags],
+                                  "user_mentions": [{"screen_name": mention.screen_name} for mention in tweet.entities.user_mentions]}
+        return fields
+
+    return decode
+
+def simdjson_decoder():
+    """
+    Decoder on a reused simdjson parser. The parsed document is only valid until the next line is parsed,
+    so the fields used are copied out of it right away.
+    """
+    import simdjson
+    parser = simdjson.Parser()
+
+    def decode(line):
+        tweet = parser.parse(line)
+        if not isinstance(tweet, simdjson.Object):
+            return json.loads(line)
+        fields = {"created_at": tweet.get("created_at"), "id_str": tweet.get("id_str")}
+        if "user" in tweet:
+            fields["user"] = {"screen_name": tweet["user"]["screen_name"]}
+        if "retweeted_status" in tweet:
+            original_tweet = tweet["retweeted_status"]
+            fields["retweeted_status"] = {"id_str": original_tweet["id_str"],
+                                          "user": {"screen_name": original_tweet["user"]["screen_name"]}}
+        entities = tweet.get("entities")
+        if entities is not None:
+            # Null lists are read as empty ones, as generadorp.entity_list does
+            fields["entities"] = {"hashtags": [{"text": hashtag["text"]} for hashtag in entities.get("hashtags") or []],
+                                  "user_mentions": [{"screen_name": mention["screen_name"]} for mention in entities.get("user_mentions") or []]}
+        return fields
+
+    return decode
+
+DECODERS = {
+    "json": lambda: decode_json,
+    "orjson": orjson_decoder,
+    "msgspec": msgspec_decoder,
+    "simdjson": simdjson_decoder
+}
+
+def with_fallback(decode):
+    """
+    Lines a fast backend rejects are decoded again with the stdlib, so every backend accepts the same lines
+    and only the stdlib decides which ones are invalid.
+    """
+    def decode_line(line):
+        try:
+            return decode(line)
+        except ValueError:
+            return json.loads(line)
+    return decode_line
+
+def available_decoders():
+    available = []
+    for name in DECODER_PREFERENCE:
+        try:
+            DECODERS[name]()
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+def get_decoder(name="auto"):
+    """
+    Return (backend name, decode function) for a backend name or "auto". The decode function takes a line and
+    returns a dict with at least the fields of a tweet generadorp.py reads, raising ValueError on invalid JSON.
+    """
+    if name == "auto":
+        name = available_decoders()[0]
+    decode = DECODERS[name]()
+    if name == "json":
+        return name, decode
+    return name, with_fallback(decode)
@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# mpi runs one rank per MPI process, processes runs a single rank that hands the work units to a local process pool
+EXECUTOR_CHOICES = ["mpi", "processes"]
+
+
+class LocalComm:
+    """
+    The part of the mpi4py communicator API generadorp.py uses, for a run with a single rank and no MPI.
+    Collective operations just hand back what they were given.
+    """
+    def Get_rank(self):
+        return 0
+
+    def Get_size(self):
+        return 1
+
+    def bcast(self, obj, root=0):
+        return obj
+
+    def gather(self, obj, root=0):
+        return [obj]
+
+    def reduce(self, obj, root=0):
+        return obj
+
+    def Barrier(self):
+        pass
+
+def get_comm(executor="mpi"):
+    """
+    Communicator of the executor, mpi4py is only imported (and MPI initialized) by the mpi executor.
+    """
+    if executor == "mpi":
+        from mpi4py import MPI
+        return MPI.COMM_WORLD
+    return LocalComm()
+
+def default_workers():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def process_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers)
@@ -1,22 +1,121 @@
-from mpi4py import MPI
 import os
+import re
 import json
 import bz2
 import getopt
 import sys
 import time
+import functools
+import pickle
+import hashlib
+from array import array
 import argparse
-import networkx as nx
-from datetime import datetime
-from collections import defaultdict
-from itertools import combinations
+import shlex
+import numpy as np
+from datetime import datetime, date
+from collections import defaultdict, namedtuple
+from concurrent.futures import as_completed
+import bz2_blocks
+import tweet_cache
+import coretweets
+import writers
+import decoders
+import profiling
+import windows
+import archive_index
+import executors
+import spill
+import symbols
+import sketches
+import analytics
+
+MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6, "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+# Top level created_at, it is the first key of the tweets written by the Twitter API
+CREATED_AT_PROBE = re.compile(r'\s*\{\s*"created_at"\s*:\s*"([^"]*)"')
+# Lines read, rejected before decoding (date, hashtags), rejected after decoding and accepted
+FILTER_STAGES = ["lines", "date_prefilter", "hashtag_prefilter", "invalid_json", "filtered", "accepted"]
+tweet_dates = {}
+day_timestamps = {}
+# Decode functions of the backends used by the pool workers of this process
+decode_functions = {}
+# Layout of the stored partial aggregates, partials of another version are built again
+PARTIAL_VERSION = 3
+
+
+def parse_tweet_date(tweet_date_str):
+    """
+    Date of a created_at string like 'Wed Mar 06 12:00:00 +0000 2019', read from fixed offsets and cached per day.
+    """
+    key = tweet_date_str[4:10] + tweet_date_str[-4:]
+    tweet_date = tweet_dates.get(key)
+    if tweet_date is None:
+        if len(tweet_date_str) == 30 and tweet_date_str[19:26] == " +0000 " and key[:3] in MONTHS:
+            tweet_date = date(int(key[-4:]), MONTHS[key[:3]], int(key[4:6]))
+        else:
+            return datetime.strptime(tweet_date_str, '%a %b %d %H:%M:%S +0000 %Y').date()
+        tweet_dates[key] = tweet_date
+    return tweet_date
+
+def tweet_timestamp(tweet_date_str):
+    """
+    Seconds since the unix epoch of a created_at string, the start of each day is cached.
+    """
+    key = tweet_date_str[4:10] + tweet_date_str[-4:]
+    day_start = day_timestamps.get(key)
+    if day_start is None:
+        day_start = (parse_tweet_date(tweet_date_str).toordinal() - tweet_cache.EPOCH_ORDINAL) * 86400
+        if key in tweet_dates:
+            day_timestamps[key] = day_start
+    return day_start + int(tweet_date_str[11:13]) * 3600 + int(tweet_date_str[14:16]) * 60 + int(tweet_date_str[17:19])
+
+def compile_hashtag_probe(hashtags):
+    """
+    Regex matching any of the hashtags anywhere in a raw line. Lines without a match cannot contain them.
+    Returns None when there are no hashtags or one of them could be escaped in the JSON text.
+    """
+    if not hashtags or not all(hashtag and hashtag.isascii() and hashtag.isprintable() and '"' not in hashtag and "\\" not in hashtag for hashtag in hashtags):
+        return None
+    return re.compile("|".join(re.escape(hashtag) for hashtag in sorted(hashtags)), re.IGNORECASE)
 
+def prefilter_line(line, start_date, end_date, hashtag_probe):
+    """
+    Cheap checks on the raw line, returns the stage that rejected it or None if it has to be decoded.
+    """
+    created_at = CREATED_AT_PROBE.match(line)
+    if created_at:
+        try:
+            if not (start_date <= parse_tweet_date(created_at.group(1)) <= end_date):
+                return "date_prefilter"
+        except ValueError:
+            pass
+
+    if hashtag_probe is not None and not hashtag_probe.search(line):
+        return "hashtag_prefilter"
+
+    return None
+
+def new_filter_counters():
+    return dict.fromkeys(FILTER_STAGES, 0)
 
+def merge_filter_counters(counters, other):
+    for stage, count in other.items():
+        counters[stage] += count
+    return counters
+
+def print_filter_counters(counters):
+    for stage in FILTER_STAGES:
+        print(f"{stage}: {counters[stage]}")
+
+def entity_list(tweet, name):
+    """
+    A list of the entities of a tweet, empty when the entities or the list are missing or null.
+    """
+    return (tweet.get("entities") or {}).get(name) or []
 
 def is_tweet_valid(tweet, start_date, end_date, hashtags):
     tweet_date_str = tweet.get('created_at')
     if tweet_date_str:
-        tweet_date = datetime.strptime(tweet_date_str, '%a %b %d %H:%M:%S +0000 %Y').date()
+        tweet_date = parse_tweet_date(tweet_date_str)
     else:
         return False
 
@@ -29,72 +128,801 @@ def is_tweet_valid(tweet, start_date, end_date, hashtags):
         return False
 
     if hashtags:
-        tweet_hashtags = {hashtag['text'].lower() for hashtag in tweet.get('entities', {}).get('hashtags', [])}
+        tweet_hashtags = {hashtag['text'].lower() for hashtag in entity_list(tweet, 'hashtags')}
         if not tweet_hashtags.intersection(hashtags):
             return False
 
     return True
 
-def process_file(file_path, start_date, end_date, hashtags):
+def filter_day(value):
+    """
+    Day of a date filter, which is given as a datetime or a date.
+    """
+    return value.date() if isinstance(value, datetime) else value
+
+def process_lines(lines, start_date, end_date, hashtags, counters=None, decode=decoders.decode_json, metrics=None):
+    """
+    Yield the record of each valid tweet in lines, the parsed tweet is dropped right away.
+    Lines that cannot match the date range or the hashtags are rejected before decoding them.
+    decode is one of the backends of decoders.py. With metrics, every line is timed as decompress, filter
+    and parse laps.
+    """
+    if counters is None:
+        counters = new_filter_counters()
+    start_day = filter_day(start_date)
+    end_day = filter_day(end_date)
+    hashtag_probe = compile_hashtag_probe(hashtags)
+
+    timed = metrics is not None
+    for line in lines:
+        if timed:
+            profiling.lap(metrics, "decompress")
+            metrics["bytes_decompressed"] += len(line)
+        counters["lines"] += 1
+        rejected_by = prefilter_line(line, start_day, end_day, hashtag_probe)
+        if timed:
+            profiling.lap(metrics, "filter")
+        if rejected_by:
+            counters[rejected_by] += 1
+            continue
+
+        tweet = process_line(line, start_date, end_date, hashtags, counters, decode, metrics)
+        if timed:
+            profiling.lap(metrics, "filter")
+        if tweet is not None:
+            counters["accepted"] += 1
+            record = extract_record(tweet)
+            if timed:
+                profiling.lap(metrics, "parse")
+            yield record
+
+def query_filters(queries):
+    """
+    (start day, end day, hashtags) of every query of a batch.
+    """
+    return [(filter_day(query.start_date), filter_day(query.end_date), query.hashtags) for query in queries]
+
+def prefilter_batch_line(line, filters, hashtag_probes):
+    """
+    prefilter_line against every query of a batch, returns the stage that rejected the line for all of them or None.
+    """
+    tweet_date = None
+    created_at = CREATED_AT_PROBE.match(line)
+    if created_at:
+        try:
+            tweet_date = parse_tweet_date(created_at.group(1))
+        except ValueError:
+            pass
+
+    rejected_by = "date_prefilter"
+    for (start_day, end_day, _), hashtag_probe in zip(filters, hashtag_probes):
+        if tweet_date is not None and not (start_day <= tweet_date <= end_day):
+            continue
+        if hashtag_probe is not None and not hashtag_probe.search(line):
+            rejected_by = "hashtag_prefilter"
+            continue
+        return None
+    return rejected_by
+
+def match_queries(tweet, filters):
+    """
+    Indexes of the queries of a batch whose filters accept a decoded tweet, as is_tweet_valid does for one query.
+    """
+    tweet_date_str = tweet.get('created_at')
+    if not tweet_date_str:
+        return []
+    tweet_date = parse_tweet_date(tweet_date_str)
+    tweet_hashtags = None
+    matched = []
+    for query_index, (start_day, end_day, hashtags) in enumerate(filters):
+        if not (start_day <= tweet_date <= end_day):
+            continue
+        if hashtags:
+            if tweet_hashtags is None:
+                tweet_hashtags = {hashtag['text'].lower() for hashtag in entity_list(tweet, 'hashtags')}
+            if tweet_hashtags.isdisjoint(hashtags):
+                continue
+        matched.append(query_index)
+    return matched
+
+def process_batch_lines(lines, queries, counters=None, decode=decoders.decode_json, metrics=None):
+    """
+    process_lines for a batch of queries: every line is decoded at most once, and (record, indexes of the queries
+    that accept it) is yielded for the tweets at least one query accepts.
     """
-    Process a single .json.bz2 file and return a list of valid tweets.
+    if counters is None:
+        counters = new_filter_counters()
+    filters = query_filters(queries)
+    hashtag_probes = [compile_hashtag_probe(hashtags) for _, _, hashtags in filters]
+
+    timed = metrics is not None
+    for line in lines:
+        if timed:
+            profiling.lap(metrics, "decompress")
+            metrics["bytes_decompressed"] += len(line)
+        counters["lines"] += 1
+        rejected_by = prefilter_batch_line(line, filters, hashtag_probes)
+        if timed:
+            profiling.lap(metrics, "filter")
+        if rejected_by:
+            counters[rejected_by] += 1
+            continue
+
+        try:
+            tweet = decode(line.strip())
+        except ValueError:
+            counters["invalid_json"] += 1
+            continue
+        finally:
+            if timed:
+                profiling.lap(metrics, "parse")
+        matched = match_queries(tweet, filters)
+        if timed:
+            profiling.lap(metrics, "filter")
+        if not matched:
+            counters["filtered"] += 1
+            continue
+        counters["accepted"] += 1
+        record = extract_record(tweet)
+        if timed:
+            profiling.lap(metrics, "parse")
+        yield record, matched
+
+def process_file(file_path, start_date, end_date, hashtags, counters=None, decode=decoders.decode_json):
+    """
+    Process a single .json.bz2 file and yield the record of each valid tweet.
     """
-    tweets = []
     with bz2.open(file_path, "rt") as f:  # 'rt' mode for text reading
-        for line in f:
-            tweet = process_line(line, start_date, end_date, hashtags)
-            if tweet is not None:
-                tweets.append(tweet)
-    return tweets
+        yield from process_lines(f, start_date, end_date, hashtags, counters, decode)
 
-def process_line(line, start_date, end_date, hashtags):
+def read_unit_lines(unit):
+    """
+    Yield the lines of a work unit, either a whole file or a range of its bz2 blocks.
+    """
+    if unit.blocks is None:
+        with bz2.open(unit.path, "rt") as f:
+            yield from f
+        return
+
+    data = bz2_blocks.open_data(unit.path)
+    try:
+        yield from bz2_blocks.read_chunk_lines(data, unit.blocks, unit.first_block, unit.last_block)
+    finally:
+        data.close()
+
+def process_unit(unit, start_date, end_date, hashtags, counters=None, decode=decoders.decode_json, metrics=None):
+    if metrics is not None:
+        metrics["bytes_read"] += unit.size
+    yield from process_lines(read_unit_lines(unit), start_date, end_date, hashtags, counters, decode, metrics)
+
+def cache_rows(lines, decode=decoders.decode_json):
+    """
+    Yield the cache row of every tweet with a date, no filtering is applied so any later query can use the cache.
+    """
+    for line in lines:
+        try:
+            tweet = decode(line.strip())
+        except ValueError:
+            continue
+        if not tweet.get('created_at'):
+            continue
+        record = extract_record(tweet)
+        tweet_hashtags = [hashtag['text'].lower() for hashtag in entity_list(tweet, 'hashtags')]
+        yield (record.timestamp, record.tweet_id, record.user, record.retweeted, record.author, record.original_tweet_id,
+               record.mentions, tweet_hashtags)
+
+def read_unit_cache(unit, cache_dir, decode=decoders.decode_json, metrics=None):
+    """
+    Columnar cache of a work unit, built first if the source file changed.
+    """
+    path = tweet_cache.cache_path(cache_dir, unit.path, unit.first_block, unit.last_block)
+    info = tweet_cache.source_info(unit.path, unit.first_block, unit.last_block)
+    if not tweet_cache.is_cache_valid(path, info):
+        tweet_cache.write_cache(path, info, cache_rows(read_unit_lines(unit), decode))
+        if metrics is not None:
+            metrics["bytes_read"] += unit.size
+            profiling.lap(metrics, "cache_build")
+    return tweet_cache.read_cache(path)
+
+def process_cached_unit(unit, cache_dir, start_date, end_date, hashtags, counters=None, decode=decoders.decode_json, metrics=None):
+    """
+    Process a work unit from its columnar cache, building the cache first if the source file changed.
+    Date and hashtag filters are applied on the columns.
+    """
+    if counters is None:
+        counters = new_filter_counters()
+    cache = read_unit_cache(unit, cache_dir, decode, metrics)
+    start_day = filter_day(start_date)
+    end_day = filter_day(end_date)
+    rows = tweet_cache.select_rows(cache, start_day, end_day, hashtags)
+    counters["lines"] += len(cache["timestamp"])
+    counters["filtered"] += len(cache["timestamp"]) - len(rows)
+    counters["accepted"] += len(rows)
+    for row in tweet_cache.iter_rows(cache, rows):
+        record = TweetRecord(*row)
+        if metrics is not None:
+            profiling.lap(metrics, "cache_read")
+        yield record
+
+def process_cached_batch_unit(unit, cache_dir, queries, counters=None, decode=decoders.decode_json, metrics=None):
+    """
+    process_cached_unit for a batch of queries, yields (record, indexes of the queries that select its row).
+    """
+    if counters is None:
+        counters = new_filter_counters()
+    cache = read_unit_cache(unit, cache_dir, decode, metrics)
+    matched = {}
+    for query_index, (start_day, end_day, hashtags) in enumerate(query_filters(queries)):
+        for row in tweet_cache.select_rows(cache, start_day, end_day, hashtags).tolist():
+            matched.setdefault(row, []).append(query_index)
+    rows = np.array(sorted(matched), dtype=np.int64)
+    counters["lines"] += len(cache["timestamp"])
+    counters["filtered"] += len(cache["timestamp"]) - len(rows)
+    counters["accepted"] += len(rows)
+    for row, record in zip(rows.tolist(), tweet_cache.iter_rows(cache, rows)):
+        record = TweetRecord(*record)
+        if metrics is not None:
+            profiling.lap(metrics, "cache_read")
+        yield record, matched[row]
+
+def process_line(line, start_date, end_date, hashtags, counters=None, decode=decoders.decode_json, metrics=None):
     """
     Process a single line (a single tweet) and return the tweet if it's valid, or None otherwise.
     """
     try:
-        tweet = json.loads(line.strip())
-        if is_tweet_valid(tweet, start_date, end_date, hashtags):
-            return tweet
-    except json.JSONDecodeError:
+        tweet = decode(line.strip())
+    except ValueError:
+        if counters is not None:
+            counters["invalid_json"] += 1
         return None
+    finally:
+        if metrics is not None:
+            profiling.lap(metrics, "parse")
+    if is_tweet_valid(tweet, start_date, end_date, hashtags):
+        return tweet
+    if counters is not None:
+        counters["filtered"] += 1
+    return None
 
 
-def get_tweets(directory, start_date, end_date, hashtags):
-    comm = MPI.COMM_WORLD
-    rank = comm.Get_rank()
-    size = comm.Get_size()
+WORK_REQUEST_TAG = 1
+WORK_ASSIGN_TAG = 2
+
+# A whole file (blocks is None) or the blocks first_block..last_block of a file, size is in compressed bytes
+WorkUnit = namedtuple("WorkUnit", ["path", "size", "blocks", "first_block", "last_block"])
 
+
+def find_input_files(directory):
     all_files = []
     for root, _, files in os.walk(directory):
         for file in files:
             if file.endswith(".json.bz2"):
                 all_files.append(os.path.join(root, file))
+    return all_files
 
-    files_per_process = len(all_files) // size
-    start_index = rank * files_per_process
-    end_index = start_index + files_per_process if rank != size - 1 else len(all_files)
-
-    tweets = []
-    for file_index in range(start_index, end_index):
-        file_path = all_files[file_index]
-        tweets.extend(process_file(file_path, start_date, end_date, hashtags))
+def find_work_units(all_files, split_bytes=None):
+    """
+    One unit per file, files bigger than split_bytes are split into chunks of whole bz2 blocks.
+    """
+    units = []
+    for file_path in all_files:
+        file_size = os.path.getsize(file_path)
+        if not split_bytes or file_size <= split_bytes:
+            units.append(WorkUnit(file_path, file_size, None, 0, 0))
+            continue
+
+        data = bz2_blocks.open_data(file_path)
+        try:
+            blocks = bz2_blocks.find_blocks(data)
+        finally:
+            data.close()
+        for first_block, last_block in bz2_blocks.split_blocks(blocks, split_bytes):
+            chunk_size = (blocks[last_block][1] - blocks[first_block][0]) // 8
+            units.append(WorkUnit(file_path, chunk_size, blocks, first_block, last_block))
+    return units
+
+def index_rows(lines, decode=decoders.decode_json):
+    """
+    Yield the (day ordinal, lowercase hashtags) of every tweet with a date, for the archive index.
+    """
+    for line in lines:
+        try:
+            tweet = decode(line.strip())
+        except ValueError:
+            continue
+        tweet_date_str = tweet.get('created_at')
+        if not tweet_date_str:
+            continue
+        yield parse_tweet_date(tweet_date_str).toordinal(), {hashtag['text'].lower() for hashtag in entity_list(tweet, 'hashtags')}
+
+def build_file_index(file_path, index_dir, chunk_bytes, decode=decoders.decode_json):
+    """
+    Index the date range and hashtags of each chunk of about chunk_bytes of bz2 blocks of a file.
+    """
+    info = archive_index.source_info(file_path, chunk_bytes)
+    data = bz2_blocks.open_data(file_path)
+    try:
+        blocks = bz2_blocks.find_blocks(data)
+        chunk_rows = ((first_block, last_block, index_rows(bz2_blocks.read_chunk_lines(data, blocks, first_block, last_block), decode))
+                      for first_block, last_block in bz2_blocks.split_blocks(blocks, chunk_bytes))
+        archive_index.write_index(archive_index.index_path(index_dir, file_path), info, blocks, chunk_rows)
+    finally:
+        data.close()
+
+def update_file_index(file_path, index_dir, chunk_bytes, decoder="json"):
+    """
+    Build the index of a file if it has none or changed since it was indexed, returns 1 if it was built.
+    """
+    index = archive_index.read_index(archive_index.index_path(index_dir, file_path), file_path)
+    if index is not None and index["info"]["chunk_bytes"] == chunk_bytes:
+        return 0
+    build_file_index(file_path, index_dir, chunk_bytes, get_decode(decoder))
+    return 1
 
-    all_tweets = comm.gather(tweets, root=0)
+def build_indexes(directory, index_dir, chunk_bytes, decoder="json", comm=None, pool=None):
+    """
+    Build the index of every input file that has none or changed since it was indexed, the files are split
+    between the ranks by compressed size, or handed to the workers of pool.
+    """
+    comm = comm or executors.get_comm()
+    rank = comm.Get_rank()
+    units = find_work_units(find_input_files(directory)) if rank == 0 else None
+    units = comm.bcast(units, root=0)
+    if rank == 0:
+        os.makedirs(index_dir, exist_ok=True)
+    comm.Barrier()
 
+    if pool is not None:
+        order = sorted(units, key=lambda unit: unit.size, reverse=True)
+        built = sum(pool.map(update_file_index, [unit.path for unit in order], [index_dir] * len(order),
+                             [chunk_bytes] * len(order), [decoder] * len(order)))
+    else:
+        built = 0
+        for unit_index in partition_by_bytes(units, comm.Get_size())[rank]:
+            built += update_file_index(units[unit_index].path, index_dir, chunk_bytes, decoder)
+    built = comm.reduce(built, root=0)
     if rank == 0:
-        combined_tweets = [tweet for process_tweets in all_tweets for tweet in process_tweets]
-        return combined_tweets
+        print(f"indexed {built} of {len(units)} files")
+
+def select_indexed_units(units, index_dir, start_date, end_date, hashtags):
+    """
+    Drop the units, or the chunks of blocks inside them, whose index shows they hold no tweet inside the dates
+    with one of the hashtags. Units of files without an up to date index are kept whole.
+    """
+    start_day = filter_day(start_date).toordinal()
+    end_day = filter_day(end_date).toordinal()
+    selected = []
+    for unit in units:
+        index = archive_index.read_index(archive_index.index_path(index_dir, unit.path), unit.path)
+        if index is None:
+            selected.append(unit)
+            continue
+        chunk_ids = archive_index.matching_chunks(index, start_day, end_day, hashtags)
+        if unit.blocks is None and len(chunk_ids) == len(index["chunks"]):
+            selected.append(unit)
+            continue
+
+        blocks = index["blocks"]
+        last_block = unit.last_block if unit.blocks is not None else None
+        for first_block, last_block in archive_index.block_ranges(index, chunk_ids, unit.first_block, last_block):
+            selected.append(WorkUnit(unit.path, (blocks[last_block][1] - blocks[first_block][0]) // 8, blocks, first_block, last_block))
+    return selected
+
+def partition_by_count(units, size):
+    """
+    Split the units into contiguous chunks with the same number of units, the last rank takes the leftover units.
+    """
+    units_per_process = len(units) // size
+    assignments = []
+    for rank in range(size):
+        start_index = rank * units_per_process
+        end_index = start_index + units_per_process if rank != size - 1 else len(units)
+        assignments.append(list(range(start_index, end_index)))
+    return assignments
+
+def partition_by_bytes(units, size):
+    """
+    Assign each unit (largest first) to the rank with the fewest compressed bytes so far.
+    """
+    loads = [0] * size
+    assignments = [[] for _ in range(size)]
+    for unit_index in sorted(range(len(units)), key=lambda i: units[i].size, reverse=True):
+        rank = loads.index(min(loads))
+        assignments[rank].append(unit_index)
+        loads[rank] += units[unit_index].size
+    return [sorted(indexes) for indexes in assignments]
+
+def dispatch_units(comm, units):
+    """
+    Work queue run by rank 0: hand out unit indexes (largest first) to the workers as they ask for them.
+    """
+    from mpi4py import MPI
+    size = comm.Get_size()
+    order = sorted(range(len(units)), key=lambda i: units[i].size, reverse=True)
+    status = MPI.Status()
+    for unit_index in order + [None] * (size - 1):
+        comm.recv(source=MPI.ANY_SOURCE, tag=WORK_REQUEST_TAG, status=status)
+        comm.send(unit_index, dest=status.Get_source(), tag=WORK_ASSIGN_TAG)
+
+def request_units(comm):
+    """
+    Yield the unit indexes handed out by rank 0 until the queue is empty.
+    """
+    while True:
+        comm.send(None, dest=0, tag=WORK_REQUEST_TAG)
+        unit_index = comm.recv(source=0, tag=WORK_ASSIGN_TAG)
+        if unit_index is None:
+            return
+        yield unit_index
+
+def assigned_units(comm, units, schedule):
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+
+    if schedule == "dynamic" and size > 1:
+        if rank == 0:
+            dispatch_units(comm, units)
+            return []
+        return request_units(comm)
+    if schedule == "bytes":
+        return partition_by_bytes(units, size)[rank]
+    return partition_by_count(units, size)[rank]
+
+def print_balance_report(timings, label="rank"):
+    """
+    Print the busy and idle time of every rank (or pool worker), idle time is measured against the slowest one.
+    """
+    wall_time = max(elapsed for _, _, elapsed in timings)
+    for rank, (busy, units_processed, _) in enumerate(timings):
+        print(f"{label} {rank}: units {units_processed} busy {busy:.3f}s idle {wall_time - busy:.3f}s")
+
+def query_state_dir(state_dir, start_date, end_date, hashtags):
+    """
+    Partial aggregates depend on the filters, each date range and hashtag set keeps its own state.
+    """
+    query = json.dumps([str(start_date), str(end_date), sorted(hashtags)])
+    return os.path.join(state_dir, hashlib.sha1(query.encode()).hexdigest()[:16])
+
+def unit_key(unit):
+    return f"{os.path.abspath(unit.path)}:{unit.first_block}:{unit.last_block}"
+
+@functools.lru_cache(maxsize=64)
+def file_sha1(file_path, size, mtime_ns):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(query_dir):
+    try:
+        with open(os.path.join(query_dir, "manifest.json")) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(query_dir, manifest):
+    """
+    Keep only the entries in manifest and delete the partial aggregates of files that are gone.
+    """
+    partials = {entry["partial"] for entry in manifest.values()}
+    for partial in os.listdir(os.path.join(query_dir, "partials")):
+        if partial not in partials:
+            os.remove(os.path.join(query_dir, "partials", partial))
+    temporary_path = os.path.join(query_dir, "manifest.json.tmp")
+    with open(temporary_path, "w") as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(temporary_path, os.path.join(query_dir, "manifest.json"))
+
+def load_unit_partial(query_dir, unit, entry, names):
+    """
+    Return the stored aggregates of a unit if its file did not change and they include every requested output, or None.
+    The file is hashed only when its size or mtime changed.
+    """
+    if entry is None or entry.get("version") != PARTIAL_VERSION or not set(names) <= set(entry["names"]):
+        return None
+    stat = os.stat(unit.path)
+    if stat.st_size != entry["size"]:
+        return None
+    if stat.st_mtime_ns != entry["mtime_ns"]:
+        if file_sha1(unit.path, stat.st_size, stat.st_mtime_ns) != entry["sha1"]:
+            return None
+        entry["mtime_ns"] = stat.st_mtime_ns
+    with open(os.path.join(query_dir, "partials", entry["partial"]), "rb") as file:
+        aggregates = pickle.load(file)
+    return {name: aggregates[name] for name in [*names, "symbols"]}
+
+def save_unit_partial(query_dir, unit, aggregates):
+    """
+    Store the aggregates of a unit and return its manifest entry.
+    """
+    stat = os.stat(unit.path)
+    partial = hashlib.sha1(unit_key(unit).encode()).hexdigest() + ".pickle"
+    with open(os.path.join(query_dir, "partials", partial), "wb") as file:
+        pickle.dump(aggregates, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        "version": PARTIAL_VERSION,
+        "path": unit.path,
+        "first_block": unit.first_block,
+        "last_block": unit.last_block,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha1": file_sha1(unit.path, stat.st_size, stat.st_mtime_ns),
+        "names": sorted(name for name in aggregates if name != "symbols"),
+        "partial": partial
+    }
+
+def get_decode(decoder):
+    """
+    Decode function of a backend of decoders.py, built once per process.
+    """
+    decode = decode_functions.get(decoder)
+    if decode is None:
+        decode = decode_functions[decoder] = decoders.get_decoder(decoder)[1]
+    return decode
+
+def aggregate_batch_unit(unit, queries, counters, cache_dir=None, entry=None, decode=decoders.decode_json, metrics=None):
+    """
+    Aggregates of every query of a batch for one work unit, keyed by query_key. The tweets are read and decoded
+    once, and each record updates the aggregates of the queries that accept it. Returns (aggregates, None, False)
+    like aggregate_unit, a batch keeps no stored aggregates.
+    """
+    aggregates = new_aggregates(batch_keys(queries))
+    updates = [[(AGGREGATES[aggregate_name(name)][2], aggregates[query_key(query.name, name)], aggregate_name(name) in SKETCH_AGGREGATES)
+                for name in query.names] for query in queries]
+    if cache_dir:
+        records = process_cached_batch_unit(unit, cache_dir, queries, counters, decode, metrics)
     else:
-        return []
+        if metrics is not None:
+            metrics["bytes_read"] += unit.size
+        records = process_batch_lines(read_unit_lines(unit), queries, counters, decode, metrics)
+    symbol_tables = aggregates["symbols"]
+    for record, matched in records:
+        interned_record = symbols.intern_record(symbol_tables, record)
+        for query_index in matched:
+            for update, data, sketch in updates[query_index]:
+                update(data, record if sketch else interned_record)
+        if metrics is not None:
+            profiling.lap(metrics, "aggregate")
+    return aggregates, None, False
+
+def aggregate_unit(unit, start_date, end_date, hashtags, names, counters, cache_dir=None, query_dir=None, entry=None,
+                   decode=decoders.decode_json, metrics=None):
+    """
+    Aggregates of one work unit. With a query_dir the stored aggregates of the unit (manifest entry) are reused if
+    its file did not change, otherwise the new ones are stored.
+    Returns (aggregates, manifest entry or None, whether the stored aggregates were reused).
+    """
+    if query_dir:
+        aggregates = load_unit_partial(query_dir, unit, entry, names)
+        if metrics is not None:
+            profiling.lap(metrics, "incremental")
+        if aggregates is not None:
+            return aggregates, entry, True
+
+    aggregates = new_aggregates(names)
+    if cache_dir:
+        records = process_cached_unit(unit, cache_dir, start_date, end_date, hashtags, counters, decode, metrics)
+    else:
+        records = process_unit(unit, start_date, end_date, hashtags, counters, decode, metrics)
+    if metrics is None:
+        for record in records:
+            update_aggregates(aggregates, record)
+    else:
+        for record in records:
+            update_aggregates(aggregates, record)
+            profiling.lap(metrics, "aggregate")
+    entry = None
+    if query_dir:
+        entry = save_unit_partial(query_dir, unit, aggregates)
+        if metrics is not None:
+            profiling.lap(metrics, "incremental")
+    return aggregates, entry, False
+
+def pool_unit_task(unit_index, unit, unit_task, entry, decoder, with_metrics):
+    """
+    unit_task run by a pool worker, see aggregate_units.
+    """
+    start_time = time.perf_counter()
+    counters = new_filter_counters()
+    metrics = profiling.new_metrics() if with_metrics else None
+    if metrics is not None:
+        metrics["units"] += 1
+    aggregates, entry, reused = unit_task(unit, counters=counters, entry=entry, decode=get_decode(decoder), metrics=metrics)
+    if metrics is not None:
+        profiling.record_worker_rss(metrics)
+    return unit_index, aggregates, entry, reused, counters, metrics, os.getpid(), time.perf_counter() - start_time
+
+def pool_aggregates(pool, units, unit_task, manifest, decoder="json", metrics=None, spill_state=None):
+    """
+    Hand every unit to the workers of pool, largest first, and merge the aggregates into runs as they come back.
+    With a spill_state the runs are spilled to disk whenever the memory budget is exceeded.
+    Returns (runs, filter counters, manifest entries, units reused, (busy, units processed) of every worker).
+    """
+    order = sorted(range(len(units)), key=lambda i: units[i].size, reverse=True)
+    # Only as_completed holds the futures, so the aggregates of a unit are freed once merged or spilled
+    futures = as_completed([pool.submit(pool_unit_task, unit_index, units[unit_index], unit_task, manifest.get(unit_key(units[unit_index])),
+                                        decoder, metrics is not None) for unit_index in order])
+    runs = []
+    counters = new_filter_counters()
+    manifest_entries = {}
+    units_reused = 0
+    workers = {}
+    for future in futures:
+        unit_index, aggregates, entry, reused, unit_counters, unit_metrics, pid, busy = future.result()
+        add_run(runs, (unit_index, unit_index, aggregates))
+        if spill_state is not None and spill.over_budget(spill_state):
+            spill.spill_runs(spill_state, runs)
+        merge_filter_counters(counters, unit_counters)
+        if entry is not None:
+            manifest_entries[unit_key(units[unit_index])] = entry
+        units_reused += reused
+        if metrics is not None:
+            profiling.merge_metrics(metrics, unit_metrics)
+        worker_busy, worker_units = workers.get(pid, (0.0, 0))
+        workers[pid] = (worker_busy + busy, worker_units + 1)
+    return runs, counters, manifest_entries, units_reused, list(workers.values())
+
+def aggregate_units(units, unit_task, names, args, manifest=None, decoder="json", metrics=None, comm=None, pool=None):
+    """
+    Run unit_task on the units of each rank, or on the workers of pool, and reduce the aggregates into rank 0.
+    unit_task(unit, counters=, entry=, decode=, metrics=) returns (aggregates, manifest entry or None, whether the
+    stored aggregates were reused) like aggregate_unit, entry being the one of the unit in manifest. args are the
+    arguments of process_arguments, see get_aggregates for the ones used here.
+    Returns (the merged aggregates, the (manifest entries, units reused) of every rank) on rank 0 and (None, None)
+    on the other ranks.
+    """
+    comm = comm or executors.get_comm()
+    rank = comm.Get_rank()
+    manifest = manifest or {}
+    memory_budget = args["memory_budget"]
+    spill_state = spill.new_spill(memory_budget, args["spill_dir"], rank) if memory_budget else None
+    rss_start = spill.current_rss_mb()
+
+    comm.Barrier()
+    start_time = time.perf_counter()
+    if metrics is not None:
+        profiling.reset_clock(metrics)
+    if pool is not None:
+        runs, counters, manifest_entries, units_reused, timings = pool_aggregates(pool, units, unit_task, manifest, decoder, metrics,
+                                                                                  spill_state)
+        elapsed = time.perf_counter() - start_time
+        timings = [(busy, units_processed, elapsed) for busy, units_processed in timings]
+        if metrics is not None:
+            profiling.reset_clock(metrics)
+    else:
+        decode = get_decode(decoder)
+        busy = 0.0
+        units_processed = 0
+        counters = new_filter_counters()
+        manifest_entries = {}
+        units_reused = 0
+        runs = []
+        for unit_index in assigned_units(comm, units, args["schedule"]):
+            unit_start = time.perf_counter()
+            unit = units[unit_index]
+            if metrics is not None:
+                profiling.lap(metrics, "schedule")
+                metrics["units"] += 1
+            aggregates, entry, reused = unit_task(unit, counters=counters, entry=manifest.get(unit_key(unit)), decode=decode, metrics=metrics)
+            if entry is not None:
+                manifest_entries[unit_key(unit)] = entry
+            units_reused += reused
+            add_run(runs, (unit_index, unit_index, aggregates))
+            if spill_state is not None and spill.over_budget(spill_state):
+                spill.spill_runs(spill_state, runs)
+                if metrics is not None:
+                    profiling.lap(metrics, "spill")
+            units_processed += 1
+            busy += time.perf_counter() - unit_start
+        elapsed = time.perf_counter() - start_time
+        timings = [(busy, units_processed, elapsed)]
+        if metrics is not None:
+            # The last wait of a rank for work that is not coming
+            profiling.lap(metrics, "schedule")
+    if metrics is not None:
+        metrics["lines"] += counters["lines"]
+        metrics["tweets"] += counters["accepted"]
+
+    spilled = False
+    if spill_state is not None:
+        # Also spill when the ranks fit their budget but not the merge of all of them on rank 0
+        spill_counts = comm.gather((spill_state["spills"], spill.current_rss_mb() - rss_start), root=0)
+        spilled = comm.bcast(rank == 0 and (any(spills for spills, _ in spill_counts) or sum(growth for _, growth in spill_counts) > memory_budget), root=0)
+    if spilled:
+        with profiling.stage(metrics, "spill"):
+            spill.spill_runs(spill_state, runs)
+            spill.collect_spills(comm, spill_state)
+    else:
+        if spill_state is not None:
+            spill.remove_spill(spill_state)
+        with profiling.stage(metrics, "reduce"):
+            runs = tree_reduce_runs(comm, runs)
+    with profiling.stage(metrics, "gather"):
+        all_timings = comm.gather(timings, root=0)
+        all_counters = comm.gather(counters, root=0)
+        all_manifest_entries = comm.gather((manifest_entries, units_reused), root=0)
+
+    if rank != 0:
+        return None, None
+    if args["balance_report"]:
+        print_balance_report([timing for rank_timings in all_timings for timing in rank_timings],
+                             "worker" if pool is not None else "rank")
+    if args["filter_stats"]:
+        print_filter_counters(functools.reduce(merge_filter_counters, all_counters))
+    if spilled:
+        if args["verbose"]:
+            print(f"merging the aggregates from disk, {sum(spills for spills, _ in spill_counts)} spills over the memory budget")
+        # A sketch no rank spilled is empty
+        return ({name: new_aggregate(name) if data is None else data for name, data in spill.spilled_aggregates(spill_state, names).items()},
+                all_manifest_entries)
+    # Runs cover every unit once all ranks are merged, so only one is left
+    return (runs[0][2] if runs else new_aggregates(names)), all_manifest_entries
+
+def get_aggregates(args, names, decoder="json", metrics=None, comm=None, pool=None):
+    """
+    Build the partial aggregates of the files assigned to each rank and reduce them into rank 0. args are the
+    arguments of process_arguments: the tweets of args["directory"] are filtered by its dates and hashtags.
+    With a state_dir the partial aggregates of every unit are kept, and only new or changed files are processed.
+    Tweets are decoded with decoder, the name of one of the backends of decoders.py. The stages of each rank are
+    timed into metrics (see profiling.py) when it is given. With an index_dir, the parts of the files the archive
+    index rules out are not read.
+    comm is the communicator of the ranks (MPI.COMM_WORLD by default, see executors.py). With a process pool the
+    units of the rank are handed to its workers instead of being processed in the rank itself, and schedule is not used.
+    With a memory_budget (MB of RSS per rank), the runs of a rank over budget are spilled as sorted runs into spill_dir,
+    and when any rank spilled every run is merged from disk on rank 0 instead of in memory (see spill.py). The graph
+    and JSON aggregates are then spill.SpilledAggregate, which the output functions read back in a final merge.
+    Returns the merged aggregates on rank 0 and None on the other ranks.
+    """
+    comm = comm or executors.get_comm()
+    rank = comm.Get_rank()
+    start_date, end_date, hashtags = args["start_date"], args["end_date"], args["hashtags"]
+
+    with profiling.stage(metrics, "discovery"):
+        units = None
+        if rank == 0:
+            units = find_work_units(find_input_files(args["directory"]), args["split_bytes"])
+            if args["index_dir"]:
+                total_bytes = sum(unit.size for unit in units)
+                units = select_indexed_units(units, args["index_dir"], start_date, end_date, hashtags)
+                if args["verbose"]:
+                    print(f"index selected {sum(unit.size for unit in units) / 1e6:.1f} of {total_bytes / 1e6:.1f} MB")
+        units = comm.bcast(units, root=0)
+
+    manifest = {}
+    query_dir = None
+    if args["state_dir"]:
+        query_dir = query_state_dir(args["state_dir"], start_date, end_date, hashtags)
+        if rank == 0:
+            os.makedirs(os.path.join(query_dir, "partials"), exist_ok=True)
+            manifest = load_manifest(query_dir)
+        manifest = comm.bcast(manifest, root=0)
+
+    unit_task = functools.partial(aggregate_unit, start_date=start_date, end_date=end_date, hashtags=hashtags, names=names,
+                                  cache_dir=args["cache_dir"], query_dir=query_dir)
+    aggregates, all_manifest_entries = aggregate_units(units, unit_task, names, args, manifest, decoder, metrics, comm, pool)
+    if rank == 0 and query_dir:
+        save_manifest(query_dir, {key: entry for entries, _ in all_manifest_entries for key, entry in entries.items()})
+        if args["verbose"]:
+            print(f"reused {sum(reused for _, reused in all_manifest_entries)} of {len(units)} units")
+    return aggregates
+
+def get_batch_aggregates(args, queries, decoder="json", metrics=None, comm=None, pool=None):
+    """
+    get_aggregates for a batch of queries (see load_queries): every unit of args["directory"] is read once for all
+    of them, and the aggregates are keyed by batch_keys. The filters, state_dir, index_dir and memory_budget of args
+    are not used.
+    """
+    comm = comm or executors.get_comm()
+    with profiling.stage(metrics, "discovery"):
+        units = find_work_units(find_input_files(args["directory"]), args["split_bytes"]) if comm.Get_rank() == 0 else None
+        units = comm.bcast(units, root=0)
+    unit_task = functools.partial(aggregate_batch_unit, queries=queries, cache_dir=args["cache_dir"])
+    return aggregate_units(units, unit_task, batch_keys(queries), args, None, decoder, metrics, comm, pool)[0]
 
-def add_node_to_graph(graph, node):
-    if node != "null" and not graph.has_node(node):
-        graph.add_node(node)
+# The only fields of a tweet the output builders need, timestamp is in seconds since the unix epoch
+TweetRecord = namedtuple("TweetRecord", ["tweet_id", "user", "retweeted", "author", "original_tweet_id", "mentions", "timestamp"])
 
-def add_or_update_edge(graph, node1, node2):
-    if not graph.has_edge(node1, node2):
-        graph.add_edge(node1, node2, weight=0)
-    graph[node1][node2]["weight"] += 1
 
 def process_user_tweet(tweet):
     user_screen_name = tweet["user"]["screen_name"] if 'user' in tweet else None
@@ -103,206 +931,753 @@ def process_user_tweet(tweet):
     original_user_screen_name = original_tweet["user"]["screen_name"] if original_tweet else None
 
     return user_screen_name, retweeted, original_tweet, original_user_screen_name
-def create_retweet_graph(tweets):
-    graph = nx.DiGraph()
 
-    for tweet in tweets:
-        user_screen_name, retweeted, _, original_user_screen_name = process_user_tweet(tweet)
+def get_mentioned_users(tweet):
+    return {mention["screen_name"] for mention in entity_list(tweet, "user_mentions") if mention["screen_name"] != "null"}
 
-        if retweeted:
-            add_node_to_graph(graph, user_screen_name)
-            add_node_to_graph(graph, original_user_screen_name)
-            add_or_update_edge(graph, user_screen_name, original_user_screen_name)
+def extract_record(tweet):
+    user_screen_name, retweeted, original_tweet, original_user_screen_name = process_user_tweet(tweet)
+    tweet_date_str = tweet.get("created_at")
+    timestamp = tweet_timestamp(tweet_date_str) if tweet_date_str else None
+    if retweeted:
+        return TweetRecord(tweet.get("id_str"), user_screen_name, True, original_user_screen_name, original_tweet["id_str"], (), timestamp)
+    return TweetRecord(tweet.get("id_str"), user_screen_name, False, None, None, tuple(get_mentioned_users(tweet)), timestamp)
+
+def new_graph_data(directed=True, dense=True):
+    """
+    Edge-weight table of a graph. Nodes are user ids of the symbol tables, numbered in the order networkx would have
+    inserted them, and edges are (source, target, weight) arrays indexed by a dict of packed node numbers. A dense
+    index holds the number plus one of every user id, 0 when it is not a node, otherwise it is a dict of the nodes,
+    for the graphs of a few users out of many such as the ones of every hour.
+    """
+    return {
+        "directed": directed,
+        "nodes": array("i"),
+        "index": array("i") if dense else {},
+        "edges": {},
+        "sources": array("i"),
+        "targets": array("i"),
+        "weights": array("q")
+    }
 
+def add_graph_node(graph_data, node):
+    index = graph_data["index"]
+    if isinstance(index, dict):
+        node_id = index.get(node)
+        if node_id is None:
+            node_id = index[node] = len(graph_data["nodes"])
+            graph_data["nodes"].append(node)
+        return node_id
+    if node >= len(index):
+        index.frombytes(bytes(index.itemsize * (node + 1 - len(index))))
+    node_id = index[node] - 1
+    if node_id < 0:
+        node_id = len(graph_data["nodes"])
+        index[node] = node_id + 1
+        graph_data["nodes"].append(node)
+    return node_id
+
+def add_edge_ids(graph_data, source, target, weight=1):
+    edges = graph_data["edges"]
+    key = (source << 32) | target
+    if not graph_data["directed"] and ((target << 32) | source) in edges:
+        key = (target << 32) | source
+    edge = edges.get(key)
+    if edge is None:
+        edges[key] = len(graph_data["weights"])
+        graph_data["sources"].append(source)
+        graph_data["targets"].append(target)
+        graph_data["weights"].append(weight)
+    else:
+        graph_data["weights"][edge] += weight
+
+def add_graph_edge(graph_data, node1, node2, weight=1):
+    add_edge_ids(graph_data, add_graph_node(graph_data, node1), add_graph_node(graph_data, node2), weight)
+
+def merge_graph_data(graph_data, other, user_map, tweet_map=None):
+    node_ids = [add_graph_node(graph_data, node) for node in user_map[symbols.column(other["nodes"])].tolist()]
+    for source, target, weight in zip(other["sources"], other["targets"], other["weights"]):
+        add_edge_ids(graph_data, node_ids[source], node_ids[target], weight)
+    return graph_data
+
+def graph_names(graph_data, symbol_tables):
+    users = symbol_tables["users"]["values"]
+    return [users[node] for node in graph_data["nodes"]]
+
+def build_graph(graph_data, symbol_tables):
+    import networkx as nx
+    graph = nx.DiGraph() if graph_data["directed"] else nx.Graph()
+    names = graph_names(graph_data, symbol_tables)
+    graph.add_nodes_from(names)
+    graph.add_weighted_edges_from((names[source], names[target], weight)
+                                  for source, target, weight in zip(graph_data["sources"], graph_data["targets"], graph_data["weights"]))
     return graph
-def update_retweet_json_data(retweets_data, user_screen_name, original_tweet, original_user_screen_name):
-    original_tweet_id = original_tweet["id_str"]
-    if original_user_screen_name not in retweets_data:
-        retweets_data[original_user_screen_name] = {
-            'username': original_user_screen_name, 
-            "receivedRetweets": 0,
-            "tweets": {}
-        }
 
-    if original_tweet_id not in retweets_data[original_user_screen_name]["tweets"]:
-        retweets_data[original_user_screen_name]["tweets"][original_tweet_id] = {
-            "retweetedBy": []
-        }
+def aggregate_tweets(tweets, name):
+    """
+    Aggregate name of a list of tweets, returns (aggregate, symbol tables).
+    """
+    aggregates = new_aggregates([name])
+    for tweet in tweets:
+        update_aggregates(aggregates, extract_record(tweet))
+    return aggregates[name], aggregates["symbols"]
 
-    if user_screen_name not in retweets_data[original_user_screen_name]["tweets"][original_tweet_id]["retweetedBy"]:
-        retweets_data[original_user_screen_name]["tweets"][original_tweet_id]["retweetedBy"].append(user_screen_name)
-        retweets_data[original_user_screen_name]["receivedRetweets"] += 1
+def update_retweet_graph_data(graph_data, record):
+    if record.retweeted:
+        add_graph_node(graph_data, record.user)
+        add_graph_node(graph_data, record.author)
+        add_graph_edge(graph_data, record.user, record.author)
 
-def create_retweet_json(tweets):
-    retweets_data = {}
+def create_retweet_graph(tweets):
+    return build_graph(*aggregate_tweets(tweets, "retweet_graph"))
 
-    for tweet in tweets:
-        user_screen_name, retweeted, original_tweet, original_user_screen_name = process_user_tweet(tweet)
+# Columns whose rows make a retweet JSON and a co-retweet JSON aggregate
+RETWEET_JSON_KEYS = ["authors", "tweets", "retweeters"]
+CORETWEET_JSON_KEYS = ["retweeters", "authors"]
 
-        if retweeted:
-            update_retweet_json_data(retweets_data, user_screen_name, original_tweet, original_user_screen_name)
+def new_retweet_json_data():
+    """
+    One (author, original tweet, retweeter) row per retweet. A retweeter counts once per tweet, repeated rows are
+    dropped whenever the rows double (see symbols.compact_rows) and when the JSON is built.
+    """
+    return {"authors": array("i"), "tweets": array("q"), "retweeters": array("i"), "compact_at": symbols.COMPACT_ROWS}
+
+def update_retweet_json_record(retweets_data, record):
+    if record.retweeted:
+        retweets_data["authors"].append(record.author)
+        retweets_data["tweets"].append(record.original_tweet_id)
+        retweets_data["retweeters"].append(record.user)
+        symbols.compact_rows(retweets_data, RETWEET_JSON_KEYS)
+
+def merge_retweet_json_data(retweets_data, other, user_map, tweet_map):
+    symbols.append_mapped(retweets_data["authors"], other["authors"], user_map)
+    symbols.append_tweets(retweets_data["tweets"], other["tweets"], tweet_map)
+    symbols.append_mapped(retweets_data["retweeters"], other["retweeters"], user_map)
+    symbols.compact_rows(retweets_data, RETWEET_JSON_KEYS)
+    return retweets_data
+
+def ranked_groups(keys):
+    """
+    Rows of each distinct key, groups sorted by size and then by first row, as a stable sort of the users in order
+    of first appearance by their count.
+    """
+    order, starts, ends = symbols.groups(keys)
+    for group in np.argsort(starts - ends, kind="stable").tolist():
+        yield order[starts[group]:ends[group]]
 
-    sorted_retweets = sorted(retweets_data.values(), key=lambda x: x['receivedRetweets'], reverse=True)
-    return {'retweets': sorted_retweets}
+def iter_retweet_json(retweets_data, symbol_tables=None):
+    """
+    Yield the retweets entries sorted by received retweets, in the output shape, one user at a time.
+    """
+    if isinstance(retweets_data, spill.SpilledAggregate):
+        yield from spill.merged_retweet_json(retweets_data)
+        return
+    users = symbol_tables["users"]["values"]
+    authors, tweets, retweeters = (symbols.column(retweets_data[key]) for key in ("authors", "tweets", "retweeters"))
+    unique = symbols.first_occurrences(authors, tweets, retweeters)
+    authors, tweets, retweeters = authors[unique], tweets[unique], retweeters[unique]
+    for rows in ranked_groups(authors):
+        retweeted_by = {}
+        for tweet, retweeter in zip(tweets[rows].tolist(), retweeters[rows].tolist()):
+            retweeted_by.setdefault(tweet, []).append(users[retweeter])
+        yield {
+            'username': users[authors[rows[0]]],
+            "receivedRetweets": len(rows),
+            "tweets": {symbols.tweet_value(symbol_tables, tweet): {"retweetedBy": tweet_retweeters} for tweet, tweet_retweeters in retweeted_by.items()}
+        }
 
-def create_mention_graph(tweets):
-    graph = nx.DiGraph()
+def build_retweet_json(retweets_data, symbol_tables=None):
+    return {'retweets': list(iter_retweet_json(retweets_data, symbol_tables))}
 
-    for tweet in tweets:
-        user_screen_name, retweeted, _, _ = process_user_tweet(tweet)
-        if not retweeted and user_screen_name:
-            mentioned_users = {mention["screen_name"] for mention in tweet.get("entities", {}).get("user_mentions", []) if mention["screen_name"] != "null"}
+def create_retweet_json(tweets):
+    return build_retweet_json(*aggregate_tweets(tweets, "retweet_json"))
 
-            add_node_to_graph(graph, user_screen_name)
-            for mentioned_user in mentioned_users:
-                add_node_to_graph(graph, mentioned_user)
-                add_or_update_edge(graph, user_screen_name, mentioned_user)
+def update_mention_graph_data(graph_data, record):
+    if not record.retweeted and record.user not in (symbols.NONE, symbols.EMPTY):
+        if record.user != symbols.NULL:
+            add_graph_node(graph_data, record.user)
+        for mentioned_user in record.mentions:
+            add_graph_node(graph_data, mentioned_user)
+            add_graph_node(graph_data, record.user)
+            add_graph_edge(graph_data, record.user, mentioned_user)
 
-    return graph
+def create_mention_graph(tweets):
+    return build_graph(*aggregate_tweets(tweets, "mention_graph"))
+
+def new_coretweet_json_data():
+    """
+    One (retweeter, author) row per retweet, repeated pairs are dropped whenever the rows double and when the
+    incidence matrix is built.
+    """
+    return {"retweeters": array("i"), "authors": array("i"), "compact_at": symbols.COMPACT_ROWS}
+
+def update_coretweet_json_data(retweet_dict, record):
+    retweeter = record.user
+
+    # Check if the tweet is a retweet
+    if record.retweeted and retweeter != symbols.NONE:
+        author = record.author
+        if author != retweeter and author != symbols.NULL and retweeter != symbols.NULL:
+            retweet_dict["retweeters"].append(retweeter)
+            retweet_dict["authors"].append(author)
+            symbols.compact_rows(retweet_dict, CORETWEET_JSON_KEYS)
+
+def merge_coretweet_json_data(retweet_dict, other, user_map, tweet_map=None):
+    symbols.append_mapped(retweet_dict["retweeters"], other["retweeters"], user_map)
+    symbols.append_mapped(retweet_dict["authors"], other["authors"], user_map)
+    symbols.compact_rows(retweet_dict, CORETWEET_JSON_KEYS)
+    return retweet_dict
+
+def build_coretweet_json(retweet_dict, symbol_tables=None, min_support=1, top_k=None):
+    """
+    Co-retweet JSON computed as a sparse product of the author x retweeter incidence matrix with its transpose.
+    Only pairs with at least min_support common retweeters are kept, and only the top_k of them if given. Its
+    coretweets are an iterator, written one pair at a time by save_json_list.
+    """
+    authors, retweeters, matrix = coretweet_incidence(retweet_dict, symbol_tables)
+    pairs = coretweets.compute_pairs(matrix, coretweets.row_blocks(matrix.shape[0]), min_support, top_k)
+    return {'coretweets': coretweets.pairs_to_json(authors, retweeters, coretweets.merge_pairs([pairs]))}
+
+def coretweet_incidence(retweet_dict, symbol_tables=None):
+    """
+    (authors, retweeters, matrix) of a co-retweet aggregate: the author x retweeter incidence matrix, with authors
+    sorted by name, so for a pair of rows i < j the first author of the pair is authors[i], and retweeters in order
+    of first appearance.
+    """
+    if isinstance(retweet_dict, spill.SpilledAggregate):
+        return spill.merged_coretweet_matrix(retweet_dict)
+    users = symbol_tables["users"]["values"]
+    retweeter_ids, author_ids = symbols.column(retweet_dict["retweeters"]), symbols.column(retweet_dict["authors"])
+    unique = symbols.first_occurrences(retweeter_ids, author_ids)
+    retweeter_ids, author_ids = retweeter_ids[unique], author_ids[unique]
+
+    columns = np.zeros(len(users), dtype=np.int64)
+    retweeters = retweeter_ids[symbols.first_occurrences(retweeter_ids)]
+    columns[retweeters] = np.arange(len(retweeters))
+    rows = np.zeros(len(users), dtype=np.int64)
+    authors = sorted(np.unique(author_ids).tolist(), key=users.__getitem__)
+    rows[authors] = np.arange(len(authors))
+    return ([users[author] for author in authors], [users[retweeter] for retweeter in retweeters.tolist()],
+            coretweets.incidence_matrix(rows[author_ids], columns[retweeter_ids], len(authors), len(retweeters)))
 
 def create_coretweet_json(tweets):
-    retweet_dict = {}
-    coretweets = []
-    index_guide = {}
-    index = 0
+    coretweet_json = build_coretweet_json(*aggregate_tweets(tweets, "coretweet_json"))
+    return {'coretweets': list(coretweet_json['coretweets'])}
 
-    for tweet in tweets:
-        retweeter = tweet['user']['screen_name']
+def update_coretweet_graph_data(graph_data, record):
+    if record.retweeted and record.user not in (symbols.NONE, symbols.EMPTY):
+        author = record.author
+        if author != symbols.NULL and record.user != symbols.NULL and author != record.user:
+            add_graph_node(graph_data, author)
+            add_graph_node(graph_data, record.user)
+            add_graph_edge(graph_data, author, record.user)
 
-        # Check if the tweet is a retweet
-        if 'retweeted_status' in tweet and 'user' in tweet:
-            author = tweet['retweeted_status']['user']['screen_name']
-            if author != retweeter and author != "null" and retweeter != "null":
-                # Update the retweet dictionary
-                retweet_dict.setdefault(retweeter, []).append(author)
+def create_coretweet_graph(tweets):
+    return build_graph(*aggregate_tweets(tweets, "coretweet_graph"))
 
-    result = {}
-    for key, authors_list in retweet_dict.items():
-        seen_authors = set()
-        for author in authors_list:
-            if author not in seen_authors and author != key:
-                seen_authors.add(author)
+def new_window_data(directed=True):
+    """
+    Graph of each hour of tweets, keyed by hours since the unix epoch. The graphs of any time window are built
+    from them when the output is written (see windows.py).
+    """
+    return {"directed": directed, "hours": {}}
+
+def update_window_data(window_data, record, update_graph_data):
+    if record.timestamp is None:
+        return
+    hour = record.timestamp // 3600
+    graph_data = window_data["hours"].get(hour)
+    if graph_data is None:
+        graph_data = window_data["hours"][hour] = new_graph_data(window_data["directed"], dense=False)
+    update_graph_data(graph_data, record)
+
+def merge_window_data(window_data, other, user_map, tweet_map=None):
+    for hour, graph_data in other["hours"].items():
+        if hour not in window_data["hours"]:
+            window_data["hours"][hour] = new_graph_data(window_data["directed"], dense=False)
+        merge_graph_data(window_data["hours"][hour], graph_data, user_map)
+    return window_data
+
+def window_names(window_data, symbol_tables):
+    """
+    Hourly graphs of a window aggregate with the names of their nodes, as windows.py takes them.
+    """
+    return {hour: dict(graph_data, names=graph_names(graph_data, symbol_tables)) for hour, graph_data in window_data["hours"].items()}
 
-        # Store the pair in the dictionary
-        for combo in combinations(seen_authors, 2):
-            author_pair = tuple(sorted(combo))
-            if author_pair not in result:
-                result[author_pair] = {
-                    'authors': {'u1': author_pair[0], 'u2': author_pair[1]},
-                    'totalCoretweets': 0,
-                    'retweeters': set()
-                }
-                index_guide[author_pair] = index
-                index += 1
-                coretweets.append(result[author_pair])
 
-            result[author_pair]['retweeters'].add(key)
-            result[author_pair]['totalCoretweets'] += 1
+def new_mention_json_data():
+    """
+    One (mentioned user, mentioning user, tweet) row per mention, grouped when the JSON is built.
+    """
+    return {"mentioned": array("i"), "mentioners": array("i"), "tweets": array("q")}
+
+def update_mention_json_record(mentions_data, record):
+    if not record.retweeted and record.user not in (symbols.NONE, symbols.EMPTY):
+        for mentioned_user in record.mentions:
+            mentions_data["mentioned"].append(mentioned_user)
+            mentions_data["mentioners"].append(record.user)
+            mentions_data["tweets"].append(record.tweet_id)
+
+def merge_mention_json_data(mentions_data, other, user_map, tweet_map):
+    symbols.append_mapped(mentions_data["mentioned"], other["mentioned"], user_map)
+    symbols.append_mapped(mentions_data["mentioners"], other["mentioners"], user_map)
+    symbols.append_tweets(mentions_data["tweets"], other["tweets"], tweet_map)
+    return mentions_data
+
+def iter_mention_json(mentions_data, symbol_tables=None):
+    """
+    Yield the mentions entries sorted by received mentions, in the output shape, one user at a time.
+    """
+    if isinstance(mentions_data, spill.SpilledAggregate):
+        yield from spill.merged_mention_json(mentions_data)
+        return
+    users = symbol_tables["users"]["values"]
+    mentioned, mentioners, tweets = (symbols.column(mentions_data[key]) for key in ("mentioned", "mentioners", "tweets"))
+    for rows in ranked_groups(mentioned):
+        mentions = {}
+        for mentioner, tweet in zip(mentioners[rows].tolist(), tweets[rows].tolist()):
+            mentions.setdefault(mentioner, []).append(symbols.tweet_value(symbol_tables, tweet))
+        yield {
+            "username": users[mentioned[rows[0]]],
+            "receivedMentions": len(rows),
+            "mentions": [{"mentionBy": users[mentioner], "tweets": mentioner_tweets} for mentioner, mentioner_tweets in mentions.items()]
+        }
 
-    # Updating the coretweets list with the final count and retweeters
-    for author_pair, data in result.items():
-        coretweets[index_guide[author_pair]]['retweeters'] = list(data['retweeters'])
+def build_mention_json(mentions_data, symbol_tables=None):
+    return {'mentions': list(iter_mention_json(mentions_data, symbol_tables))}
 
-    # Sort the coretweets list by the total number of coretweets
-    sorted_coretweets = sorted(coretweets, key=lambda x: x['totalCoretweets'], reverse=True)
+def create_mention_json(tweets):
+    return build_mention_json(*aggregate_tweets(tweets, "mention_json"))
 
-    return {'coretweets': sorted_coretweets}
+def new_retweet_sketch(error=sketches.DEFAULT_ERROR, precision=sketches.DEFAULT_PRECISION):
+    """
+    Bounded-memory summary of the retweets: heavy hitters of the retweeted users and distinct authors, retweeters
+    and retweeted tweets. Sketches keep screen names, records are not interned for them.
+    """
+    return sketches.new_sketch(error, precision, ["retweets"], ["authors", "retweeters", "tweets"])
+
+def update_retweet_sketch(sketch, record):
+    if record.retweeted and record.author is not None:
+        sketches.add(sketch["summary"], record.author)
+        sketches.count(sketch, "retweets")
+        sketches.hll_add(sketch["distinct"]["authors"], record.author)
+        if record.user is not None:
+            sketches.hll_add(sketch["distinct"]["retweeters"], record.user)
+        if record.original_tweet_id is not None:
+            sketches.hll_add(sketch["distinct"]["tweets"], record.original_tweet_id)
+
+def new_mention_sketch(error=sketches.DEFAULT_ERROR, precision=sketches.DEFAULT_PRECISION):
+    """
+    Bounded-memory summary of the mentions: heavy hitters of the mentioned users, and distinct mentioned and mentioning users.
+    """
+    return sketches.new_sketch(error, precision, ["tweets", "mentions"], ["mentioned", "mentioners"])
+
+def update_mention_sketch(sketch, record):
+    if not record.retweeted and record.user and record.mentions:
+        sketches.count(sketch, "tweets")
+        sketches.count(sketch, "mentions", len(record.mentions))
+        sketches.hll_add(sketch["distinct"]["mentioners"], record.user)
+        for mentioned_user in record.mentions:
+            sketches.add(sketch["summary"], mentioned_user)
+            sketches.hll_add(sketch["distinct"]["mentioned"], mentioned_user)
+
+def new_coretweet_sketch(error=sketches.DEFAULT_ERROR, precision=sketches.DEFAULT_PRECISION):
+    """
+    Bounded-memory summary of the co-retweets: the authors of a sample of the retweeters (see sketches.new_sample),
+    and distinct authors and retweeters.
+    """
+    return sketches.new_sketch(error, precision, ["retweets"], ["authors", "retweeters"], summary=False, sample=True)
 
+def update_coretweet_sketch(sketch, record):
+    retweeter, author = record.user, record.author
+    if record.retweeted and retweeter is not None and author is not None and author != retweeter and "null" not in (author, retweeter):
+        sketches.sample_add(sketch["sample"], retweeter, author)
+        sketches.count(sketch, "retweets")
+        sketches.hll_add(sketch["distinct"]["authors"], author)
+        sketches.hll_add(sketch["distinct"]["retweeters"], retweeter)
 
+def merge_sketch_data(sketch, other, user_map=None, tweet_map=None):
+    return sketches.merge_sketch(sketch, other)
 
+def build_retweet_top_json(sketch, top_k):
+    """
+    Most retweeted users. Their totalRetweets count every retweet, the receivedRetweets of the retweet JSON count
+    a retweeter once per tweet.
+    """
+    return {
+        "stats": sketches.sketch_stats(sketch),
+        "retweets": [{"username": user, "totalRetweets": count} for user, count in sketches.top(sketch["summary"], top_k)]
+    }
 
+def build_mention_top_json(sketch, top_k):
+    return {
+        "stats": sketches.sketch_stats(sketch),
+        "mentions": [{"username": user, "receivedMentions": count} for user, count in sketches.top(sketch["summary"], top_k)]
+    }
 
-def create_coretweet_graph(tweets):
-    graph = nx.Graph()
+def build_coretweet_top_json(sketch, top_k, min_support=1):
+    """
+    Co-retweet pairs of the sampled retweeters, scaled to all of them, in the shape of the co-retweet JSON without
+    the retweeters. They are exact while the sample holds every retweeter.
+    """
+    return {
+        "stats": sketches.sketch_stats(sketch),
+        "coretweets": [{"authors": {"u1": first, "u2": second}, "totalCoretweets": count}
+                       for first, second, count in sketches.sample_pairs(sketch["sample"], top_k, min_support)]
+    }
 
-    for tweet in tweets:
-        user_screen_name, retweeted, original_tweet, _ = process_user_tweet(tweet)
-        if retweeted and user_screen_name and original_tweet:
-            author = original_tweet["user"]["screen_name"]
-            if author != "null" and user_screen_name != "null" and author != user_screen_name:
-                add_node_to_graph(graph, author)
-                add_node_to_graph(graph, user_screen_name)
-                add_or_update_edge(graph, author, user_screen_name)
 
-    return graph
+# Partial aggregate kept for every requested output: (args flag, constructor, per-record update, merge). The updates
+# take records interned by symbols.intern_record, and merges the id mappings of symbols.merge_symbols
+AGGREGATES = {
+    "retweet_graph": ("generate_rt_graph", new_graph_data, update_retweet_graph_data, merge_graph_data),
+    "retweet_json": ("generate_rt_json", new_retweet_json_data, update_retweet_json_record, merge_retweet_json_data),
+    "mention_graph": ("generate_mention_graph", new_graph_data, update_mention_graph_data, merge_graph_data),
+    "mention_json": ("generate_mention_json", new_mention_json_data, update_mention_json_record, merge_mention_json_data),
+    "coretweet_graph": ("generate_co_rt_graph", lambda: new_graph_data(directed=False), update_coretweet_graph_data, merge_graph_data),
+    "coretweet_json": ("generate_co_rt_json", new_coretweet_json_data, update_coretweet_json_data, merge_coretweet_json_data),
+    "retweet_windows": ("window_rt_graph", new_window_data,
+                        lambda window_data, record: update_window_data(window_data, record, update_retweet_graph_data), merge_window_data),
+    "mention_windows": ("window_mention_graph", new_window_data,
+                        lambda window_data, record: update_window_data(window_data, record, update_mention_graph_data), merge_window_data),
+    "coretweet_windows": ("window_co_rt_graph", lambda: new_window_data(directed=False),
+                          lambda window_data, record: update_window_data(window_data, record, update_coretweet_graph_data), merge_window_data),
+    "retweet_sketch": ("sketch_rt", new_retweet_sketch, update_retweet_sketch, merge_sketch_data),
+    "mention_sketch": ("sketch_mention", new_mention_sketch, update_mention_sketch, merge_sketch_data),
+    "coretweet_sketch": ("sketch_co_rt", new_coretweet_sketch, update_coretweet_sketch, merge_sketch_data),
+}
+
+# Aggregates of the tweets with mentions, the others only read retweets
+MENTION_AGGREGATES = {"mention_graph", "mention_json", "mention_windows"}
+# Aggregates updated with the records as they are, and keyed with their error and precision (see aggregate_key)
+SKETCH_AGGREGATES = {"retweet_sketch", "mention_sketch", "coretweet_sketch"}
+
+# A named query of a batch: its filters and the names of the aggregates it requests
+Query = namedtuple("Query", ["name", "start_date", "end_date", "hashtags", "names"])
+
+def query_key(query_name, name):
+    return f"{query_name}/{name}"
+
+def aggregate_name(key):
+    """
+    Name in AGGREGATES of a key of the aggregates, keys of a batch are prefixed by their query (see query_key)
+    and keys of sketches are followed by their options (see aggregate_key).
+    """
+    return key.rpartition("/")[2].partition(":")[0]
 
+def aggregate_key(name, args):
+    """
+    Key of the aggregate name for the arguments. Sketches built with other options cannot be merged, so their
+    error and precision are part of the key.
+    """
+    if name in SKETCH_AGGREGATES:
+        return f"{name}:{args['sketch_error']!r}:{args['sketch_precision']}"
+    return name
 
-def update_mention_json_data(mentions_data, user_screen_name, mentioned_user, tweet_id):
-    if mentioned_user not in mentions_data:
-        mentions_data[mentioned_user] = {
-            "username": mentioned_user,
-            "receivedMentions": 0,
-            "mentions": []
-        }
+def new_aggregate(key):
+    """
+    Empty aggregate of a key of the aggregates.
+    """
+    options = key.rpartition("/")[2].split(":")[1:]
+    if options:
+        return AGGREGATES[aggregate_name(key)][1](float(options[0]), int(options[1]))
+    return AGGREGATES[aggregate_name(key)][1]()
 
-    existing_mention = None
-    for mention in mentions_data[mentioned_user]["mentions"]:
-        if mention["mentionBy"] == user_screen_name:
-            existing_mention = mention
-            break
-
-    if not existing_mention:
-        mentions_data[mentioned_user]["mentions"].append({
-            "mentionBy": user_screen_name,
-            "tweets": [tweet_id]
-        })
-    else:
-        existing_mention["tweets"].append(tweet_id)
+def batch_keys(queries):
+    return [query_key(query.name, name) for query in queries for name in query.names]
 
-    mentions_data[mentioned_user]["receivedMentions"] += 1
+def query_aggregates(aggregates, query_name):
+    """
+    The aggregates of one query of a batch, keyed by name, with the symbol tables shared by the whole batch.
+    """
+    prefix = query_key(query_name, "")
+    query_data = {key[len(prefix):]: data for key, data in aggregates.items() if key.startswith(prefix)}
+    query_data["symbols"] = aggregates["symbols"]
+    return query_data
 
-def create_mention_json(tweets):
-    mentions_data = {}
+def requested_aggregates(args):
+    return [aggregate_key(name, args) for name, (flag, _, _, _) in AGGREGATES.items() if args[flag]]
 
-    for tweet in tweets:
-        user_screen_name, retweeted, _, _ = process_user_tweet(tweet)
+def new_aggregates(names):
+    """
+    Aggregates of names, plus the "symbols" tables (see symbols.py) they all share.
+    """
+    aggregates = {name: new_aggregate(name) for name in names}
+    kinds = {aggregate_name(name) for name in names} - SKETCH_AGGREGATES
+    aggregates["symbols"] = symbols.new_symbols(retweets=not MENTION_AGGREGATES.issuperset(kinds),
+                                                mentions=not MENTION_AGGREGATES.isdisjoint(kinds))
+    return aggregates
+
+def update_aggregates(aggregates, record):
+    interned_record = symbols.intern_record(aggregates["symbols"], record)
+    for name, data in aggregates.items():
+        if name in AGGREGATES:
+            AGGREGATES[name][2](data, interned_record)
+        elif name != "symbols":
+            AGGREGATES[aggregate_name(name)][2](data, record)
+
+def merge_aggregates(aggregates, other):
+    """
+    Merge other into aggregates, other must come from tweets that follow the ones already in aggregates.
+    """
+    user_map, tweet_map = symbols.merge_symbols(aggregates["symbols"], other["symbols"])
+    for name, data in other.items():
+        if name != "symbols":
+            aggregates[name] = AGGREGATES[aggregate_name(name)][3](aggregates[name], data, user_map, tweet_map)
+    return aggregates
 
-        if not retweeted and user_screen_name:
-            mentioned_users = {mention["screen_name"] for mention in tweet.get("entities", {}).get("user_mentions", []) if mention["screen_name"] != "null"}
-            
-            for mentioned_user in mentioned_users:
-                update_mention_json_data(mentions_data, user_screen_name, mentioned_user, tweet["id_str"])
+def add_run(runs, run):
+    """
+    Insert a (first unit index, last unit index, aggregates) run, merging it with the runs of adjacent units.
+    """
+    runs.append(run)
+    runs.sort(key=lambda run: run[0])
+    merged_runs = [runs[0]]
+    for first_index, last_index, aggregates in runs[1:]:
+        previous_first, previous_last, previous_aggregates = merged_runs[-1]
+        if previous_last + 1 == first_index:
+            merged_runs[-1] = (previous_first, last_index, merge_aggregates(previous_aggregates, aggregates))
+        else:
+            merged_runs.append((first_index, last_index, aggregates))
+    runs[:] = merged_runs
 
-    sorted_mentions = sorted(mentions_data.values(), key=lambda x: x['receivedMentions'], reverse=True)
-    return {'mentions': sorted_mentions}
+def tree_reduce_runs(comm, runs):
+    """
+    Binomial tree reduction of the runs of every rank into rank 0.
+    """
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    step = 1
+    while step < size:
+        if rank % (2 * step) == step:
+            comm.send(runs, dest=rank - step)
+            return []
+        if rank + step < size:
+            for run in comm.recv(source=rank + step):
+                add_run(runs, run)
+        step *= 2
+    return runs
+
+def save_graph_data(graph_data, output_path, compact=False, compression=None, symbol_tables=None, node_attributes=()):
+    """
+    Stream a graph aggregate to a GEXF file without building the networkx graph. Its nodes are resolved to names
+    with symbol_tables, without them graph_data must hold the "names" of its nodes. The save_* functions print the
+    error of an output they could not write and return False.
+    """
+    try:
+        file, output_path = writers.open_output(output_path, compression)
+        with file:
+            if isinstance(graph_data, spill.SpilledAggregate):
+                names, edges = spill.merged_graph(graph_data)
+                writers.write_gexf_edges(file, names, edges, graph_data.directed, compact, node_attributes)
+            else:
+                names = graph_data["names"] if symbol_tables is None else graph_names(graph_data, symbol_tables)
+                writers.write_gexf(file, names, graph_data["sources"], graph_data["targets"], graph_data["weights"],
+                                   graph_data["directed"], compact, node_attributes)
+    except Exception as e:
+        print(f"Error saving output to {output_path}: {e}")
+        return False
+    return True
 
+def save_json_list(data, output_path, compact=False, compression=None):
+    """
+    Stream a {key: [items]} output one item at a time.
+    """
+    try:
+        file, output_path = writers.open_output(output_path, compression)
+        with file:
+            (key, items), = data.items()
+            writers.write_json_list(file, key, items, compact)
+    except Exception as e:
+        print(f"Error saving output to {output_path}: {e}")
+        return False
+    return True
 
-def save_output(data, output_path):
+def save_json(data, output_path, compact=False, compression=None):
     try:
-        if isinstance(data, nx.Graph):
-            nx.write_gexf(data, output_path)
-        elif isinstance(data, dict) and output_path.endswith(".json"):
-            with open(output_path, "w") as file:
-                json.dump(data, file, indent=4)
-        else:
-            print(f"Unsupported data type for output: {output_path}")
+        file, output_path = writers.open_output(output_path, compression)
+        with file:
+            writers.text_writer(file)(json.dumps(data, indent=None if compact else 4, separators=(",", ":") if compact else None))
     except Exception as e:
         print(f"Error saving output to {output_path}: {e}")
+        return False
+    return True
+
+def named_graph_data(graph_data, symbol_tables):
+    """
+    Graph aggregate with the names of its nodes and no symbol tables, the edges of a spilled one are merged from disk
+    into arrays.
+    """
+    if isinstance(graph_data, spill.SpilledAggregate):
+        names, edges = spill.merged_graph(graph_data)
+        sources, targets, weights = array("i"), array("i"), array("q")
+        for source, target, weight in edges:
+            sources.append(source)
+            targets.append(target)
+            weights.append(weight)
+        return {"directed": graph_data.directed, "names": names, "sources": sources, "targets": targets, "weights": weights}
+    names = graph_data["names"] if symbol_tables is None else graph_names(graph_data, symbol_tables)
+    return {**graph_data, "names": names}
+
+def metrics_attributes(node_metrics):
+    """
+    GEXF node attributes of the metrics of analytics.graph_metrics.
+    """
+    return [(name, "double" if values.dtype.kind == "f" else "long", values.tolist()) for name, values in node_metrics.items()]
+
+def build_metrics_json(graph_data, node_metrics, graph_stats, top_k):
+    """
+    Ranked JSON of the metrics of a graph: its top_k nodes by PageRank and by degree, and its largest components.
+    """
+    names = graph_data["names"]
+    component_sizes = graph_stats["componentSizes"].tolist()
+    metrics_json = {"stats": {"nodes": len(names), "edges": len(graph_data["weights"]), "components": len(component_sizes),
+                              "largestComponent": component_sizes[0] if component_sizes else 0,
+                              "pagerankConverged": graph_stats["pagerankConverged"]}}
+    rankings = [("pagerank", ["pagerank"])]
+    if graph_data["directed"]:
+        rankings += [("inDegree", ["inDegree", "weightedInDegree"]), ("outDegree", ["outDegree", "weightedOutDegree"])]
+    else:
+        rankings.append(("degree", ["degree", "weightedDegree"]))
+    for key, columns in rankings:
+        metrics_json[key] = [{"username": names[node], **{column: node_metrics[column][node].item() for column in columns}}
+                             for node in analytics.ranking([node_metrics[column] for column in columns], top_k).tolist()]
+    metrics_json["components"] = [{"component": number, "size": size} for number, size in enumerate(component_sizes[:top_k])]
+    return metrics_json
+
+def save_graph_output(graph_data, output_path, metrics_path, args, symbol_tables, metrics=None):
+    """
+    Write a graph aggregate to output_path. With --analytics its PageRank, degrees and component are computed on a
+    sparse matrix first, written as node attributes and ranked into metrics_path.
+    """
+    if not args["analytics"]:
+        with profiling.stage(metrics, f"output {output_path}"):
+            return save_graph_data(graph_data, output_path, args["compact"], args["compression"], symbol_tables)
+
+    with profiling.stage(metrics, f"analytics {output_path}"):
+        graph_data = named_graph_data(graph_data, symbol_tables)
+        node_metrics, graph_stats = analytics.graph_metrics(len(graph_data["names"]), graph_data["sources"], graph_data["targets"],
+                                                            graph_data["weights"], graph_data["directed"])
+        if not graph_stats["pagerankConverged"]:
+            print(f"PageRank of {output_path} did not converge in {analytics.PAGERANK_MAX_ITER} iterations")
+    with profiling.stage(metrics, f"output {output_path}"):
+        saved = save_graph_data(graph_data, output_path, args["compact"], args["compression"], node_attributes=metrics_attributes(node_metrics))
+    with profiling.stage(metrics, f"output {metrics_path}"):
+        return save_json(build_metrics_json(graph_data, node_metrics, graph_stats, args["analytics_top_k"]), metrics_path,
+                         args["compact"], args["compression"]) and saved
+
+def save_window_graphs(window_data, symbol_tables, prefix, args, output_dir=""):
+    """
+    Write the graph of every time window to windows/<prefix>-<start>--<end>.gexf, or all of them as one dynamic
+    GEXF, windows/<prefix>-dynamic.gexf.
+    """
+    bucket_hours = windows.BUCKET_HOURS[args["time_buckets"]]
+    windows_dir = os.path.join(output_dir, "windows")
+    try:
+        os.makedirs(windows_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error saving output to {windows_dir}: {e}")
+        return False
+    if args["dynamic"]:
+        names, node_spells, edges = windows.dynamic_graph(window_names(window_data, symbol_tables), bucket_hours)
+        node_spells = [[(windows.hour_datetime(start), windows.hour_datetime(end)) for start, end in spells] for spells in node_spells]
+        edges = [(source, target, [(windows.hour_datetime(start), windows.hour_datetime(end)) for start, end in spells],
+                  [(windows.hour_datetime(start), windows.hour_datetime(end), weight) for start, end, weight in weights])
+                 for source, target, spells, weights in edges]
+        output_path = os.path.join(windows_dir, f"{prefix}-dynamic.gexf")
+        try:
+            file, output_path = writers.open_output(output_path, args["compression"])
+            with file:
+                writers.write_dynamic_gexf(file, names, node_spells, edges, window_data["directed"], args["compact"])
+        except Exception as e:
+            print(f"Error saving output to {output_path}: {e}")
+            return False
+        return True
+
+    saved = True
+    for start, end, names, sources, targets, weights in windows.iter_windows(window_names(window_data, symbol_tables), window_data["directed"], bucket_hours,
+                                                                              args["window"], args["step"], args["cumulative"]):
+        graph_data = {"directed": window_data["directed"], "names": names, "sources": sources, "targets": targets, "weights": weights}
+        output_path = os.path.join(windows_dir, f"{prefix}-{windows.hour_label(start)}--{windows.hour_label(end)}.gexf")
+        saved = save_graph_data(graph_data, output_path, args["compact"], args["compression"]) and saved
+    return saved
+
+def process_output(args, aggregates, coretweet_pairs=None, metrics=None, output_dir=""):
+    """
+    Build and save every requested output into output_dir, each one is timed as its own stage when metrics is given.
+    Returns False if some output could not be written.
+    """
+    compact = args["compact"]
+    compression = args["compression"]
+    # Spilled aggregates have their names resolved on disk and no symbol tables
+    symbol_tables = aggregates.get("symbols")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    rtp_gexf, rtp_json, mentionp_gexf, mentionp_json, corrtwp_gexf, corrtwp_json = (
+        os.path.join(output_dir, file_name) for file_name in ["rtp.gexf", "rtp.json", "mentionp.gexf", "mentionp.json", "corrtwp.gexf", "corrtwp.json"])
+    saved = []
 
-def process_output(args, tweets):
     if args["generate_rt_graph"]:
-        rt_graph = create_retweet_graph(tweets)
-        save_output(rt_graph, "rtp.gexf")
+        saved.append(save_graph_output(aggregates["retweet_graph"], rtp_gexf, os.path.join(output_dir, "rtp-metrics.json"), args, symbol_tables, metrics))
 
     if args["generate_rt_json"]:
-        retweet_json = create_retweet_json(tweets)
-        save_output(retweet_json, "rtp.json")
+        with profiling.stage(metrics, f"output {rtp_json}"):
+            saved.append(save_json_list({'retweets': iter_retweet_json(aggregates["retweet_json"], symbol_tables)}, rtp_json, compact, compression))
 
     if args["generate_mention_graph"]:
-        mention_graph = create_mention_graph(tweets)
-        save_output(mention_graph, "mentionp.gexf")
+        saved.append(save_graph_output(aggregates["mention_graph"], mentionp_gexf, os.path.join(output_dir, "mentionp-metrics.json"), args, symbol_tables, metrics))
 
     if args["generate_mention_json"]:
-        mention_json = create_mention_json(tweets)
-        save_output(mention_json, "mentionp.json")
+        with profiling.stage(metrics, f"output {mentionp_json}"):
+            saved.append(save_json_list({'mentions': iter_mention_json(aggregates["mention_json"], symbol_tables)}, mentionp_json, compact, compression))
 
     if args["generate_co_rt_graph"]:
-        coretweet_graph = create_coretweet_graph(tweets)
-        save_output(coretweet_graph, "corrtwp.gexf")
+        saved.append(save_graph_output(aggregates["coretweet_graph"], corrtwp_gexf, os.path.join(output_dir, "corrtwp-metrics.json"), args, symbol_tables, metrics))
 
     if args["generate_co_rt_json"]:
-        coretweet_json = create_coretweet_json(tweets)
-        save_output(coretweet_json, "corrtwp.json")
+        with profiling.stage(metrics, f"output {corrtwp_json}"):
+            if coretweet_pairs is not None:
+                coretweet_json = {'coretweets': coretweets.pairs_to_json(*coretweet_pairs)}
+            else:
+                coretweet_json = build_coretweet_json(aggregates["coretweet_json"], symbol_tables, args["min_support"], args["top_k"])
+            saved.append(save_json_list(coretweet_json, corrtwp_json, compact, compression))
+
+    for name, file_name, build in [("retweet_sketch", "rtp-top.json", build_retweet_top_json), ("mention_sketch", "mentionp-top.json", build_mention_top_json),
+                                   ("coretweet_sketch", "corrtwp-top.json", functools.partial(build_coretweet_top_json, min_support=args["min_support"]))]:
+        if args[AGGREGATES[name][0]]:
+            output_path = os.path.join(output_dir, file_name)
+            with profiling.stage(metrics, f"output {output_path}"):
+                saved.append(save_json(build(aggregates[aggregate_key(name, args)], args["sketch_top_k"]), output_path, compact, compression))
+
+    for name, prefix in [("retweet_windows", "rtp"), ("mention_windows", "mentionp"), ("coretweet_windows", "corrtwp")]:
+        if name in aggregates:
+            with profiling.stage(metrics, f"output {os.path.join(output_dir, prefix)} windows"):
+                saved.append(save_window_graphs(aggregates[name], symbol_tables, prefix, args, output_dir))
+    return all(saved)
+
+def load_queries(path, raw_args):
+    """
+    Read a batch manifest: a JSON object mapping every query name to its filter and output flags, a list of
+    arguments or a string (see add_query_arguments). The flags of the command line apply to every query, and the
+    hashtag files of a query are relative to the manifest. Returns {query name: arguments as process_arguments}.
+    """
+    with open(path) as file:
+        manifest = json.load(file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    queries = {}
+    for name, query_argv in manifest.items():
+        # Names are output directories and the prefix of the keys of the aggregates
+        if name in ("", ".", "..") or "/" in name or os.sep in name:
+            raise ValueError(f"Invalid query name {name!r} in {path}")
+        if isinstance(query_argv, str):
+            query_argv = shlex.split(query_argv)
+        query_raw_args = parse_query_args(query_argv, raw_args, f"query {name}")
+        if query_raw_args["hashtags"] != raw_args["hashtags"]:
+            query_raw_args["hashtags"] = os.path.join(base_dir, query_raw_args["hashtags"])
+        queries[name] = process_arguments(query_raw_args)
+        if not requested_aggregates(queries[name]):
+            raise ValueError(f"Query {name} in {path} requests no output")
+    return queries
 
 
 def process_arguments(raw_args):
@@ -326,11 +1701,62 @@ def process_arguments(raw_args):
         "generate_mention_graph": raw_args["gm"],
         "generate_mention_json": raw_args["jm"],
         "generate_co_rt_graph": raw_args["gcrt"],
-        "generate_co_rt_json": raw_args["jcrt"]
+        "generate_co_rt_json": raw_args["jcrt"],
+        "sketch_rt": raw_args["srt"],
+        "sketch_mention": raw_args["sm"],
+        "sketch_co_rt": raw_args["scrt"],
+        "sketch_error": raw_args["sketch_error"],
+        "sketch_precision": raw_args["sketch_precision"],
+        "sketch_top_k": raw_args["sketch_top_k"],
+        "analytics": raw_args["analytics"],
+        "analytics_top_k": raw_args["analytics_top_k"],
+        "window_rt_graph": bool(raw_args["time_buckets"] and raw_args["grt"]),
+        "window_mention_graph": bool(raw_args["time_buckets"] and raw_args["gm"]),
+        "window_co_rt_graph": bool(raw_args["time_buckets"] and raw_args["gcrt"]),
+        "time_buckets": raw_args["time_buckets"],
+        "window": raw_args["window"],
+        "step": raw_args["step"],
+        "cumulative": raw_args["cumulative"],
+        "dynamic": raw_args["dynamic"],
+        "schedule": raw_args["schedule"],
+        "balance_report": raw_args["balance_report"],
+        "filter_stats": raw_args["filter_stats"],
+        "verbose": raw_args["verbose"],
+        "split_bytes": int(raw_args["split_size"] * 1024 * 1024) if raw_args["split_size"] else None,
+        "cache_dir": raw_args["cache"],
+        "state_dir": raw_args["incremental"],
+        "min_support": raw_args["coretweet_min_support"],
+        "top_k": raw_args["coretweet_top_k"],
+        "compact": raw_args["compact"],
+        "compression": raw_args["compress"],
+        "decoder": raw_args["json_decoder"],
+        "metrics_path": raw_args["metrics"],
+        "index_dir": raw_args["index"],
+        "build_index": raw_args["build_index"],
+        "index_chunk_bytes": int(raw_args["index_chunk_size"] * 1024 * 1024),
+        "profile_dir": raw_args["profile"],
+        "memory_budget": raw_args["memory_budget"],
+        "spill_dir": raw_args["spill_dir"],
+        "queries_path": raw_args["queries"],
+        "executor": raw_args["executor"],
+        "workers": raw_args["workers"] or executors.default_workers()
     }
-def parse_args(argv):
-    parser = argparse.ArgumentParser(description="Arguments for generador.py", add_help=False)
-    parser.add_argument("-d", "--directory", default="input", help="Path to the data directory")
+def sketch_error(value):
+    error = float(value)
+    if not 0 < error < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return error
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+def add_query_arguments(parser):
+    """
+    Filter and output flags, given on the command line or for every query of a --queries manifest.
+    """
     parser.add_argument("-fi", "--start-date", help="Start date")
     parser.add_argument("-ff", "--end-date", help="End date")
     parser.add_argument("-h", "--hashtags", help="List of hashtags")
@@ -340,32 +1766,160 @@ def parse_args(argv):
     parser.add_argument("-jm", action="store_true", help="Create mention JSON")
     parser.add_argument("-gcrt", action="store_true", help="Create co-retweet graph")
     parser.add_argument("-jcrt", action="store_true", help="Create co-retweet JSON")
+    parser.add_argument("--coretweet-min-support", type=int, default=1, help="Minimum number of common retweeters of a co-retweet pair")
+    parser.add_argument("--coretweet-top-k", type=int, help="Only keep the co-retweet pairs with the most common retweeters")
+    parser.add_argument("-srt", action="store_true", help="Create rtp-top.json, the most retweeted users and retweet statistics from bounded-memory sketches")
+    parser.add_argument("-sm", action="store_true", help="Create mentionp-top.json, the most mentioned users and mention statistics from bounded-memory sketches")
+    parser.add_argument("-scrt", action="store_true",
+                        help="Create corrtwp-top.json, the co-retweet pairs with the most common retweeters estimated from a bounded sample of the retweeters")
+    parser.add_argument("--sketch-error", type=sketch_error, default=sketches.DEFAULT_ERROR,
+                        help="Top users of the sketches are underestimated by at most this fraction of the total, and the co-retweet sample keeps 20 / error retweets")
+    parser.add_argument("--sketch-precision", type=int, default=sketches.DEFAULT_PRECISION, choices=range(sketches.MIN_PRECISION, sketches.MAX_PRECISION + 1),
+                        metavar=f"{{{sketches.MIN_PRECISION}..{sketches.MAX_PRECISION}}}",
+                        help="HyperLogLogs of the sketches have 2^precision registers, distinct counts are off by about 1.04 / sqrt(2^precision)")
+    parser.add_argument("--sketch-top-k", type=int, default=100, help="Entries of the outputs of the sketches")
+    parser.add_argument("--analytics", action="store_true",
+                        help="Compute the PageRank, degrees and weakly connected component of every node of the requested graphs, written as "
+                             "node attributes of their GEXF and ranked into rtp-metrics.json, mentionp-metrics.json and corrtwp-metrics.json")
+    parser.add_argument("--analytics-top-k", type=int, default=100, help="Entries of each ranking of the metrics JSON")
+    parser.add_argument("--time-buckets", choices=["hour", "day"],
+                        help="Also write the requested graphs of every time window into windows/, built in the same pass from buckets of an hour or a day")
+    parser.add_argument("--window", type=positive_int, default=1, help="Buckets in each time window")
+    parser.add_argument("--step", type=positive_int, default=1, help="Buckets between the start of two time windows")
+    parser.add_argument("--cumulative", action="store_true", help="Time windows start at the first bucket and grow")
+    parser.add_argument("--dynamic", action="store_true", help="Write one dynamic GEXF with edge time intervals instead of a graph per window")
+
+def parse_query_args(argv, defaults, prog):
+    """
+    Flags of a query of a batch, the other arguments and the flags it does not give are taken from defaults.
+    """
+    parser = argparse.ArgumentParser(prog=prog, add_help=False)
+    add_query_arguments(parser)
+    parser.set_defaults(**defaults)
+    return vars(parser.parse_args(argv))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Arguments for generador.py", add_help=False)
+    parser.add_argument("-d", "--directory", default="input", help="Path to the data directory")
+    add_query_arguments(parser)
+    parser.add_argument("--queries",
+                        help="JSON manifest of named queries, {name: flags}, with their own filter and output flags. All of them are "
+                             "evaluated in a single pass over the input, and each one writes its outputs into a directory named after it")
+    parser.add_argument("--compact", action="store_true", help="Write outputs without indentation")
+    parser.add_argument("--compress", choices=["gzip", "zstd"], help="Compress the output files")
+    parser.add_argument("--executor", choices=executors.EXECUTOR_CHOICES, default="mpi",
+                        help="Run one rank per MPI process, or a single process that hands the files to a local process pool (mpi4py is not needed)")
+    parser.add_argument("--workers", type=int, help="Processes of the pool of --executor processes, the available CPUs by default")
+    parser.add_argument("--schedule", choices=["count", "bytes", "dynamic"], default="count",
+                        help="How files are distributed between ranks: equal file count, balanced compressed bytes, or a work queue on rank 0")
+    parser.add_argument("--balance-report", action="store_true", help="Print busy/idle time per rank")
+    parser.add_argument("--filter-stats", action="store_true", help="Print how many lines were rejected at each filtering stage")
+    parser.add_argument("--verbose", action="store_true", help="Print notes on how the input was processed, such as the units reused by --incremental, the bytes selected by --index and the spills of --memory-budget")
+    parser.add_argument("--cache", help="Directory of the columnar cache of extracted tweets, built on the first run and reused while the input files do not change")
+    parser.add_argument("--incremental", help="Directory where the partial aggregates of every input file are kept, later runs only process new or changed files")
+    parser.add_argument("--json-decoder", choices=decoders.DECODER_CHOICES, default="auto",
+                        help="JSON backend used to decode tweets, auto picks the fastest one installed")
+    parser.add_argument("--metrics", help="Write a JSON report with the wall/CPU time of every stage, bytes, lines and peak RSS of each rank")
+    parser.add_argument("--profile", help="Directory where each rank writes its cProfile stats as rank<N>.prof")
+    parser.add_argument("--index", help="Directory of the archive index, files and bz2 blocks it rules out for the dates and hashtags are not read")
+    parser.add_argument("--build-index", action="store_true", help="Index the input files that are not indexed yet or changed, before running the query")
+    parser.add_argument("--index-chunk-size", type=float, default=1, help="MB of bz2 blocks described by each index entry")
+    parser.add_argument("--memory-budget", type=float,
+                        help="MB of RSS a rank may use while aggregating, over it the aggregates are spilled to disk as sorted runs and merged at the end. "
+                             "The co-retweet pairs of -jcrt are then spilled too")
+    parser.add_argument("--spill-dir", help="Directory of the spilled runs of --memory-budget, the system temporary directory by default")
+    parser.add_argument("--split-size", type=float, help="Split files bigger than this many MB into chunks of bz2 blocks processed by different ranks")
     args = parser.parse_args(argv)
+    if args.compress == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            parser.error("--compress zstd needs the zstandard package")
+    if args.build_index and not args.index:
+        parser.error("--build-index needs --index")
+    if args.memory_budget and args.time_buckets:
+        parser.error("--memory-budget does not support --time-buckets, the graphs of the time windows are kept in memory")
+    if args.queries and (args.incremental or args.index or args.memory_budget):
+        parser.error("--queries does not support --incremental, --index or --memory-budget, they keep their state per filter set")
     args = vars(args)
     if "directory" not in args:
        args["directory"] = "data"
     return args
 
 def main():
-    comm = MPI.COMM_WORLD
-    rank = comm.Get_rank()
-    size = comm.Get_size()
     start_time = time.time()
     
     
     raw_args = parse_args(sys.argv[1:])
     args = process_arguments(raw_args)
-    
-
-    # Process tweet files
-    tweets = get_tweets(args["directory"], args["start_date"], args["end_date"], args["hashtags"])
+    comm = executors.get_comm(args["executor"])
+    rank = comm.Get_rank()
+    pool = executors.process_pool(args["workers"]) if args["executor"] == "processes" else None
+
+    metrics = profiling.new_metrics() if args["metrics_path"] else None
+    profile = profiling.start_profile() if args["profile_dir"] else None
+
+    # Every rank and worker uses the backend auto picks here, the fallback to the stdlib keeps the accepted lines the same
+    decoder, _ = decoders.get_decoder(args["decoder"])
+
+    if args["build_index"]:
+        build_indexes(args["directory"], args["index_dir"], args["index_chunk_bytes"], decoder, comm, pool)
+        if not requested_aggregates(args):
+            if pool is not None:
+                pool.shutdown()
+            return
+
+    # Process tweet files, a batch of queries shares one pass over the input and each one has its own arguments
+    # and output directory
+    if args["queries_path"]:
+        query_args = load_queries(args["queries_path"], raw_args)
+        queries = [Query(name, query["start_date"], query["end_date"], query["hashtags"], requested_aggregates(query))
+                   for name, query in query_args.items()]
+        aggregates = get_batch_aggregates(args, queries, decoder, metrics, comm, pool)
+        outputs = [(query_args[query.name], query_aggregates(aggregates, query.name) if rank == 0 else None, query.name)
+                   for query in queries]
+    else:
+        aggregates = get_aggregates(args, requested_aggregates(args), decoder, metrics, comm, pool)
+        outputs = [(args, aggregates, "")]
+
+    saved = True
+    for output_args, output_aggregates, output_dir in outputs:
+        # Co-retweet pairs are split between all the ranks, or the pool workers, and spilled under a memory budget
+        coretweet_pairs = None
+        if output_args["generate_co_rt_json"]:
+            with profiling.stage(metrics, "coretweet pairs"):
+                incidence = coretweet_incidence(output_aggregates["coretweet_json"], output_aggregates.get("symbols")) if rank == 0 else None
+                pair_spill = spill.new_spill(args["memory_budget"], args["spill_dir"], rank) if args["memory_budget"] else None
+                if pool is not None and pair_spill is not None:
+                    coretweet_pairs = spill.pool_pairs(pool, args["workers"], incidence, pair_spill, output_args["min_support"], output_args["top_k"])
+                elif pool is not None:
+                    coretweet_pairs = coretweets.pool_pairs(pool, args["workers"], incidence, output_args["min_support"], output_args["top_k"])
+                elif pair_spill is not None:
+                    coretweet_pairs = spill.distributed_pairs(comm, incidence, pair_spill, output_args["min_support"], output_args["top_k"])
+                else:
+                    coretweet_pairs = coretweets.distributed_pairs(comm, incidence, output_args["min_support"], output_args["top_k"])
+                del incidence
+
+        # Create and save graphs and JSONs
+        if rank == 0:
+            saved = process_output(output_args, output_aggregates, coretweet_pairs, metrics, output_dir) and saved
 
-    # Create and save graphs and JSONs
     if(rank ==0):
-        process_output(args,tweets)
         end_time = time.time()
         print(end_time - start_time)
 
+    if profile is not None:
+        profiling.stop_profile(profile, args["profile_dir"], rank)
+    # The pool is shut down first so that its workers count in the peak RSS of the children
+    if pool is not None:
+        pool.shutdown()
+    if metrics is not None:
+        rank_reports = comm.gather(profiling.rank_report(metrics, rank), root=0)
+        if rank == 0:
+            profiling.save_report(profiling.merge_reports(rank_reports, time.time() - start_time), args["metrics_path"])
+    if not saved:
+        sys.exit(1)
+
     # Delete temporary files and show execution time
     # ...
     # Calculate and display execution time
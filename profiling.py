@@ -0,0 +1,160 @@
+import os
+import time
+import json
+import socket
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+def new_metrics():
+    """
+    Per rank metrics: wall and CPU seconds of every stage plus bytes read. Stages are timed as laps of one clock,
+    each lap is charged to the stage that just finished, so interleaved stages of a line loop add up to the total.
+    """
+    return {
+        "stages": {},
+        "clock": (time.perf_counter(), time.process_time()),
+        "bytes_read": 0,
+        "bytes_decompressed": 0,
+        "units": 0,
+        "lines": 0,
+        "tweets": 0,
+        "worker_peak_rss_mb": {}
+    }
+
+def lap(metrics, stage):
+    wall, cpu = time.perf_counter(), time.process_time()
+    last_wall, last_cpu = metrics["clock"]
+    totals = metrics["stages"].get(stage)
+    if totals is None:
+        totals = metrics["stages"][stage] = [0.0, 0.0, 0]
+    totals[0] += wall - last_wall
+    totals[1] += cpu - last_cpu
+    totals[2] += 1
+    metrics["clock"] = (wall, cpu)
+
+def reset_clock(metrics):
+    metrics["clock"] = (time.perf_counter(), time.process_time())
+
+@contextmanager
+def stage(metrics, name):
+    """
+    Time a block of code as one stage, does nothing when metrics is None.
+    """
+    if metrics is None:
+        yield
+        return
+    reset_clock(metrics)
+    try:
+        yield
+    finally:
+        lap(metrics, name)
+
+def merge_metrics(metrics, other):
+    """
+    Add the stages and counts of other, the metrics of a pool worker, into metrics. The stages of a rank with
+    a process pool are summed over its workers, so their wall time can exceed the elapsed time. The peak RSS of
+    every worker is kept by pid.
+    """
+    for name, (wall, cpu, calls) in other["stages"].items():
+        totals = metrics["stages"].setdefault(name, [0.0, 0.0, 0])
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += calls
+    for key in ["bytes_read", "bytes_decompressed", "units", "lines", "tweets"]:
+        metrics[key] += other[key]
+    workers = metrics["worker_peak_rss_mb"]
+    for pid, rss in other["worker_peak_rss_mb"].items():
+        workers[pid] = max(workers.get(pid, 0.0), rss)
+    return metrics
+
+def record_worker_rss(metrics):
+    """
+    Record the peak RSS of the pool worker running this process into its metrics.
+    """
+    metrics["worker_peak_rss_mb"][os.getpid()] = peak_rss_mb()
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def children_peak_rss_mb():
+    """
+    Peak RSS of the largest child process that has been waited for, such as the workers of a pool once it is shut down.
+    """
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+def rank_report(metrics, rank):
+    """
+    JSON friendly summary of the metrics of a rank. Its memory is peak_rss_mb plus the peaks of its pool workers,
+    see rank_rss_mb.
+    """
+    return {
+        "rank": rank,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "stages": {name: {"wall_seconds": wall, "cpu_seconds": cpu, "calls": calls}
+                   for name, (wall, cpu, calls) in metrics["stages"].items()},
+        "units": metrics["units"],
+        "bytes_read": metrics["bytes_read"],
+        "bytes_decompressed": metrics["bytes_decompressed"],
+        "lines": metrics["lines"],
+        "tweets": metrics["tweets"],
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_peak_rss_mb": [rss for _, rss in sorted(metrics["worker_peak_rss_mb"].items())],
+        "children_peak_rss_mb": children_peak_rss_mb()
+    }
+
+def rank_rss_mb(report):
+    """
+    Peak RSS of a rank and its workers. Workers only record their peak after each unit, a larger peak of a child
+    (co-retweet pairs computed by the pool) replaces the largest of them.
+    """
+    workers = sorted(report["worker_peak_rss_mb"])
+    if workers:
+        workers[-1] = max(workers[-1], report["children_peak_rss_mb"])
+    else:
+        workers = [report["children_peak_rss_mb"]]
+    return report["peak_rss_mb"] + sum(workers)
+
+def merge_reports(rank_reports, elapsed):
+    """
+    Merge the reports of every rank. Each stage gets its total, mean and maximum over the ranks and the rank
+    with the maximum, a max far above the mean points at a straggler.
+    """
+    stage_names = sorted({name for report in rank_reports for name in report["stages"]})
+    stages = {}
+    for name in stage_names:
+        walls = [report["stages"].get(name, {}).get("wall_seconds", 0.0) for report in rank_reports]
+        cpus = [report["stages"].get(name, {}).get("cpu_seconds", 0.0) for report in rank_reports]
+        slowest = max(range(len(walls)), key=walls.__getitem__)
+        stages[name] = {
+            "wall_seconds_total": sum(walls),
+            "wall_seconds_mean": sum(walls) / len(walls),
+            "wall_seconds_max": walls[slowest],
+            "slowest_rank": rank_reports[slowest]["rank"],
+            "cpu_seconds_total": sum(cpus)
+        }
+    totals = {key: sum(report[key] for report in rank_reports) for key in ["units", "bytes_read", "bytes_decompressed", "lines", "tweets"]}
+    totals["peak_rss_mb_max"] = max(report["peak_rss_mb"] for report in rank_reports)
+    totals["rank_rss_mb_max"] = max(rank_rss_mb(report) for report in rank_reports)
+    totals["rss_mb_total"] = sum(rank_rss_mb(report) for report in rank_reports)
+    return {"elapsed_seconds": elapsed, "ranks": len(rank_reports), "totals": totals, "stages": stages, "per_rank": rank_reports}
+
+def save_report(report, output_path):
+    with open(output_path, "w") as file:
+        json.dump(report, file, indent=4)
+
+def start_profile():
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def stop_profile(profile, profile_dir, rank):
+    """
+    Write the cProfile stats of a rank to profile_dir/rank<N>.prof, they can be read with pstats or snakeviz.
+    """
+    profile.disable()
+    os.makedirs(profile_dir, exist_ok=True)
+    profile.dump_stats(os.path.join(profile_dir, f"rank{rank}.prof"))
@@ -0,0 +1,250 @@
+import math
+import hashlib
+from array import array
+import numpy as np
+import coretweets
+import symbols
+
+DEFAULT_ERROR = 0.0001
+DEFAULT_PRECISION = 12
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+# Values added to a HyperLogLog are buffered and hashed this many at a time, repeated values only once
+HLL_BUFFER = 65536
+# Entries of a sample for an error of 1, it keeps SAMPLE_ENTRIES / error of them
+SAMPLE_ENTRIES = 20
+SAMPLE_KEYS = ["keys", "values"]
+# 2 ** -register for every possible register value
+REGISTER_WEIGHTS = np.ldexp(1.0, -np.arange(65))
+
+
+def summary_capacity(error):
+    """
+    Counters a heavy-hitter summary keeps so that counts are off by at most error times the total.
+    """
+    return max(1, math.ceil(1 / error) - 1)
+
+def sample_capacity(error):
+    return math.ceil(SAMPLE_ENTRIES / error)
+
+def new_summary(capacity):
+    """
+    Heavy-hitter summary of the counts of keys (Misra-Gries, the lower-bound form of Space-Saving). It keeps
+    up to 2 * capacity counters, the count of a key is underestimated by at most "error", and the error stays
+    under total / (capacity + 1), after merges too.
+    """
+    return {"capacity": capacity, "counts": {}, "total": 0, "error": 0}
+
+def add(summary, key, count=1):
+    counts = summary["counts"]
+    counts[key] = counts.get(key, 0) + count
+    summary["total"] += count
+    if len(counts) > 2 * summary["capacity"]:
+        prune(summary)
+
+def prune(summary):
+    """
+    Subtract the (capacity + 1)-th largest count from every counter and drop the counters left at 0. At least
+    capacity + 1 counters lose what is added to the error, so it stays under total / (capacity + 1).
+    """
+    decrement = sorted(summary["counts"].values(), reverse=True)[summary["capacity"]]
+    summary["counts"] = {key: count - decrement for key, count in summary["counts"].items() if count > decrement}
+    summary["error"] += decrement
+
+def merge_summary(summary, other):
+    """
+    Add the counters of other, a summary of other tweets with the same capacity.
+    """
+    counts = summary["counts"]
+    for key, count in other["counts"].items():
+        counts[key] = counts.get(key, 0) + count
+    summary["total"] += other["total"]
+    summary["error"] += other["error"]
+    if len(counts) > 2 * summary["capacity"]:
+        prune(summary)
+
+def top(summary, k):
+    """
+    The k (key, count) with the highest counts, ties sorted by key.
+    """
+    return sorted(summary["counts"].items(), key=lambda item: (-item[1], item[0]))[:k]
+
+def hash_value(value):
+    """
+    64-bit hash of a string. Python's hash is salted per process, the ranks need the same hashes to merge.
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+def hash_values(values):
+    return np.fromiter(map(hash_value, values), dtype=np.uint64, count=len(values))
+
+def bit_lengths(values):
+    lengths = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        moved = high != 0
+        lengths[moved] += shift
+        values = np.where(moved, high, values)
+    return lengths + (values != 0)
+
+def register_updates(hashes, precision):
+    """
+    (register, value) of every hash: the first precision bits pick the register, and the value is the position
+    of the first 1 bit of the others.
+    """
+    rest_bits = 64 - precision
+    registers = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    return registers, (rest_bits + 1 - bit_lengths(rest)).astype(np.uint8)
+
+def new_hll(precision=DEFAULT_PRECISION):
+    """
+    HyperLogLog count of distinct strings with 2 ** precision registers, the relative standard error is
+    1.04 / sqrt(2 ** precision).
+    """
+    return {"precision": precision, "registers": np.zeros(1 << precision, dtype=np.uint8), "pending": set()}
+
+def hll_add(hll, value):
+    pending = hll["pending"]
+    pending.add(value)
+    if len(pending) >= HLL_BUFFER:
+        flush_hll(hll)
+
+def flush_hll(hll):
+    if hll["pending"]:
+        registers, values = register_updates(hash_values(list(hll["pending"])), hll["precision"])
+        np.maximum.at(hll["registers"], registers, values)
+        hll["pending"] = set()
+
+def merge_hll(hll, other):
+    np.maximum(hll["registers"], other["registers"], out=hll["registers"])
+    hll["pending"] |= other["pending"]
+    if len(hll["pending"]) >= HLL_BUFFER:
+        flush_hll(hll)
+
+def hll_estimates(registers):
+    """
+    Distinct counts of every row of a 2D array of registers, with the linear counting correction of small counts.
+    """
+    size = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / size) if size >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[size]
+    estimates = alpha * size * size / REGISTER_WEIGHTS[registers].sum(axis=1)
+    zeros = (registers == 0).sum(axis=1)
+    small = (estimates <= 2.5 * size) & (zeros > 0)
+    estimates[small] = size * np.log(size / zeros[small])
+    return estimates
+
+def hll_count(hll):
+    flush_hll(hll)
+    return int(round(hll_estimates(hll["registers"][np.newaxis])[0]))
+
+def new_sample(max_entries):
+    """
+    Coordinated sample of (key, value) entries: the entries whose key hashes under a limit are kept, as a column of
+    key hashes and a column of ids of the values in a symbol table. The limit is halved whenever more than
+    max_entries distinct entries are kept, and as every rank keeps the same keys, samples merge into the sample of
+    all the tweets. Counts of the sample times 2 ** level estimate the full ones.
+    """
+    return {"max_entries": max_entries, "level": 0, "limit": 1 << 64, "keys": array("Q"), "values": array("i"),
+            "table": symbols.new_table(), "compact_at": min(symbols.COMPACT_ROWS, 2 * max_entries)}
+
+def sample_add(sample, key, value):
+    key_hash = hash_value(key)
+    if key_hash < sample["limit"]:
+        sample["keys"].append(key_hash)
+        sample["values"].append(symbols.intern(sample["table"], value))
+        if len(sample["keys"]) >= sample["compact_at"]:
+            compact_sample(sample)
+
+def filter_sample(sample):
+    keep = symbols.column(sample["keys"]) < sample["limit"]
+    for column in SAMPLE_KEYS:
+        sample[column] = array(sample[column].typecode, symbols.column(sample[column])[keep].tobytes())
+
+def compact_sample(sample):
+    """
+    Drop the repeated entries, and the entries of half the keys left until at most max_entries are kept. The table
+    of values is rebuilt once it holds more values than there are entries.
+    """
+    symbols.unique_rows(sample, SAMPLE_KEYS)
+    while len(sample["keys"]) > sample["max_entries"]:
+        sample["level"] += 1
+        sample["limit"] = 1 << (64 - sample["level"])
+        filter_sample(sample)
+    sample["compact_at"] = min(max(symbols.COMPACT_ROWS, 2 * len(sample["keys"])), 2 * sample["max_entries"])
+    if len(sample["table"]["values"]) > max(len(sample["keys"]), symbols.COMPACT_ROWS):
+        used, values = np.unique(symbols.column(sample["values"]), return_inverse=True)
+        sample["table"] = symbols.new_table([sample["table"]["values"][value] for value in used.tolist()])
+        sample["values"] = array("i", values.astype(np.int32).tobytes())
+
+def merge_sample(sample, other):
+    if other["level"] > sample["level"]:
+        sample["level"], sample["limit"] = other["level"], other["limit"]
+        filter_sample(sample)
+    keep = symbols.column(other["keys"]) < sample["limit"]
+    sample["keys"].frombytes(symbols.column(other["keys"])[keep].tobytes())
+    value_map = symbols.merge_table(sample["table"], other["table"])
+    sample["values"].frombytes(value_map[symbols.column(other["values"])[keep]].astype(np.int32).tobytes())
+    compact_sample(sample)
+
+def sample_pairs(sample, top_k, min_support=1):
+    """
+    The top_k pairs of values shared by the most keys, as (first value, second value, estimated keys) sorted by
+    keys and then by value. Values are the authors and keys the retweeters of a co-retweet sample, the pairs
+    are computed as in coretweets.compute_pairs.
+    """
+    symbols.unique_rows(sample, SAMPLE_KEYS)
+    names = sample["table"]["values"]
+    value_ids, rows = np.unique(symbols.column(sample["values"]), return_inverse=True)
+    # Authors sorted by name, so that the first author of a pair is the first one by name
+    order = sorted(range(len(value_ids)), key=lambda index: names[value_ids[index]])
+    positions = np.empty(len(order), dtype=np.int64)
+    positions[order] = np.arange(len(order))
+    key_ids, columns = np.unique(symbols.column(sample["keys"]), return_inverse=True)
+    matrix = coretweets.incidence_matrix(positions[rows], columns, len(value_ids), len(key_ids))
+    scale = 1 << sample["level"]
+    pairs = coretweets.compute_pairs(matrix, coretweets.row_blocks(matrix.shape[0]), max(1, math.ceil(min_support / scale)), top_k)
+    authors = [names[value_ids[index]] for index in order]
+    return [(authors[first], authors[second], count * scale) for first, second, count, _ in pairs]
+
+def new_sketch(error=DEFAULT_ERROR, precision=DEFAULT_PRECISION, counters=(), distinct=(), summary=True, sample=False):
+    """
+    Sketch of a stream of tweets: plain counters, a HyperLogLog for every name of distinct, and a heavy-hitter
+    summary and an entry sample sized for error if asked. Its size does not depend on the tweets.
+    """
+    return {
+        "summary": new_summary(summary_capacity(error)) if summary else None,
+        "counts": dict.fromkeys(counters, 0),
+        "distinct": {name: new_hll(precision) for name in distinct},
+        "sample": new_sample(sample_capacity(error)) if sample else None
+    }
+
+def count(sketch, name, amount=1):
+    sketch["counts"][name] += amount
+
+def merge_sketch(sketch, other):
+    """
+    Merge the sketch of other tweets, built with the same options. Only the counters the summary drops depend
+    on the order of the merges.
+    """
+    if sketch["summary"] is not None:
+        merge_summary(sketch["summary"], other["summary"])
+    for name, amount in other["counts"].items():
+        count(sketch, name, amount)
+    for name, hll in other["distinct"].items():
+        merge_hll(sketch["distinct"][name], hll)
+    if sketch["sample"] is not None:
+        merge_sample(sketch["sample"], other["sample"])
+    return sketch
+
+def sketch_stats(sketch):
+    """
+    Counters, estimated distinct counts, the most any count of the summary is underestimated by and the rate of the sample.
+    """
+    stats = dict(sketch["counts"])
+    stats.update((name, hll_count(hll)) for name, hll in sketch["distinct"].items())
+    if sketch["summary"] is not None:
+        stats["errorBound"] = sketch["summary"]["error"]
+    if sketch["sample"] is not None:
+        stats["sampleRate"] = 1 / (1 << sketch["sample"]["level"])
+    return stats
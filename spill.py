@@ -0,0 +1,459 @@
+import os
+import gc
+import heapq
+import atexit
+import pickle
+import shutil
+import socket
+import tempfile
+from array import array
+from itertools import groupby, islice
+from operator import itemgetter
+from collections import namedtuple
+import coretweets
+import profiling
+import symbols
+import sketches
+
+# Rows are pickled in batches, and a merge reads at most MAX_FAN_IN runs at once
+BATCH_ROWS = 10000
+MAX_FAN_IN = 64
+# Rough size of a row held in memory, sizes the in-memory batches of the external sorts
+ROW_BYTES = 512
+CHUNK_BYTES = 4 * 1024 * 1024
+SPILL_TAG = 3
+# Rows each aggregate is spilled as
+AGGREGATE_KINDS = {
+    "retweet_graph": "graph",
+    "mention_graph": "graph",
+    "coretweet_graph": "graph",
+    "retweet_json": "retweet_json",
+    "mention_json": "mention_json",
+    "coretweet_json": "coretweet_json",
+    "retweet_sketch": "sketch",
+    "mention_sketch": "sketch",
+    "coretweet_sketch": "sketch"
+}
+
+# Aggregate whose rows are on disk. files holds the sorted runs of each part: "nodes" and "edges" for graphs, "rows" otherwise
+SpilledAggregate = namedtuple("SpilledAggregate", ["kind", "files", "directed", "directory", "sort_rows"])
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return profiling.peak_rss_mb()
+
+def new_spill(budget_mb, spill_dir=None, rank=0):
+    """
+    Spill state of a rank. Its runs go to a new directory inside spill_dir, the system temporary directory by default.
+    """
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    return {
+        "budget_mb": budget_mb,
+        "directory": tempfile.mkdtemp(prefix=f"spill-rank{rank}-", dir=spill_dir),
+        "sort_rows": max(BATCH_ROWS, int(budget_mb * 1024 * 1024 / ROW_BYTES / 4)),
+        "files": {},
+        "directed": {},
+        "sketches": {},
+        "spills": 0,
+        "spill_rss": 0.0
+    }
+
+def over_budget(state):
+    """
+    Whether the RSS of the process is over the budget. Freed memory is not always given back to the system, so
+    after a spill the RSS left is the limit until it grows again.
+    """
+    return current_rss_mb() > max(state["budget_mb"], state["spill_rss"])
+
+def remove_spill(state):
+    shutil.rmtree(state["directory"], ignore_errors=True)
+
+def encode_name(name):
+    # Screen names are sorted on disk, None (a tweet without user) cannot be compared with them. Names get a
+    # leading sentinel so None stays apart from an empty name
+    return "" if name is None else "\x01" + name
+
+def decode_name(name):
+    return None if name == "" else name[1:]
+
+def new_run_path(directory):
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    os.close(fd)
+    return path
+
+def write_run(path, rows):
+    """
+    Write sorted rows to a run file, in pickled batches.
+    """
+    with open(path, "wb") as file:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_ROWS:
+                pickle.dump(batch, file, protocol=pickle.HIGHEST_PROTOCOL)
+                batch = []
+        if batch:
+            pickle.dump(batch, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+def read_run(path):
+    with open(path, "rb") as file:
+        while True:
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                return
+            yield from batch
+
+def merge_runs(paths, directory):
+    """
+    Merge sorted runs into one sorted stream. With more than MAX_FAN_IN runs, groups of them are first merged
+    into bigger runs so the number of open files stays bounded.
+    """
+    paths = list(paths)
+    while len(paths) > MAX_FAN_IN:
+        paths = [write_run(new_run_path(directory), heapq.merge(*map(read_run, paths[start:start + MAX_FAN_IN])))
+                 for start in range(0, len(paths), MAX_FAN_IN)]
+    return heapq.merge(*map(read_run, paths))
+
+def sorted_batches(rows, batch_rows, row_size=None):
+    """
+    Yield the rows sorted batch_rows at a time, rows weigh row_size(row) if given.
+    """
+    batch = []
+    batch_size = 0
+    for row in rows:
+        batch.append(row)
+        batch_size += row_size(row) if row_size else 1
+        if batch_size >= batch_rows:
+            batch.sort()
+            yield batch
+            batch = []
+            batch_size = 0
+    if batch:
+        batch.sort()
+        yield batch
+
+def sort_rows(rows, directory, batch_rows, row_size=None):
+    """
+    External sort, the sorted batches are written as runs and merged. Rows must be unique before any field
+    that cannot be compared.
+    """
+    batches = sorted_batches(rows, batch_rows, row_size)
+    first_batch = next(batches, [])
+    second_batch = next(batches, None)
+    if second_batch is None:
+        return iter(first_batch)
+    paths = [write_run(new_run_path(directory), first_batch), write_run(new_run_path(directory), second_batch)]
+    del first_batch, second_batch
+    paths.extend(write_run(new_run_path(directory), batch) for batch in batches)
+    return merge_runs(paths, directory)
+
+def graph_rows(graph_data, symbol_tables, base):
+    """
+    ("nodes", (name, position) rows) and ("edges", (source, target, position, weight) rows) of a graph aggregate.
+    Positions are base plus the order of insertion, undirected edges are stored with their names in order.
+    """
+    users = symbol_tables["users"]["values"]
+    nodes = graph_data["nodes"]
+
+    def node_rows():
+        for node_id, node in enumerate(nodes):
+            yield (encode_name(users[node]), base + node_id)
+
+    def edge_rows():
+        for edge, (source, target, weight) in enumerate(zip(graph_data["sources"], graph_data["targets"], graph_data["weights"])):
+            source, target = encode_name(users[nodes[source]]), encode_name(users[nodes[target]])
+            if not graph_data["directed"] and target < source:
+                source, target = target, source
+            yield (source, target, base + edge, weight)
+
+    return [("nodes", node_rows()), ("edges", edge_rows())]
+
+def retweet_json_rows(retweets_data, symbol_tables, base):
+    """
+    (author, tweet id, retweeter, position) rows, positions follow the order of the retweets.
+    """
+    users = symbol_tables["users"]["values"]
+
+    def rows():
+        for position, (author, tweet, retweeter) in enumerate(zip(retweets_data["authors"], retweets_data["tweets"], retweets_data["retweeters"]), base):
+            yield (encode_name(users[author]), symbols.tweet_value(symbol_tables, tweet), encode_name(users[retweeter]), position)
+    return [("rows", rows())]
+
+def mention_json_rows(mentions_data, symbol_tables, base):
+    """
+    (mentioned user, mentioning user, position, tweet ids) rows.
+    """
+    users = symbol_tables["users"]["values"]
+
+    def rows():
+        for position, (mentioned_user, user_screen_name, tweet) in enumerate(zip(mentions_data["mentioned"], mentions_data["mentioners"], mentions_data["tweets"]), base):
+            yield (encode_name(users[mentioned_user]), encode_name(users[user_screen_name]), position, [symbols.tweet_value(symbol_tables, tweet)])
+    return [("rows", rows())]
+
+def coretweet_json_rows(retweet_dict, symbol_tables, base):
+    """
+    (retweeter, author, position) rows, the first position of a retweeter orders the retweeters.
+    """
+    users = symbol_tables["users"]["values"]
+
+    def rows():
+        for position, (retweeter, author) in enumerate(zip(retweet_dict["retweeters"], retweet_dict["authors"]), base):
+            yield (users[retweeter], users[author], position)
+    return [("rows", rows())]
+
+ROW_FUNCTIONS = {
+    "graph": graph_rows,
+    "retweet_json": retweet_json_rows,
+    "mention_json": mention_json_rows,
+    "coretweet_json": coretweet_json_rows
+}
+
+def add_sketch(state, name, sketch):
+    if name in state["sketches"]:
+        sketches.merge_sketch(state["sketches"][name], sketch)
+    else:
+        state["sketches"][name] = sketch
+
+def spill_runs(state, runs):
+    """
+    Write every (first unit index, last unit index, aggregates) run to disk and drop it from runs, one aggregate
+    at a time. The rows of each part are sorted and written sort_rows at a time, so a spill only needs that much
+    memory on top of the aggregates. Positions start at the first unit index shifted by 32 bits, so merging
+    rows by position keeps the order in which the aggregates would have been merged in memory. Sketches are
+    bounded, they stay in memory and are merged together.
+    """
+    while runs:
+        first_index, _, aggregates = runs.pop()
+        symbol_tables = aggregates.pop("symbols")
+        for name in list(aggregates):
+            data = aggregates.pop(name)
+            # Keys of sketches are followed by their options
+            kind = AGGREGATE_KINDS[name.partition(":")[0]]
+            if kind == "sketch":
+                add_sketch(state, name, data)
+                continue
+            if kind == "graph":
+                state["directed"][name] = data["directed"]
+            files = state["files"].setdefault(name, {})
+            for part, rows in ROW_FUNCTIONS[kind](data, symbol_tables, first_index << 32):
+                files.setdefault(part, []).extend(write_run(new_run_path(state["directory"]), batch)
+                                                  for batch in sorted_batches(rows, state["sort_rows"]))
+            del data
+        del symbol_tables
+    gc.collect()
+    state["spills"] += 1
+    state["spill_rss"] = current_rss_mb()
+
+def collect_spills(comm, state):
+    """
+    Hand the runs of every rank to rank 0. Runs of ranks on the host of rank 0 are read in place, the others are
+    sent over comm in chunks and written to the directory of rank 0. The directories are deleted when rank 0 exits.
+    """
+    rank = comm.Get_rank()
+    host = socket.gethostname()
+    hosts = comm.bcast(comm.gather(host, root=0), root=0)
+    if rank != 0:
+        comm.send((state["files"], state["directed"], state["sketches"], state["directory"]), dest=0, tag=SPILL_TAG)
+        if hosts[0] != host:
+            for path in [path for files in state["files"].values() for paths in files.values() for path in paths]:
+                with open(path, "rb") as file:
+                    for chunk in iter(lambda: file.read(CHUNK_BYTES), b""):
+                        comm.send(chunk, dest=0, tag=SPILL_TAG)
+                comm.send(b"", dest=0, tag=SPILL_TAG)
+            shutil.rmtree(state["directory"], ignore_errors=True)
+        return
+
+    atexit.register(shutil.rmtree, state["directory"], True)
+    for source in range(1, comm.Get_size()):
+        files, directed, rank_sketches, directory = comm.recv(source=source, tag=SPILL_TAG)
+        state["directed"].update(directed)
+        for name, sketch in rank_sketches.items():
+            add_sketch(state, name, sketch)
+        if hosts[source] == host:
+            atexit.register(shutil.rmtree, directory, True)
+        else:
+            for parts in files.values():
+                for paths in parts.values():
+                    for index in range(len(paths)):
+                        paths[index] = new_run_path(state["directory"])
+                        with open(paths[index], "wb") as file:
+                            for chunk in iter(lambda: comm.recv(source=source, tag=SPILL_TAG), b""):
+                                file.write(chunk)
+        for name, parts in files.items():
+            for part, paths in parts.items():
+                state["files"].setdefault(name, {}).setdefault(part, []).extend(paths)
+
+def spilled_aggregates(state, names):
+    """
+    SpilledAggregate of every name, sketches are the ones merged in memory, None if no rank spilled one.
+    """
+    return {name: state["sketches"].get(name) if AGGREGATE_KINDS[name.partition(":")[0]] == "sketch" else
+            SpilledAggregate(AGGREGATE_KINDS[name], state["files"].get(name, {}), state["directed"].get(name, True),
+                             state["directory"], state["sort_rows"]) for name in names}
+
+def merged_graph(spilled):
+    """
+    (names, edges) of a spilled graph: nodes in order of first appearance, and (source, target, weight) edges with
+    their weights summed, in the order writers.write_gexf_edges takes them. Only the node names are held in memory.
+    """
+    node_rows = []
+    for name, rows in groupby(merge_runs(spilled.files.get("nodes", []), spilled.directory), key=itemgetter(0)):
+        node_rows.append((next(rows)[1], name))
+    node_rows.sort()
+    index = {name: node_id for node_id, (_, name) in enumerate(node_rows)}
+    names = [decode_name(name) for _, name in node_rows]
+    del node_rows
+
+    def edge_rows():
+        for (source, target), rows in groupby(merge_runs(spilled.files.get("edges", []), spilled.directory), key=itemgetter(0, 1)):
+            _, _, position, weight = next(rows)
+            weight += sum(row[3] for row in rows)
+            source, target = index[source], index[target]
+            # The edge order of networkx: by the source, or the first node of an undirected edge, then by insertion
+            yield (source if spilled.directed else min(source, target), position, source, target, weight)
+
+    ordered = sort_rows(edge_rows(), spilled.directory, spilled.sort_rows)
+    return names, ((source, target, weight) for _, _, source, target, weight in ordered)
+
+def merged_retweet_json(spilled):
+    """
+    Retweets entries of a spilled retweet JSON aggregate, in the order of generadorp.iter_retweet_json.
+    """
+    def entries():
+        for author, rows in groupby(merge_runs(spilled.files.get("rows", []), spilled.directory), key=itemgetter(0)):
+            tweets = {}
+            for (_, original_tweet_id, retweeter), group in groupby(rows, key=itemgetter(0, 1, 2)):
+                tweets.setdefault(original_tweet_id, []).append((next(group)[3], retweeter))
+            received_retweets = sum(len(retweeted_by) for retweeted_by in tweets.values())
+            ordered_tweets = sorted(tweets.items(), key=lambda item: min(item[1]))
+            entry = {
+                'username': decode_name(author),
+                "receivedRetweets": received_retweets,
+                "tweets": {original_tweet_id: {"retweetedBy": [decode_name(retweeter) for _, retweeter in sorted(retweeted_by)]}
+                           for original_tweet_id, retweeted_by in ordered_tweets}
+            }
+            yield (-received_retweets, min(ordered_tweets[0][1])[0], entry)
+
+    for _, _, entry in sort_rows(entries(), spilled.directory, spilled.sort_rows, lambda row: 1 - row[0]):
+        yield entry
+
+def merged_mention_json(spilled):
+    """
+    Mentions entries of a spilled mention JSON aggregate, in the order of generadorp.iter_mention_json.
+    """
+    def entries():
+        for mentioned_user, rows in groupby(merge_runs(spilled.files.get("rows", []), spilled.directory), key=itemgetter(0)):
+            mentions = []
+            for user_screen_name, group in groupby(rows, key=itemgetter(1)):
+                group = list(group)
+                mentions.append((group[0][2], user_screen_name, [tweet_id for row in group for tweet_id in row[3]]))
+            mentions.sort(key=itemgetter(0))
+            received_mentions = sum(len(tweets) for _, _, tweets in mentions)
+            entry = {
+                "username": decode_name(mentioned_user),
+                "receivedMentions": received_mentions,
+                "mentions": [{"mentionBy": decode_name(user_screen_name), "tweets": tweets} for _, user_screen_name, tweets in mentions]
+            }
+            yield (-received_mentions, mentions[0][0], entry)
+
+    for _, _, entry in sort_rows(entries(), spilled.directory, spilled.sort_rows, lambda row: 1 - row[0]):
+        yield entry
+
+def merged_coretweet_matrix(spilled):
+    """
+    (authors, retweeters, matrix) of a spilled co-retweet aggregate, the same as generadorp.coretweet_incidence. The
+    incidence matrix and the names are held in memory, not the sets of authors of every retweeter. The matrix
+    counts against the budget of the pairs computed from it (see pair_sort_rows).
+    """
+    author_set = set()
+
+    def retweeter_rows():
+        for retweeter, rows in groupby(merge_runs(spilled.files.get("rows", []), spilled.directory), key=itemgetter(0)):
+            rows = list(rows)
+            retweeter_authors = sorted({author for _, author, _ in rows})
+            author_set.update(retweeter_authors)
+            yield (min(position for _, _, position in rows), retweeter, retweeter_authors)
+
+    ordered = sort_rows(retweeter_rows(), spilled.directory, spilled.sort_rows, lambda row: 1 + len(row[2]))
+    authors = sorted(author_set)
+    author_index = {author: index for index, author in enumerate(authors)}
+    retweeters = []
+    rows = array("i")
+    columns = array("i")
+    for column, (_, retweeter, retweeter_authors) in enumerate(ordered):
+        retweeters.append(retweeter)
+        rows.extend(author_index[author] for author in retweeter_authors)
+        columns.extend([column] * len(retweeter_authors))
+    return authors, retweeters, coretweets.incidence_matrix(rows, columns, len(authors), len(retweeters))
+
+def pair_sort_rows(state, matrix, workers=1):
+    """
+    Co-retweet pairs sorted in memory at a time by each of the workers, out of the budget left once every one of
+    them holds the incidence matrix.
+    """
+    matrix_bytes = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return max(BATCH_ROWS, int((state["budget_mb"] * 1024 * 1024 / workers - matrix_bytes) / ROW_BYTES / 4))
+
+def spill_pairs(matrix, blocks, directory, batch_rows, min_support=1, top_k=None):
+    """
+    Write the co-retweet pairs of the row blocks to sorted runs of (-count, first author, second author, common
+    retweeters) rows, the order of coretweets.merge_pairs, and return their paths. The top_k pairs can only be
+    among the top_k of every block, the others are not written.
+    """
+    transposed = matrix.T.tocsc()
+
+    def rows():
+        for start, end in blocks:
+            first, second, counts = coretweets.block_pairs(matrix, transposed, start, end, min_support)
+            if top_k is not None:
+                first, second, counts = coretweets.prune_top_k(first, second, counts, top_k)
+            for i, j, count in zip(first.tolist(), second.tolist(), counts.tolist()):
+                yield (-count, i, j, array("i", coretweets.common_retweeters(matrix, i, j).tolist()))
+
+    # A row weighs ROW_BYTES plus 4 bytes per common retweeter
+    return [write_run(new_run_path(directory), batch)
+            for batch in sorted_batches(rows(), batch_rows, lambda row: 1 + 4 * len(row[3]) // ROW_BYTES)]
+
+def merged_pairs(paths, directory, top_k=None):
+    """
+    (first author, second author, count, common retweeters) pairs of the runs of spill_pairs, in the order of
+    coretweets.merge_pairs.
+    """
+    pairs = ((first, second, -count, common) for count, first, second, common in merge_runs(paths, directory))
+    return pairs if top_k is None else islice(pairs, top_k)
+
+def pool_pairs(pool, workers, incidence, state, min_support=1, top_k=None):
+    """
+    Same as coretweets.pool_pairs, the workers spill the pairs to the directory of state and they are merged from
+    disk as the JSON is written. The directory is deleted when the process exits.
+    """
+    authors, retweeters, matrix = incidence
+    batch_rows = pair_sort_rows(state, matrix, workers)
+    futures = [pool.submit(spill_pairs, matrix, coretweets.row_blocks(matrix.shape[0], worker, workers), state["directory"],
+                           batch_rows, min_support, top_k) for worker in range(workers)]
+    atexit.register(shutil.rmtree, state["directory"], True)
+    return authors, retweeters, merged_pairs([path for future in futures for path in future.result()], state["directory"], top_k)
+
+def distributed_pairs(comm, incidence, state, min_support=1, top_k=None):
+    """
+    Same as coretweets.distributed_pairs, every rank spills its pairs and rank 0 merges the runs of all of them
+    from disk (see collect_spills) as the JSON is written.
+    """
+    rank = comm.Get_rank()
+    authors, retweeters, matrix = incidence if rank == 0 else (None, None, None)
+    matrix = comm.bcast(matrix, root=0)
+    paths = spill_pairs(matrix, coretweets.row_blocks(matrix.shape[0], rank, comm.Get_size()), state["directory"],
+                        pair_sort_rows(state, matrix), min_support, top_k)
+    del matrix
+    state["files"]["coretweet_pairs"] = {"rows": paths}
+    collect_spills(comm, state)
+    if rank != 0:
+        return None
+    return authors, retweeters, merged_pairs(state["files"]["coretweet_pairs"]["rows"], state["directory"], top_k)
@@ -0,0 +1,144 @@
+from array import array
+import numpy as np
+
+# Ids every table of screen names starts with, the builders skip the "null" screen name and tweets without user,
+# and the mention and co-retweet graphs the empty screen name too
+NULL = 0
+NONE = 1
+EMPTY = 2
+# Columns with repeated rows are first compacted at this many rows
+COMPACT_ROWS = 65536
+# Tweet ids above it do not fit an int64 column
+MAX_TWEET_ID = 2 ** 63 - 1
+
+
+def new_table(values=()):
+    """
+    Symbol table interning values (screen names, tweet ids) to consecutive ints in order of first appearance.
+    """
+    table = {"values": [], "index": {}}
+    for value in values:
+        intern(table, value)
+    return table
+
+def intern(table, value):
+    symbol = table["index"].get(value)
+    if symbol is None:
+        symbol = table["index"][value] = len(table["values"])
+        table["values"].append(value)
+    return symbol
+
+def new_symbols(retweets=True, mentions=True):
+    """
+    Tables shared by all the aggregates of a run: screen names, and the tweet ids that are not plain numbers.
+    Only the records of retweets and of tweets with mentions that some aggregate reads are interned.
+    """
+    return {"users": new_table(["null", None, ""]), "tweets": new_table(), "retweets": retweets, "mentions": mentions}
+
+def tweet_symbol(symbols, tweet_id):
+    """
+    Tweet ids are kept as the int they spell, other values (None, ids with leading zeros) are interned as negative ints.
+    """
+    if isinstance(tweet_id, str) and tweet_id.isascii() and tweet_id.isdigit() and (tweet_id[0] != "0" or tweet_id == "0"):
+        value = int(tweet_id)
+        if value <= MAX_TWEET_ID:
+            return value
+    return -1 - intern(symbols["tweets"], tweet_id)
+
+def tweet_value(symbols, symbol):
+    return str(symbol) if symbol >= 0 else symbols["tweets"]["values"][-1 - symbol]
+
+def intern_record(symbols, record):
+    """
+    TweetRecord with its screen names and tweet ids replaced by their ids, records no aggregate reads are left as they are.
+    """
+    users = symbols["users"]
+    if record.retweeted:
+        if not symbols["retweets"]:
+            return record
+        return record._replace(user=intern(users, record.user), author=intern(users, record.author),
+                               original_tweet_id=tweet_symbol(symbols, record.original_tweet_id))
+    if not symbols["mentions"]:
+        return record
+    return record._replace(tweet_id=tweet_symbol(symbols, record.tweet_id) if record.mentions else None,
+                           user=intern(users, record.user), mentions=tuple(intern(users, mention) for mention in record.mentions))
+
+def merge_table(table, other):
+    """
+    Intern the values of other into table, returns the array mapping the ids of other to the ids of table.
+    """
+    return np.array([intern(table, value) for value in other["values"]], dtype=np.int64)
+
+def merge_symbols(symbols, other):
+    """
+    Merge the tables of other into symbols, returns the (user, tweet) id mappings.
+    """
+    return merge_table(symbols["users"], other["users"]), merge_table(symbols["tweets"], other["tweets"])
+
+def column(values):
+    """
+    NumPy view of an array("i") or array("q") column.
+    """
+    return np.frombuffer(values, dtype=values.typecode)
+
+def append_mapped(values, other, mapping):
+    """
+    Append the user ids of the column other, mapped by an array of merge_table, to the column values.
+    """
+    values.frombytes(mapping[column(other)].astype(values.typecode).tobytes())
+
+def append_tweets(values, other, mapping):
+    """
+    Append the tweet ids of the column other to values, only the interned ones are mapped.
+    """
+    other = column(other)
+    interned = other < 0
+    mapped = -1 - mapping[-1 - other[interned]]
+    other = other.copy()
+    other[interned] = mapped
+    values.frombytes(other.astype(values.typecode).tobytes())
+
+def first_occurrences(*columns):
+    """
+    Sorted indexes of the first occurrence of every distinct row of the columns.
+    """
+    # lexsort is stable, so the first of a run of equal rows is their first occurrence
+    order = np.lexsort(columns[::-1])
+    if not len(order):
+        return order
+    repeated = np.ones(len(order) - 1, dtype=bool)
+    for values in columns:
+        sorted_values = values[order]
+        repeated &= sorted_values[1:] == sorted_values[:-1]
+    first = order[np.concatenate(([True], ~repeated))]
+    first.sort()
+    return first
+
+def unique_rows(data, keys):
+    """
+    Drop the repeated rows of the columns keys of data, the first occurrence of each row is kept. The next call
+    of compact_rows is once the rows left have doubled.
+    """
+    first = first_occurrences(*(column(data[key]) for key in keys))
+    if len(first) < len(data[keys[0]]):
+        for key in keys:
+            data[key] = array(data[key].typecode, column(data[key])[first].tobytes())
+    data["compact_at"] = max(COMPACT_ROWS, 2 * len(first))
+
+def compact_rows(data, keys):
+    if len(data[keys[0]]) >= data["compact_at"]:
+        unique_rows(data, keys)
+
+def groups(keys):
+    """
+    Group the rows of each key. Returns (order, starts, ends): order[starts[g]:ends[g]] are the rows of group g
+    in their original order, and groups are sorted by their first row.
+    """
+    order = np.argsort(keys, kind="stable")
+    if not len(order):
+        return order, order, order
+    sorted_keys = keys[order]
+    starts = np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+    ends = np.append(starts[1:], len(order))
+    by_first_row = np.argsort(order[starts], kind="stable")
+    return order, starts[by_first_row], ends[by_first_row]
@@ -0,0 +1,174 @@
+import os
+import sys
+import bz2
+import json
+import random
+import argparse
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+HASHTAG_WORDS = ["elecciones", "debate", "python", "futbol", "noticias", "mpi", "datos", "grafos", "clima", "economia",
+                 "salud", "cine", "musica", "tecnologia", "deportes", "viajes", "ciencia", "arte", "politica", "covid"]
+
+
+def zipf_weights(count, exponent):
+    """
+    Cumulative weights of ranks 1..count with P(rank) proportional to 1 / rank ** exponent, for random.choices.
+    An exponent of 0 gives a uniform distribution.
+    """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def file_tweet_counts(tweet_count, file_count, exponent):
+    """
+    Split tweet_count between the files with Zipf skewed sizes, shuffled so the biggest file is not always the first.
+    """
+    weights = [1 / rank ** exponent for rank in range(1, file_count + 1)]
+    total = sum(weights)
+    counts = [int(tweet_count * weight / total) for weight in weights]
+    counts[0] += tweet_count - sum(counts)
+    random.Random(file_count).shuffle(counts)
+    return counts
+
+def user_object(index):
+    screen_name = f"user{index}"
+    return {
+        "id": 1000000 + index,
+        "id_str": str(1000000 + index),
+        "name": f"User {index}",
+        "screen_name": screen_name,
+        "location": None,
+        "description": f"Synthetic account {index}",
+        "protected": False,
+        "verified": False,
+        "followers_count": 100000 // (index + 1),
+        "friends_count": index % 500,
+        "statuses_count": 1000 + index,
+        "created_at": "Mon Jan 01 00:00:00 +0000 2018",
+        "lang": None
+    }
+
+def tweet_object(tweet_id, created_at, user_index, hashtags, mentioned):
+    text = " ".join([f"@user{index}" for index in mentioned] + ["texto de prueba"] + [f"#{hashtag}" for hashtag in hashtags])
+    return {
+        "created_at": created_at.strftime("%a %b %d %H:%M:%S +0000 %Y"),
+        "id": tweet_id,
+        "id_str": str(tweet_id),
+        "text": text,
+        "source": "<a href=\"http://twitter.com\" rel=\"nofollow\">Twitter Web Client</a>",
+        "truncated": False,
+        "in_reply_to_status_id": None,
+        "user": user_object(user_index),
+        "geo": None,
+        "coordinates": None,
+        "place": None,
+        "is_quote_status": False,
+        "retweet_count": 0,
+        "favorite_count": 0,
+        "entities": {
+            "hashtags": [{"text": hashtag, "indices": [0, len(hashtag) + 1]} for hashtag in hashtags],
+            "urls": [],
+            "user_mentions": [{"screen_name": f"user{index}", "name": f"User {index}", "id": 1000000 + index,
+                               "id_str": str(1000000 + index), "indices": [0, 0]} for index in mentioned],
+            "symbols": []
+        },
+        "favorited": False,
+        "retweeted": False,
+        "filter_level": "low",
+        "lang": "es",
+        "timestamp_ms": str(int((created_at - datetime(1970, 1, 1)).total_seconds()) * 1000)
+    }
+
+def generate_corpus(output_dir, tweet_count=100000, user_count=10000, file_count=8, retweet_ratio=0.5, retweet_skew=1.1,
+                    mention_skew=1.1, mean_mentions=1.0, hashtag_count=20, hashtag_skew=1.0, mean_hashtags=1.0,
+                    file_skew=0.0, start="2019-03-01", days=30, invalid_ratio=0.0, compresslevel=9, seed=0):
+    """
+    Write file_count .json.bz2 files of Twitter API v1.1 tweets into output_dir. Retweeted authors, mentioned users
+    and hashtags follow Zipf distributions with the given exponents, and file sizes follow one with file_skew.
+    Tweets are spread evenly over days from start, in order across the files. Returns a summary of the corpus.
+    """
+    rng = random.Random(seed)
+    users = range(user_count)
+    user_weights = zipf_weights(user_count, 0.5)
+    author_weights = zipf_weights(user_count, retweet_skew)
+    mention_weights = zipf_weights(user_count, mention_skew)
+    hashtags = [HASHTAG_WORDS[index % len(HASHTAG_WORDS)] + (str(index // len(HASHTAG_WORDS)) if index >= len(HASHTAG_WORDS) else "")
+                for index in range(hashtag_count)]
+    hashtag_weights = zipf_weights(hashtag_count, hashtag_skew) if hashtags else None
+    start_time = datetime.strptime(start, "%Y-%m-%d")
+    seconds_per_tweet = days * 86400 / max(tweet_count, 1)
+    first_tweet_id = 1100000000000000000
+
+    os.makedirs(output_dir, exist_ok=True)
+    counts = file_tweet_counts(tweet_count, file_count, file_skew)
+    tweet_index = 0
+    files = []
+    for file_index, count in enumerate(counts):
+        file_path = os.path.join(output_dir, f"tweets-{file_index:04d}.json.bz2")
+        with bz2.open(file_path, "wt", encoding="utf-8", compresslevel=compresslevel) as file:
+            for _ in range(count):
+                created_at = start_time + timedelta(seconds=int(tweet_index * seconds_per_tweet))
+                tweet_id = first_tweet_id + tweet_index
+                user = rng.choices(users, cum_weights=user_weights)[0]
+                tweet_hashtags = []
+                if hashtags:
+                    tweet_hashtags = rng.choices(hashtags, cum_weights=hashtag_weights, k=int(rng.expovariate(1 / mean_hashtags) + 0.5) if mean_hashtags else 0)
+                if rng.random() < retweet_ratio:
+                    author = rng.choices(users, cum_weights=author_weights)[0]
+                    # Every author has a handful of tweets that get retweeted, the first ones more often
+                    original_id = first_tweet_id - 1 - author * 10 - min(int(rng.expovariate(1.0)), 9)
+                    original = tweet_object(original_id, created_at - timedelta(hours=1), author, tweet_hashtags, [])
+                    tweet = tweet_object(tweet_id, created_at, user, tweet_hashtags, [author])
+                    tweet["text"] = f"RT @user{author}: {original['text']}"
+                    tweet["retweeted_status"] = original
+                else:
+                    mention_count = int(rng.expovariate(1 / mean_mentions) + 0.5) if mean_mentions else 0
+                    tweet = tweet_object(tweet_id, created_at, user, tweet_hashtags, rng.choices(users, cum_weights=mention_weights, k=mention_count))
+                if invalid_ratio and rng.random() < invalid_ratio:
+                    file.write(json.dumps(tweet)[:-10] + "\n")
+                else:
+                    file.write(json.dumps(tweet) + "\n")
+                tweet_index += 1
+        files.append({"path": file_path, "tweets": count, "bytes": os.path.getsize(file_path)})
+
+    summary = {
+        "tweets": tweet_count,
+        "users": user_count,
+        "files": files,
+        "bytes": sum(file["bytes"] for file in files),
+        "seed": seed
+    }
+    with open(os.path.join(output_dir, "corpus.json"), "w") as file:
+        json.dump(summary, file, indent=4)
+    return summary
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Write a synthetic corpus of .json.bz2 tweet files")
+    parser.add_argument("output_dir", help="Directory of the corpus")
+    parser.add_argument("--tweets", type=int, default=100000, help="Number of tweets")
+    parser.add_argument("--users", type=int, default=10000, help="Number of users")
+    parser.add_argument("--files", type=int, default=8, help="Number of files")
+    parser.add_argument("--retweet-ratio", type=float, default=0.5, help="Fraction of tweets that are retweets")
+    parser.add_argument("--retweet-skew", type=float, default=1.1, help="Zipf exponent of the retweeted authors")
+    parser.add_argument("--mention-skew", type=float, default=1.1, help="Zipf exponent of the mentioned users")
+    parser.add_argument("--mean-mentions", type=float, default=1.0, help="Mean mentions of a tweet that is not a retweet")
+    parser.add_argument("--hashtags", type=int, default=20, help="Number of distinct hashtags")
+    parser.add_argument("--hashtag-skew", type=float, default=1.0, help="Zipf exponent of the hashtags")
+    parser.add_argument("--mean-hashtags", type=float, default=1.0, help="Mean hashtags of a tweet")
+    parser.add_argument("--file-skew", type=float, default=0.0, help="Zipf exponent of the file sizes, 0 gives files of the same size")
+    parser.add_argument("--start", default="2019-03-01", help="Date of the first tweet (YYYY-MM-DD)")
+    parser.add_argument("--days", type=float, default=30, help="Days covered by the corpus")
+    parser.add_argument("--invalid-ratio", type=float, default=0.0, help="Fraction of truncated lines")
+    parser.add_argument("--compresslevel", type=int, default=9, help="bz2 compression level")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, the same arguments and seed give the same files")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    summary = generate_corpus(args.output_dir, args.tweets, args.users, args.files, args.retweet_ratio, args.retweet_skew,
+                              args.mention_skew, args.mean_mentions, args.hashtags, args.hashtag_skew, args.mean_hashtags,
+                              args.file_skew, args.start, args.days, args.invalid_ratio, args.compresslevel, args.seed)
+    print(f"{summary['tweets']} tweets in {len(summary['files'])} files, {summary['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
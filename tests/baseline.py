@@ -0,0 +1,182 @@
+"""
+Output builders of the original generadorp.py, before the aggregates, kept as they were to compare the outputs against.
+"""
+from itertools import combinations
+import networkx as nx
+
+
+def add_node_to_graph(graph, node):
+    if node != "null" and not graph.has_node(node):
+        graph.add_node(node)
+
+def add_or_update_edge(graph, node1, node2):
+    if not graph.has_edge(node1, node2):
+        graph.add_edge(node1, node2, weight=0)
+    graph[node1][node2]["weight"] += 1
+
+def process_user_tweet(tweet):
+    user_screen_name = tweet["user"]["screen_name"] if 'user' in tweet else None
+    retweeted = "retweeted_status" in tweet
+    original_tweet = tweet["retweeted_status"] if retweeted else None
+    original_user_screen_name = original_tweet["user"]["screen_name"] if original_tweet else None
+
+    return user_screen_name, retweeted, original_tweet, original_user_screen_name
+
+def create_retweet_graph(tweets):
+    graph = nx.DiGraph()
+
+    for tweet in tweets:
+        user_screen_name, retweeted, _, original_user_screen_name = process_user_tweet(tweet)
+
+        if retweeted:
+            add_node_to_graph(graph, user_screen_name)
+            add_node_to_graph(graph, original_user_screen_name)
+            add_or_update_edge(graph, user_screen_name, original_user_screen_name)
+
+    return graph
+
+def update_retweet_json_data(retweets_data, user_screen_name, original_tweet, original_user_screen_name):
+    original_tweet_id = original_tweet["id_str"]
+    if original_user_screen_name not in retweets_data:
+        retweets_data[original_user_screen_name] = {
+            'username': original_user_screen_name,
+            "receivedRetweets": 0,
+            "tweets": {}
+        }
+
+    if original_tweet_id not in retweets_data[original_user_screen_name]["tweets"]:
+        retweets_data[original_user_screen_name]["tweets"][original_tweet_id] = {
+            "retweetedBy": []
+        }
+
+    if user_screen_name not in retweets_data[original_user_screen_name]["tweets"][original_tweet_id]["retweetedBy"]:
+        retweets_data[original_user_screen_name]["tweets"][original_tweet_id]["retweetedBy"].append(user_screen_name)
+        retweets_data[original_user_screen_name]["receivedRetweets"] += 1
+
+def create_retweet_json(tweets):
+    retweets_data = {}
+
+    for tweet in tweets:
+        user_screen_name, retweeted, original_tweet, original_user_screen_name = process_user_tweet(tweet)
+
+        if retweeted:
+            update_retweet_json_data(retweets_data, user_screen_name, original_tweet, original_user_screen_name)
+
+    sorted_retweets = sorted(retweets_data.values(), key=lambda x: x['receivedRetweets'], reverse=True)
+    return {'retweets': sorted_retweets}
+
+def create_mention_graph(tweets):
+    graph = nx.DiGraph()
+
+    for tweet in tweets:
+        user_screen_name, retweeted, _, _ = process_user_tweet(tweet)
+        if not retweeted and user_screen_name:
+            mentioned_users = {mention["screen_name"] for mention in tweet.get("entities", {}).get("user_mentions", []) if mention["screen_name"] != "null"}
+
+            add_node_to_graph(graph, user_screen_name)
+            for mentioned_user in mentioned_users:
+                add_node_to_graph(graph, mentioned_user)
+                add_or_update_edge(graph, user_screen_name, mentioned_user)
+
+    return graph
+
+def create_coretweet_json(tweets):
+    retweet_dict = {}
+    coretweets = []
+    index_guide = {}
+    index = 0
+
+    for tweet in tweets:
+        retweeter = tweet['user']['screen_name']
+
+        # Check if the tweet is a retweet
+        if 'retweeted_status' in tweet and 'user' in tweet:
+            author = tweet['retweeted_status']['user']['screen_name']
+            if author != retweeter and author != "null" and retweeter != "null":
+                # Update the retweet dictionary
+                retweet_dict.setdefault(retweeter, []).append(author)
+
+    result = {}
+    for key, authors_list in retweet_dict.items():
+        seen_authors = set()
+        for author in authors_list:
+            if author not in seen_authors and author != key:
+                seen_authors.add(author)
+
+        # Store the pair in the dictionary
+        for combo in combinations(seen_authors, 2):
+            author_pair = tuple(sorted(combo))
+            if author_pair not in result:
+                result[author_pair] = {
+                    'authors': {'u1': author_pair[0], 'u2': author_pair[1]},
+                    'totalCoretweets': 0,
+                    'retweeters': set()
+                }
+                index_guide[author_pair] = index
+                index += 1
+                coretweets.append(result[author_pair])
+
+            result[author_pair]['retweeters'].add(key)
+            result[author_pair]['totalCoretweets'] += 1
+
+    # Updating the coretweets list with the final count and retweeters
+    for author_pair, data in result.items():
+        coretweets[index_guide[author_pair]]['retweeters'] = list(data['retweeters'])
+
+    # Sort the coretweets list by the total number of coretweets
+    sorted_coretweets = sorted(coretweets, key=lambda x: x['totalCoretweets'], reverse=True)
+
+    return {'coretweets': sorted_coretweets}
+
+def create_coretweet_graph(tweets):
+    graph = nx.Graph()
+
+    for tweet in tweets:
+        user_screen_name, retweeted, original_tweet, _ = process_user_tweet(tweet)
+        if retweeted and user_screen_name and original_tweet:
+            author = original_tweet["user"]["screen_name"]
+            if author != "null" and user_screen_name != "null" and author != user_screen_name:
+                add_node_to_graph(graph, author)
+                add_node_to_graph(graph, user_screen_name)
+                add_or_update_edge(graph, author, user_screen_name)
+
+    return graph
+
+def update_mention_json_data(mentions_data, user_screen_name, mentioned_user, tweet_id):
+    if mentioned_user not in mentions_data:
+        mentions_data[mentioned_user] = {
+            "username": mentioned_user,
+            "receivedMentions": 0,
+            "mentions": []
+        }
+
+    existing_mention = None
+    for mention in mentions_data[mentioned_user]["mentions"]:
+        if mention["mentionBy"] == user_screen_name:
+            existing_mention = mention
+            break
+
+    if not existing_mention:
+        mentions_data[mentioned_user]["mentions"].append({
+            "mentionBy": user_screen_name,
+            "tweets": [tweet_id]
+        })
+    else:
+        existing_mention["tweets"].append(tweet_id)
+
+    mentions_data[mentioned_user]["receivedMentions"] += 1
+
+def create_mention_json(tweets):
+    mentions_data = {}
+
+    for tweet in tweets:
+        user_screen_name, retweeted, _, _ = process_user_tweet(tweet)
+
+        if not retweeted and user_screen_name:
+            mentioned_users = {mention["screen_name"] for mention in tweet.get("entities", {}).get("user_mentions", []) if mention["screen_name"] != "null"}
+           
+            for mentioned_user in mentioned_users:
+                update_mention_json_data(mentions_data, user_screen_name, mentioned_user, tweet["id_str"])
+
+    sorted_mentions = sorted(mentions_data.values(), key=lambda x: x['receivedMentions'], reverse=True)
+    return {'mentions': sorted_mentions}
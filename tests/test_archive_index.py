@@ -0,0 +1,91 @@
+import bz2
+import json
+import os
+import random
+from datetime import datetime
+import pytest
+import archive_index
+import generadorp
+
+# Eight blocks in chunks of two, one, one and four blocks
+INDEX = {"blocks": [(bit, bit + 8) for bit in range(0, 64, 8)],
+         "chunks": [[0, 1, 1, 1], [2, 2, 1, 2], [3, 3, 2, 2], [4, 7, 3, 3]]}
+# Tweets of three days, hashtag "a" on the first and last day and "b" on the second
+DAYS = [(datetime(2018, 1, 1), "a"), (datetime(2018, 1, 2), "b"), (datetime(2018, 1, 3), "a")]
+PER_DAY = 1500
+
+
+@pytest.mark.parametrize("chunk_ids, first_block, last_block, expected", [
+    ([0, 1, 2, 3], 0, None, [(0, 7)]),
+    ([0, 2], 0, None, [(0, 1), (3, 3)]),
+    ([1, 3], 0, None, [(2, 2), (4, 7)]),
+    ([0, 1, 3], 1, 5, [(1, 2), (4, 5)]),
+    ([0, 3], 2, 3, []),
+    ([], 0, None, []),
+])
+def test_block_ranges(chunk_ids, first_block, last_block, expected):
+    assert archive_index.block_ranges(INDEX, chunk_ids, first_block, last_block) == expected
+
+def tweet_lines(seed, per_day=PER_DAY):
+    """
+    Tweets padded with random digits so that every day spans several 100 kB bz2 blocks.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for day, hashtag in DAYS:
+        for _ in range(per_day):
+            tweet = {"created_at": day.strftime("%a %b %d 10:00:00 +0000 %Y"), "id_str": str(len(lines)),
+                     "user": {"screen_name": "u"}, "text": "".join(rng.choice("0123456789") for _ in range(200)),
+                     "entities": {"hashtags": [{"text": hashtag.upper()}], "user_mentions": []}}
+            lines.append(json.dumps(tweet) + "\n")
+    return lines
+
+@pytest.fixture(scope="module")
+def indexed_file(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("archive")
+    file_path = str(directory / "tweets.json.bz2")
+    with bz2.open(file_path, "wt", compresslevel=1) as file:
+        file.writelines(tweet_lines(0))
+    index_dir = str(directory / "index")
+    os.makedirs(index_dir)
+    generadorp.build_file_index(file_path, index_dir, 100000)
+    return file_path, index_dir
+
+def selected_ids(units):
+    return {json.loads(line)["id_str"] for unit in units for line in generadorp.read_unit_lines(unit)}
+
+def day_ids(days, hashtags):
+    return {str(day_index * PER_DAY + offset) for day_index, (day, hashtag) in enumerate(DAYS)
+            if day in days and (not hashtags or hashtag in hashtags) for offset in range(PER_DAY)}
+
+@pytest.mark.parametrize("split_bytes", [None, 150000])
+@pytest.mark.parametrize("start_date, end_date, hashtags", [
+    (DAYS[1][0], DAYS[1][0], None),
+    (DAYS[0][0], DAYS[2][0], ["b"]),
+    (DAYS[1][0], DAYS[2][0], ["a"]),
+    (DAYS[0][0].date(), DAYS[0][0].date(), None),
+])
+def test_selected_units_hold_every_matching_tweet(indexed_file, split_bytes, start_date, end_date, hashtags):
+    file_path, index_dir = indexed_file
+    units = generadorp.find_work_units([file_path], split_bytes)
+    selected = generadorp.select_indexed_units(units, index_dir, start_date, end_date, hashtags)
+    days = {day for day, _ in DAYS if start_date <= (day if isinstance(start_date, datetime) else day.date()) <= end_date}
+    ids = selected_ids(selected)
+    expected = day_ids(days, hashtags)
+    assert expected <= ids
+    assert len(ids) < len(selected_ids(units))
+    assert sum(unit.size for unit in selected) < sum(unit.size for unit in units)
+
+def test_files_without_an_up_to_date_index_are_kept_whole(indexed_file, tmp_path):
+    file_path, index_dir = indexed_file
+    units = generadorp.find_work_units([file_path])
+    assert generadorp.select_indexed_units(units, str(tmp_path), DAYS[1][0], DAYS[1][0], None) == units
+
+    stale_path = str(tmp_path / "stale.json.bz2")
+    with bz2.open(stale_path, "wt") as file:
+        file.writelines(tweet_lines(1, per_day=10))
+    generadorp.build_file_index(stale_path, str(tmp_path), 100000)
+    with bz2.open(stale_path, "wt") as file:
+        file.writelines(tweet_lines(2, per_day=20))
+    units = generadorp.find_work_units([stale_path])
+    assert generadorp.select_indexed_units(units, str(tmp_path), DAYS[1][0], DAYS[1][0], None) == units
@@ -0,0 +1,90 @@
+import io
+import json
+import networkx as nx
+import pytest
+import baseline
+import generadorp
+import writers
+
+CREATED_AT = "Mon Jan 01 10:00:00 +0000 2018"
+
+
+def tweet(tweet_id, user, mentions=(), retweet_of=None):
+    """
+    Tweet of user (None for a tweet without user) mentioning mentions, or retweeting (author, original tweet id).
+    """
+    tweet = {"created_at": CREATED_AT, "id_str": tweet_id, "entities": {"hashtags": [], "user_mentions": [{"screen_name": name} for name in mentions]}}
+    if user is not None:
+        tweet["user"] = {"screen_name": user}
+    if retweet_of is not None:
+        tweet["retweeted_status"] = {"id_str": retweet_of[1], "user": {"screen_name": retweet_of[0]}}
+    return tweet
+
+# Tweets without user, of users with an empty screen name and of the "null" user, among regular ones
+TWEETS = [
+    tweet("1", "a", ("b", "")),
+    tweet("2", "", ("a", "b")),
+    tweet("3", None, ("a",)),
+    tweet("4", "null", ("b",)),
+    tweet("5", "", retweet_of=("a", "1")),
+    tweet("6", "b", retweet_of=("", "2")),
+    tweet("7", None, retweet_of=("a", "1")),
+    tweet("8", "c", retweet_of=("a", "1")),
+    tweet("9", "c", retweet_of=("b", "6")),
+    tweet("10", "b", ("c", "null")),
+    tweet("11", "a", retweet_of=("null", "4")),
+]
+# networkx cannot add None as a node, the baseline retweet graph fails on a retweet without user
+GRAPH_TWEETS = [tweet for tweet in TWEETS if "user" in tweet or "retweeted_status" not in tweet]
+GRAPHS = {"retweet_graph": (baseline.create_retweet_graph, generadorp.create_retweet_graph),
+          "mention_graph": (baseline.create_mention_graph, generadorp.create_mention_graph),
+          "coretweet_graph": (baseline.create_coretweet_graph, generadorp.create_coretweet_graph)}
+JSONS = {"retweet_json": (baseline.create_retweet_json, generadorp.build_retweet_json),
+         "mention_json": (baseline.create_mention_json, generadorp.build_mention_json)}
+
+
+def aggregate(name, tweets=TWEETS):
+    aggregates = generadorp.new_aggregates([name])
+    for tweet in tweets:
+        generadorp.update_aggregates(aggregates, generadorp.extract_record(tweet))
+    return aggregates[name], aggregates["symbols"]
+
+def networkx_gexf(graph):
+    file = io.BytesIO()
+    nx.write_gexf(graph, file)
+    return file.getvalue().decode("utf-8").replace(f"NetworkX {nx.__version__}", "generadorp")
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_graphs_match_the_baseline(name):
+    graph_data, symbol_tables = aggregate(name, GRAPH_TWEETS)
+    file = io.StringIO()
+    writers.write_gexf(file, generadorp.graph_names(graph_data, symbol_tables), graph_data["sources"], graph_data["targets"],
+                       graph_data["weights"], graph_data["directed"])
+    assert file.getvalue() == networkx_gexf(GRAPHS[name][0](GRAPH_TWEETS))
+
+@pytest.mark.parametrize("name", list(GRAPHS))
+def test_graph_wrappers_match_the_baseline(name):
+    create, wrapper = GRAPHS[name]
+    assert networkx_gexf(wrapper(GRAPH_TWEETS)) == networkx_gexf(create(GRAPH_TWEETS))
+
+@pytest.mark.parametrize("name", list(JSONS))
+def test_jsons_match_the_baseline(name):
+    create, build = JSONS[name]
+    assert json.dumps(build(*aggregate(name)), indent=4) == json.dumps(create(TWEETS), indent=4)
+
+@pytest.mark.parametrize("name", list(JSONS))
+def test_json_wrappers_match_the_baseline(name):
+    create, _ = JSONS[name]
+    wrapper = getattr(generadorp, f"create_{name}")
+    assert json.dumps(wrapper(TWEETS), indent=4) == json.dumps(create(TWEETS), indent=4)
+
+def sorted_coretweets(coretweet_json):
+    return sorted(((pair["authors"]["u1"], pair["authors"]["u2"]), pair["totalCoretweets"], sorted(pair["retweeters"]))
+                  for pair in coretweet_json["coretweets"])
+
+def test_coretweet_json_wrapper_matches_the_baseline():
+    # The baseline reads the user of every tweet, and leaves the order of pairs with the same count and of retweeters to set order
+    tweets = [tweet for tweet in TWEETS if "user" in tweet] + [tweet("12", "c", retweet_of=("d", "3")), tweet("13", "b", retweet_of=("d", "3"))]
+    coretweet_json = generadorp.create_coretweet_json(tweets)
+    assert isinstance(coretweet_json["coretweets"], list)
+    assert sorted_coretweets(coretweet_json) == sorted_coretweets(baseline.create_coretweet_json(tweets))
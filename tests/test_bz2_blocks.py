@@ -0,0 +1,49 @@
+import bz2
+import random
+import pytest
+import bz2_blocks
+
+
+def text_lines(seed, count):
+    rng = random.Random(seed)
+    return [" ".join(str(rng.randrange(10 ** 6)) for _ in range(rng.randrange(1, 400))) + "\n" for _ in range(count)]
+
+def chunk_lines(data, chunks):
+    blocks = bz2_blocks.find_blocks(data)
+    return [line for first_block, last_block in chunks for line in bz2_blocks.read_chunk_lines(data, blocks, first_block, last_block)]
+
+@pytest.fixture(scope="module")
+def streams():
+    """
+    Two bz2 streams of several 100 kB blocks each, the last line of the second one has no newline.
+    """
+    first, second = text_lines(0, 300), text_lines(1, 200)
+    second[-1] = second[-1].rstrip("\n")
+    data = bz2.compress("".join(first).encode(), compresslevel=1) + bz2.compress("".join(second).encode(), compresslevel=1)
+    return data, first + second
+
+def test_blocks_cover_every_stream(streams):
+    data, lines = streams
+    blocks = bz2_blocks.find_blocks(data)
+    assert len(blocks) > 4
+    assert b"".join(bz2_blocks.decompress_block(data, *block) for block in blocks) == "".join(lines).encode()
+
+def test_every_line_is_read_by_one_chunk(streams):
+    data, lines = streams
+    block_count = len(bz2_blocks.find_blocks(data))
+    assert chunk_lines(data, [(0, block_count - 1)]) == lines
+    assert chunk_lines(data, [(block, block) for block in range(block_count)]) == lines
+    for split in range(1, block_count):
+        assert chunk_lines(data, [(0, split - 1), (split, block_count - 1)]) == lines
+
+@pytest.mark.parametrize("chunk_bytes", [1, 50000, 150000, 10 ** 9])
+def test_split_blocks_chunks_read_every_line(streams, chunk_bytes):
+    data, lines = streams
+    chunks = bz2_blocks.split_blocks(bz2_blocks.find_blocks(data), chunk_bytes)
+    assert chunk_lines(data, chunks) == lines
+
+def test_line_ending_at_a_block_boundary():
+    # A line that ends exactly where a block ends, the next chunk starts with a whole line
+    first = "a" * 99 + "\n"
+    data = bz2.compress(first.encode(), compresslevel=1) + bz2.compress(b"b\nc\n", compresslevel=1)
+    assert chunk_lines(data, [(0, 0), (1, 1)]) == [first, "b\n", "c\n"]
@@ -0,0 +1,43 @@
+import bz2
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "generadorp.py")
+CREATED_AT = "Mon Jan 01 10:00:00 +0000 2018"
+# Tweet ids that are not canonical int64 numbers: a leading zero, not a number, above 2^63 and missing
+TWEETS = [
+    {"created_at": CREATED_AT, "id_str": "0841", "user": {"screen_name": "a"}, "entities": {"hashtags": [], "user_mentions": [{"screen_name": "b"}]}},
+    {"created_at": CREATED_AT, "id_str": "abc", "user": {"screen_name": "c"}, "entities": {"hashtags": [], "user_mentions": [{"screen_name": "b"}]}},
+    {"created_at": CREATED_AT, "id_str": "99999999999999999999", "user": {"screen_name": "a"}, "entities": {"hashtags": [], "user_mentions": [{"screen_name": "c"}]}},
+    {"created_at": CREATED_AT, "user": {"screen_name": "d"}, "entities": {"hashtags": [], "user_mentions": [{"screen_name": "a"}]}},
+    {"created_at": CREATED_AT, "id_str": "12", "user": {"screen_name": "b"}, "retweeted_status": {"id_str": "0841", "user": {"screen_name": "a"}}},
+    {"created_at": CREATED_AT, "id_str": "13", "user": {"screen_name": "c"}, "retweeted_status": {"id_str": "abc", "user": {"screen_name": "c"}}},
+    {"created_at": CREATED_AT, "id_str": "14", "user": {"screen_name": "d"}, "retweeted_status": {"id_str": "99999999999999999999", "user": {"screen_name": "a"}}},
+]
+OUTPUTS = ["rtp.json", "mentionp.json"]
+
+
+def run(directory, output_dir, *flags):
+    os.makedirs(output_dir)
+    subprocess.run([sys.executable, SCRIPT, "-d", str(directory), "-jrt", "-jm", "--executor", "processes", "--workers", "1", *flags],
+                   cwd=output_dir, check=True, capture_output=True)
+    outputs = {}
+    for name in OUTPUTS:
+        with open(os.path.join(output_dir, name)) as file:
+            outputs[name] = json.load(file)
+    return outputs
+
+def test_cached_outputs_match(tmp_path):
+    directory = tmp_path / "input"
+    directory.mkdir()
+    with bz2.open(directory / "tweets.json.bz2", "wt") as file:
+        file.writelines(json.dumps(tweet) + "\n" for tweet in TWEETS)
+
+    expected = run(directory, tmp_path / "plain")
+    assert "0841" in json.dumps(expected["mentionp.json"])
+    cache_dir = str(tmp_path / "cache")
+    # The first run builds the cache, the second one reads it
+    assert run(directory, tmp_path / "build", "--cache", cache_dir) == expected
+    assert run(directory, tmp_path / "read", "--cache", cache_dir) == expected
@@ -0,0 +1,49 @@
+import json
+import pytest
+import decoders
+import generadorp
+
+CREATED_AT = "Mon Jan 01 10:00:00 +0000 2018"
+TWEETS = [
+    {"created_at": CREATED_AT, "id_str": "1", "user": {"screen_name": "a"},
+     "entities": {"hashtags": [{"text": "Tag"}], "user_mentions": [{"screen_name": "b"}, {"screen_name": "null"}]}},
+    {"created_at": CREATED_AT, "id_str": "2", "user": {"screen_name": "b"},
+     "retweeted_status": {"id_str": "1", "user": {"screen_name": "a"}}, "entities": {"hashtags": [], "user_mentions": []}},
+    {"created_at": CREATED_AT, "id_str": "3", "user": {"screen_name": "c"}, "entities": {"hashtags": None, "user_mentions": [{"screen_name": "a"}]}},
+    {"created_at": CREATED_AT, "id_str": "4", "user": {"screen_name": "c"}, "entities": {"hashtags": [{"text": "tag"}], "user_mentions": None}},
+    {"created_at": CREATED_AT, "id_str": "5", "user": {"screen_name": "d"}, "entities": None},
+    {"created_at": CREATED_AT, "id_str": "6", "user": {"screen_name": "d"}},
+    {"id_str": "7"},
+]
+
+
+def get_decode(name):
+    try:
+        return decoders.get_decoder(name)[1]
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+def decode_lines(name, lines):
+    decode = get_decode(name)
+    return [decode(line) for line in lines]
+
+@pytest.mark.parametrize("name", decoders.DECODER_PREFERENCE)
+def test_backends_extract_the_same_records(name):
+    lines = [json.dumps(tweet) for tweet in TWEETS]
+    expected = [generadorp.extract_record(tweet) for tweet in decode_lines("json", lines)]
+    assert [generadorp.extract_record(tweet) for tweet in decode_lines(name, lines)] == expected
+
+@pytest.mark.parametrize("name", decoders.DECODER_PREFERENCE)
+def test_backends_read_the_same_hashtags(name):
+    lines = [json.dumps(tweet) for tweet in TWEETS]
+    hashtags = [[hashtag["text"] for hashtag in generadorp.entity_list(tweet, "hashtags")] for tweet in decode_lines(name, lines)]
+    assert hashtags == [["Tag"], [], [], ["tag"], [], [], []]
+
+@pytest.mark.parametrize("name", decoders.DECODER_PREFERENCE)
+def test_backends_reject_invalid_json(name):
+    with pytest.raises(ValueError):
+        get_decode(name)('{"id_str": "1",')
+
+def test_null_entities_are_empty():
+    assert generadorp.extract_record(TWEETS[3]).mentions == ()
+    assert generadorp.extract_record(TWEETS[4]).mentions == ()
@@ -0,0 +1,92 @@
+import json
+import queue
+import random
+import threading
+import pytest
+import generadorp
+
+NAMES = ["retweet_graph", "mention_json"]
+USERS = ["a", "b", "c", "d", "e"]
+UNITS = 9
+
+
+def unit_records(unit):
+    rng = random.Random(unit)
+    records = []
+    for tweet in range(20):
+        tweet_id = str(unit * 100 + tweet)
+        if rng.random() < 0.5:
+            records.append(generadorp.TweetRecord(tweet_id, rng.choice(USERS), True, rng.choice(USERS), str(rng.randrange(10)), (), 0))
+        else:
+            records.append(generadorp.TweetRecord(tweet_id, rng.choice(USERS), False, None, None, tuple(rng.sample(USERS, 2)), 0))
+    return records
+
+def unit_run(unit):
+    aggregates = generadorp.new_aggregates(NAMES)
+    for record in unit_records(unit):
+        generadorp.update_aggregates(aggregates, record)
+    return (unit, unit, aggregates)
+
+def outputs(aggregates):
+    """
+    Outputs of the aggregates, their node and row order depends on the order of the merges.
+    """
+    graph_data, symbol_tables = aggregates["retweet_graph"], aggregates["symbols"]
+    return (generadorp.graph_names(graph_data, symbol_tables), list(graph_data["sources"]), list(graph_data["targets"]),
+            list(graph_data["weights"]), json.dumps(generadorp.build_mention_json(aggregates["mention_json"], symbol_tables)))
+
+def sequential_outputs():
+    aggregates = unit_run(0)[2]
+    for unit in range(1, UNITS):
+        aggregates = generadorp.merge_aggregates(aggregates, unit_run(unit)[2])
+    return outputs(aggregates)
+
+class ThreadComm:
+    """
+    Point to point messages between ranks run as threads.
+    """
+    def __init__(self, rank, size, queues):
+        self.rank, self.size, self.queues = rank, size, queues
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return self.size
+
+    def send(self, obj, dest):
+        self.queues[(self.rank, dest)].put(obj)
+
+    def recv(self, source):
+        return self.queues[(source, self.rank)].get(timeout=10)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_runs_added_out_of_order_merge_in_unit_order(seed):
+    order = list(range(UNITS))
+    random.Random(seed).shuffle(order)
+    runs = []
+    for unit in order:
+        generadorp.add_run(runs, unit_run(unit))
+    assert [run[:2] for run in runs] == [(0, UNITS - 1)]
+    assert outputs(runs[0][2]) == sequential_outputs()
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5])
+def test_tree_reduce_runs_merge_in_unit_order(size):
+    # Units are handed out round robin, so every rank holds runs that are not adjacent
+    queues = {(source, dest): queue.Queue() for source in range(size) for dest in range(size)}
+    results = [None] * size
+
+    def run_rank(rank):
+        runs = []
+        for unit in range(rank, UNITS, size):
+            generadorp.add_run(runs, unit_run(unit))
+        results[rank] = generadorp.tree_reduce_runs(ThreadComm(rank, size, queues), runs)
+
+    threads = [threading.Thread(target=run_rank, args=(rank,)) for rank in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result == [] for result in results[1:])
+    assert [run[:2] for run in results[0]] == [(0, UNITS - 1)]
+    assert outputs(results[0][0][2]) == sequential_outputs()
@@ -0,0 +1,26 @@
+import generadorp
+
+# Mentions of tweets without user (None) and of users with an empty screen name, which the exact builders skip
+RECORDS = [
+    generadorp.TweetRecord("1", "a", False, None, None, ("b", "c"), 0),
+    generadorp.TweetRecord("2", "", False, None, None, ("b",), 0),
+    generadorp.TweetRecord("3", None, False, None, None, ("b", "a"), 0),
+    generadorp.TweetRecord("4", "c", False, None, None, ("b",), 0),
+    generadorp.TweetRecord("5", "", False, None, None, ("c",), 0),
+    generadorp.TweetRecord("6", "b", True, "a", "1", (), 0),
+]
+
+
+def test_mention_sketch_counts_the_exact_mentions():
+    aggregates = generadorp.new_aggregates(["mention_json"])
+    sketch = generadorp.new_mention_sketch()
+    for record in RECORDS:
+        generadorp.update_aggregates(aggregates, record)
+        generadorp.update_mention_sketch(sketch, record)
+    exact = generadorp.build_mention_json(aggregates["mention_json"], aggregates["symbols"])["mentions"]
+    top = generadorp.build_mention_top_json(sketch, 10)
+
+    assert top["stats"]["errorBound"] == 0
+    assert top["mentions"] == [{"username": entry["username"], "receivedMentions": entry["receivedMentions"]} for entry in exact]
+    assert top["stats"]["mentions"] == sum(entry["receivedMentions"] for entry in exact)
+    assert top["stats"]["mentioners"] == len({mention["mentionBy"] for entry in exact for mention in entry["mentions"]})
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import coretweets
+import generadorp
+import spill
+
+NAMES = ["retweet_graph", "retweet_json"]
+# Retweets of tweets without user (None) and of users with an empty screen name
+RECORDS = [
+    generadorp.TweetRecord("1", "a", True, "", "10", (), 0),
+    generadorp.TweetRecord("2", None, True, "a", "11", (), 0),
+    generadorp.TweetRecord("3", "", True, "a", "11", (), 0),
+    generadorp.TweetRecord("4", "b", True, "", "10", (), 0),
+    generadorp.TweetRecord("5", None, True, "", "10", (), 0),
+    generadorp.TweetRecord("6", "", True, "b", "12", (), 0),
+    generadorp.TweetRecord("7", "a", True, "", "10", (), 0),
+]
+
+
+def unit_aggregates(records):
+    aggregates = generadorp.new_aggregates(NAMES)
+    for record in records:
+        generadorp.update_aggregates(aggregates, record)
+    return aggregates
+
+def units():
+    return [unit_aggregates(RECORDS[:4]), unit_aggregates(RECORDS[4:])]
+
+def edge_set(names, edges):
+    return {(names[source], names[target], weight) for source, target, weight in edges}
+
+def test_spilled_outputs_keep_none_apart_from_empty_names(tmp_path):
+    first, second = units()
+    in_memory = generadorp.merge_aggregates(first, second)
+    symbol_tables = in_memory["symbols"]
+    graph_data = in_memory["retweet_graph"]
+
+    state = spill.new_spill(1, str(tmp_path))
+    spill.spill_runs(state, [(index, index, aggregates) for index, aggregates in enumerate(units())])
+    spilled = spill.spilled_aggregates(state, NAMES)
+    names, edges = spill.merged_graph(spilled["retweet_graph"])
+
+    expected_names = generadorp.graph_names(graph_data, symbol_tables)
+    assert None in expected_names and "" in expected_names
+    assert names == expected_names
+    assert edge_set(names, edges) == edge_set(expected_names, zip(graph_data["sources"], graph_data["targets"], graph_data["weights"]))
+    assert list(generadorp.iter_retweet_json(spilled["retweet_json"])) == list(generadorp.iter_retweet_json(in_memory["retweet_json"], symbol_tables))
+
+def test_names_round_trip():
+    for name in [None, "", "a", "\x01"]:
+        assert spill.decode_name(spill.encode_name(name)) == name
+    assert spill.encode_name(None) != spill.encode_name("")
+
+@pytest.mark.parametrize("top_k", [None, 5])
+def test_spilled_pairs_match_the_merged_pairs(tmp_path, top_k):
+    rng = np.random.default_rng(0)
+    rows, columns = np.nonzero(rng.random((40, 30)) < 0.3)
+    matrix = coretweets.incidence_matrix(rows, columns, 40, 30)
+    blocks = coretweets.row_blocks(40, block_rows=8)
+    expected = coretweets.merge_pairs([coretweets.compute_pairs(matrix, blocks, 2, top_k)], top_k)
+    paths = spill.spill_pairs(matrix, blocks, str(tmp_path), 10, 2, top_k)
+    assert len(paths) > 1
+    pairs = list(spill.merged_pairs(paths, str(tmp_path), top_k))
+    assert [(i, j, count, common.tolist()) for i, j, count, common in pairs] == [(i, j, count, common.tolist()) for i, j, count, common in expected]
@@ -0,0 +1,77 @@
+import random
+import pytest
+import generadorp
+import windows
+
+
+@pytest.mark.parametrize("first, last, window, step, expected", [
+    (0, 0, 1, 1, [0]),
+    (0, 4, 1, 1, [0, 1, 2, 3, 4]),
+    (0, 4, 2, 2, [1, 3, 4]),
+    (0, 4, 3, 1, [2, 3, 4]),
+    (0, 4, 10, 1, [4]),
+    (5, 9, 2, 3, [6, 9]),
+])
+def test_window_ends(first, last, window, step, expected):
+    assert list(windows.window_ends(first, last, window, step)) == expected
+
+@pytest.mark.parametrize("flag", ["--window", "--step"])
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_window_and_step_must_be_positive(flag, value):
+    with pytest.raises(SystemExit):
+        generadorp.parse_args(["-grt", "--time-buckets", "day", flag, value])
+    with pytest.raises(SystemExit):
+        generadorp.parse_query_args(["-grt", flag, value], generadorp.parse_args(["-grt"]), "query q")
+
+def random_records(seed, count=300, hours=30):
+    """
+    Retweets and mentions among a few users, spread over hours with some hours left empty.
+    """
+    rng = random.Random(seed)
+    users = ["a", "b", "c", "d", "e", "f"]
+    records = []
+    for tweet_id in range(count):
+        timestamp = rng.choice([hour for hour in range(hours) if hour % 7 != 3]) * 3600 + rng.randrange(3600)
+        user = rng.choice(users)
+        if rng.random() < 0.5:
+            records.append(generadorp.TweetRecord(str(tweet_id), user, True, rng.choice(users), str(rng.randrange(20)), (), timestamp))
+        else:
+            records.append(generadorp.TweetRecord(str(tweet_id), user, False, None, None, tuple(rng.sample(users, 2)), timestamp))
+    return records
+
+def graph_edges(names, sources, targets, weights):
+    return {(names[source], names[target]): weight for source, target, weight in zip(sources, targets, weights)}
+
+@pytest.mark.parametrize("name, graph_name", [("retweet_windows", "retweet_graph"), ("mention_windows", "mention_graph")])
+@pytest.mark.parametrize("bucket_hours, window, step, cumulative", [(1, 1, 1, False), (1, 4, 3, False), (1, 5, 2, True), (24, 1, 1, True)])
+def test_windows_match_graphs_of_their_time_range(name, graph_name, bucket_hours, window, step, cumulative):
+    # Every window must be the graph built from only the tweets of its time range, as a run with -fi/-ff would
+    records = random_records(0)
+    aggregates = generadorp.new_aggregates([name])
+    for record in records:
+        generadorp.update_aggregates(aggregates, record)
+    window_data = aggregates[name]
+    count = 0
+    for start, end, names, sources, targets, weights in windows.iter_windows(generadorp.window_names(window_data, aggregates["symbols"]),
+                                                                             window_data["directed"], bucket_hours, window, step, cumulative):
+        expected = generadorp.new_aggregates([graph_name])
+        for record in records:
+            if start <= record.timestamp // 3600 < end:
+                generadorp.update_aggregates(expected, record)
+        graph_data = expected[graph_name]
+        expected_names = generadorp.graph_names(graph_data, expected["symbols"])
+        assert set(names) == set(expected_names)
+        assert graph_edges(names, sources, targets, weights) == graph_edges(expected_names, graph_data["sources"], graph_data["targets"], graph_data["weights"])
+        count += 1
+    assert count > 1
+
+@pytest.mark.parametrize("dynamic", [False, True])
+def test_unwritable_windows_directory_is_reported(tmp_path, capsys, dynamic):
+    aggregates = generadorp.new_aggregates(["retweet_windows"])
+    for record in random_records(0, count=20):
+        generadorp.update_aggregates(aggregates, record)
+    output_dir = tmp_path / "output"
+    output_dir.write_text("not a directory")
+    args = {"time_buckets": "hour", "window": 1, "step": 1, "cumulative": False, "dynamic": dynamic, "compact": False, "compression": None}
+    assert not generadorp.save_window_graphs(aggregates["retweet_windows"], aggregates["symbols"], "rtp", args, str(output_dir))
+    assert "Error saving output" in capsys.readouterr().out
@@ -0,0 +1,60 @@
+import io
+import json
+import networkx as nx
+import pytest
+import writers
+
+
+def networkx_gexf(graph):
+    file = io.BytesIO()
+    nx.write_gexf(graph, file)
+    return file.getvalue().decode("utf-8").replace(f"NetworkX {nx.__version__}", "generadorp")
+
+def streamed_gexf(names, edges, directed=True, node_attributes=()):
+    file = io.StringIO()
+    sources, targets, weights = ([edge[index] for edge in edges] for index in range(3))
+    writers.write_gexf(file, names, sources, targets, weights, directed, node_attributes=node_attributes)
+    return file.getvalue()
+
+def networkx_graph(names, edges, directed=True):
+    graph = nx.DiGraph() if directed else nx.Graph()
+    graph.add_nodes_from(names)
+    graph.add_weighted_edges_from((names[source], names[target], weight) for source, target, weight in edges)
+    return graph
+
+@pytest.mark.parametrize("directed", [True, False])
+@pytest.mark.parametrize("names, edges", [([], []), (["a", "b"], [])])
+def test_graphs_without_nodes_or_edges(directed, names, edges):
+    assert streamed_gexf(names, edges, directed) == networkx_gexf(networkx_graph(names, edges, directed))
+
+# Names that need escaping, edges out of node order, a self loop and undirected edges given in both orientations
+NAMES = ["a", "b & <c>", 'say "hi"', "tab\there\nline", "ñandú", "d"]
+EDGES = [(3, 1, 2), (0, 1, 1), (2, 0, 5), (4, 4, 1), (1, 5, 3), (5, 2, 1)]
+
+@pytest.mark.parametrize("directed", [True, False])
+def test_graphs_match_networkx(directed):
+    assert streamed_gexf(NAMES, EDGES, directed) == networkx_gexf(networkx_graph(NAMES, EDGES, directed))
+
+def test_node_attributes_match_networkx():
+    node_attributes = [("pagerank", "double", [0.5, 0.25, 0.125, 0.0625, 0.03125, 0.03125]), ("degree", "long", [2, 3, 3, 1, 2, 2])]
+    graph = networkx_graph(NAMES, EDGES)
+    for node, name in enumerate(NAMES):
+        graph.nodes[name].update({title: values[node] for title, _, values in node_attributes})
+    assert streamed_gexf(NAMES, EDGES, node_attributes=node_attributes) == networkx_gexf(graph)
+
+def test_compact_graph_is_the_indented_one_without_layout():
+    file = io.StringIO()
+    writers.write_gexf(file, NAMES, *([edge[index] for edge in EDGES] for index in range(3)), compact=True)
+    assert file.getvalue() == "".join(line.strip() for line in streamed_gexf(NAMES, EDGES).splitlines())
+
+ITEMS = [{"user": "a", "mentions": [{"tweet": "1", "users": ["b", "ñ"]}], "empty": [], "none": None},
+         {"user": 'quote " and \\', "counts": {}, "values": [1, 2.5, True]}]
+
+@pytest.mark.parametrize("items", [[], ITEMS, [[], {}, 0, "x"]])
+def test_json_lists_match_json_dump(items):
+    file = io.StringIO()
+    writers.write_json_list(file, "users", iter(items))
+    assert file.getvalue() == json.dumps({"users": items}, indent=4)
+    file = io.StringIO()
+    writers.write_json_list(file, "users", iter(items), compact=True)
+    assert file.getvalue() == json.dumps({"users": items}, separators=(",", ":"))
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import numpy as np
+import symbols
+
+CACHE_VERSION = 2
+# date(1970, 1, 1).toordinal(), timestamps are seconds since the unix epoch
+EPOCH_ORDINAL = 719163
+READ_BATCH = 100000
+
+
+def cache_path(cache_dir, file_path, first_block=0, last_block=0):
+    """
+    Directory holding the columns of a file (or of a range of its bz2 blocks).
+    """
+    source = os.path.abspath(file_path)
+    key = hashlib.sha1(f"{source}:{first_block}:{last_block}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(file_path)}-{key}")
+
+def source_info(file_path, first_block=0, last_block=0):
+    stat = os.stat(file_path)
+    return {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "first_block": first_block,
+        "last_block": last_block
+    }
+
+def is_cache_valid(path, info):
+    try:
+        with open(os.path.join(path, "meta.json")) as file:
+            return json.load(file) == info
+    except (OSError, ValueError):
+        return False
+
+def intern(table, index, value):
+    if value is None:
+        return -1
+    value_id = index.get(value)
+    if value_id is None:
+        value_id = index[value] = len(table)
+        table.append(value)
+    return value_id
+
+def write_cache(path, info, rows):
+    """
+    Write the columns of rows, each row is (timestamp, tweet id, user, retweeted, author, original tweet id,
+    mentioned users, lowercase hashtags). Screen names and hashtags are interned, tweet ids are stored as the int
+    they spell or interned as negative ints, as symbols.tweet_symbol does.
+    """
+    users, user_index = [], {}
+    tweet_ids = {"tweets": symbols.new_table()}
+    hashtags, hashtag_index = [], {}
+    columns = {name: [] for name in ["timestamp", "tweet_id", "user", "retweeted", "author", "original_tweet_id"]}
+    mention_offsets, mention_users = [0], []
+    hashtag_offsets, hashtag_ids = [0], []
+
+    for timestamp, tweet_id, user, retweeted, author, original_tweet_id, mentions, tweet_hashtags in rows:
+        columns["timestamp"].append(timestamp)
+        columns["tweet_id"].append(symbols.tweet_symbol(tweet_ids, tweet_id))
+        columns["user"].append(intern(users, user_index, user))
+        columns["retweeted"].append(retweeted)
+        columns["author"].append(intern(users, user_index, author))
+        columns["original_tweet_id"].append(symbols.tweet_symbol(tweet_ids, original_tweet_id))
+        mention_users.extend(intern(users, user_index, mentioned_user) for mentioned_user in mentions)
+        mention_offsets.append(len(mention_users))
+        hashtag_ids.extend(intern(hashtags, hashtag_index, hashtag) for hashtag in tweet_hashtags)
+        hashtag_offsets.append(len(hashtag_ids))
+
+    os.makedirs(path, exist_ok=True)
+    dtypes = {"timestamp": np.int64, "tweet_id": np.int64, "user": np.int32, "retweeted": np.bool_, "author": np.int32, "original_tweet_id": np.int64}
+    for name, values in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.array(values, dtype=dtypes[name]))
+    np.save(os.path.join(path, "mention_offsets.npy"), np.array(mention_offsets, dtype=np.int64))
+    np.save(os.path.join(path, "mention_users.npy"), np.array(mention_users, dtype=np.int32))
+    np.save(os.path.join(path, "hashtag_offsets.npy"), np.array(hashtag_offsets, dtype=np.int64))
+    np.save(os.path.join(path, "hashtag_ids.npy"), np.array(hashtag_ids, dtype=np.int32))
+    with open(os.path.join(path, "tables.json"), "w") as file:
+        json.dump({"users": users, "hashtags": hashtags, "tweets": tweet_ids["tweets"]["values"]}, file)
+    # meta.json is written last, a cache without it is rebuilt
+    with open(os.path.join(path, "meta.json"), "w") as file:
+        json.dump(info, file)
+
+def read_cache(path):
+    cache = {}
+    for name in ["timestamp", "tweet_id", "user", "retweeted", "author", "original_tweet_id",
+                 "mention_offsets", "mention_users", "hashtag_offsets", "hashtag_ids"]:
+        cache[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    with open(os.path.join(path, "tables.json")) as file:
+        cache.update(json.load(file))
+    return cache
+
+def select_rows(cache, start_date, end_date, hashtags):
+    """
+    Indexes of the rows inside the date range (inclusive) with at least one of the hashtags.
+    """
+    days = cache["timestamp"] // 86400 + EPOCH_ORDINAL
+    mask = (days >= start_date.toordinal()) & (days <= end_date.toordinal())
+
+    if hashtags:
+        wanted = np.array([hashtag_id for hashtag_id, hashtag in enumerate(cache["hashtags"]) if hashtag in hashtags], dtype=np.int32)
+        matches = np.isin(cache["hashtag_ids"], wanted).astype(np.int64)
+        # Number of matching hashtags of each row, as a difference of the cumulative sum at the row offsets
+        cumulative = np.concatenate(([0], np.cumsum(matches)))
+        offsets = cache["hashtag_offsets"]
+        mask &= cumulative[offsets[1:]] > cumulative[offsets[:-1]]
+
+    return np.flatnonzero(mask)
+
+def iter_rows(cache, rows):
+    """
+    Yield (tweet id, user, retweeted, author, original tweet id, mentioned users, timestamp) for the selected rows.
+    """
+    users = cache["users"]
+    tweets = cache["tweets"]
+    mention_offsets = cache["mention_offsets"]
+    mention_users = cache["mention_users"]
+    for batch_start in range(0, len(rows), READ_BATCH):
+        batch = rows[batch_start:batch_start + READ_BATCH]
+        columns = zip(cache["tweet_id"][batch].tolist(), cache["user"][batch].tolist(), cache["retweeted"][batch].tolist(),
+                      cache["author"][batch].tolist(), cache["original_tweet_id"][batch].tolist(),
+                      mention_offsets[batch].tolist(), mention_offsets[batch + 1].tolist(), cache["timestamp"][batch].tolist())
+        for tweet_id, user, retweeted, author, original_tweet_id, mention_start, mention_end, timestamp in columns:
+            yield (str(tweet_id) if tweet_id >= 0 else tweets[-1 - tweet_id],
+                   users[user] if user >= 0 else None,
+                   retweeted,
+                   users[author] if author >= 0 else None,
+                   str(original_tweet_id) if original_tweet_id >= 0 else tweets[-1 - original_tweet_id],
+                   tuple(users[mentioned_user] for mentioned_user in mention_users[mention_start:mention_end].tolist()),
+                   timestamp)
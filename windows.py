@@ -0,0 +1,136 @@
+import time
+
+BUCKET_HOURS = {"hour": 1, "day": 24}
+
+
+def edge_key(source, target, directed):
+    if not directed and target < source:
+        source, target = target, source
+    return (source << 32) | target
+
+def hour_label(hour):
+    return time.strftime("%Y%m%dT%H", time.gmtime(hour * 3600))
+
+def hour_datetime(hour):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(hour * 3600))
+
+def bucket_tables(hour_graphs, bucket_hours=1):
+    """
+    Group the graphs of each hour into buckets of bucket_hours (aligned on UTC midnight). Node names are interned
+    once for all buckets, in order of first appearance. Returns (names, {bucket: ({node id: None}, {edge key: weight})}).
+    """
+    names = []
+    index = {}
+    buckets = {}
+    for hour in sorted(hour_graphs):
+        graph_data = hour_graphs[hour]
+        node_ids = []
+        for name in graph_data["names"]:
+            node_id = index.get(name)
+            if node_id is None:
+                node_id = index[name] = len(names)
+                names.append(name)
+            node_ids.append(node_id)
+        nodes, edges = buckets.setdefault(hour // bucket_hours, ({}, {}))
+        nodes.update(dict.fromkeys(node_ids))
+        for source, target, weight in zip(graph_data["sources"], graph_data["targets"], graph_data["weights"]):
+            key = edge_key(node_ids[source], node_ids[target], graph_data["directed"])
+            edges[key] = edges.get(key, 0) + weight
+    return names, buckets
+
+def window_ends(first, last, window, step):
+    """
+    Last bucket of every window. The last window always ends at the last bucket, and windows are only shorter
+    than window buckets when the data is.
+    """
+    end = min(first + window - 1, last)
+    while end < last:
+        yield end
+        end += step
+    yield last
+
+def iter_windows(hour_graphs, directed=True, bucket_hours=1, window=1, step=1, cumulative=False):
+    """
+    Yield (first hour, end hour, names, sources, targets, weights) of every window of the hourly graphs. A window
+    covers window buckets, or every bucket from the first one when cumulative, and windows start every step buckets.
+    The running window is updated by adding the bucket that enters it and subtracting the ones that leave it,
+    so every bucket is added and removed once whatever the window size. Nodes keep their order of first appearance
+    in the whole time range.
+    """
+    names, buckets = bucket_tables(hour_graphs, bucket_hours)
+    if not buckets:
+        return
+    first, last = min(buckets), max(buckets)
+    node_counts = {}
+    edge_weights = {}
+
+    def add_bucket(bucket, sign):
+        nodes, edges = buckets.get(bucket, ({}, {}))
+        for node_id in nodes:
+            count = node_counts.get(node_id, 0) + sign
+            if count:
+                node_counts[node_id] = count
+            else:
+                del node_counts[node_id]
+        for key, weight in edges.items():
+            total = edge_weights.get(key, 0) + sign * weight
+            if total:
+                edge_weights[key] = total
+            else:
+                del edge_weights[key]
+
+    added = first - 1
+    window_start = first
+    for end in window_ends(first, last, window, step):
+        while added < end:
+            added += 1
+            add_bucket(added, 1)
+        start = first if cumulative else max(first, end - window + 1)
+        while window_start < start:
+            add_bucket(window_start, -1)
+            window_start += 1
+
+        node_ids = sorted(node_counts)
+        local_ids = {node_id: local_id for local_id, node_id in enumerate(node_ids)}
+        sources, targets, weights = [], [], []
+        for key, weight in edge_weights.items():
+            sources.append(local_ids[key >> 32])
+            targets.append(local_ids[key & 0xFFFFFFFF])
+            weights.append(weight)
+        yield (start * bucket_hours, (end + 1) * bucket_hours, [names[node_id] for node_id in node_ids], sources, targets, weights)
+
+def spells(buckets):
+    """
+    Merge sorted bucket numbers into (first, last) runs of consecutive buckets.
+    """
+    runs = []
+    for bucket in buckets:
+        if runs and runs[-1][1] == bucket - 1:
+            runs[-1][1] = bucket
+        else:
+            runs.append([bucket, bucket])
+    return runs
+
+def dynamic_graph(hour_graphs, bucket_hours=1):
+    """
+    Presence of every node and edge over time, for a dynamic GEXF. Returns (names, node spells, edges) where a node
+    spell is a list of (start hour, end hour) and edges are (source, target, spells, [(start hour, end hour, weight)]).
+    """
+    names, buckets = bucket_tables(hour_graphs, bucket_hours)
+    node_buckets = {}
+    edge_buckets = {}
+    for bucket in sorted(buckets):
+        nodes, edges = buckets[bucket]
+        for node_id in nodes:
+            node_buckets.setdefault(node_id, []).append(bucket)
+        for key, weight in edges.items():
+            edge_buckets.setdefault(key, []).append((bucket, weight))
+
+    node_spells = [[(first * bucket_hours, (last + 1) * bucket_hours) for first, last in spells(node_buckets[node_id])]
+                   for node_id in range(len(names))]
+    edges = []
+    for key, weights in edge_buckets.items():
+        edge_spells = [(first * bucket_hours, (last + 1) * bucket_hours) for first, last in spells([bucket for bucket, _ in weights])]
+        edges.append((key >> 32, key & 0xFFFFFFFF, edge_spells,
+                      [(bucket * bucket_hours, (bucket + 1) * bucket_hours, weight) for bucket, weight in weights]))
+    return names, node_spells, edges
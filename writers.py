@@ -0,0 +1,159 @@
+import gzip
+import json
+import time
+
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+GEXF_HEADER = """<?xml version='1.0' encoding='utf-8'?>
+<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" \
+xsi:schemaLocation="http://www.gexf.net/1.2draft http://www.gexf.net/1.2draft/gexf.xsd" version="1.2">
+"""
+# Same attribute escaping as xml.etree, which networkx uses to write GEXF
+XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"})
+
+
+def open_output(output_path, compression=None):
+    """
+    Open a text file for writing, compressed with gzip or zstd if asked. The extension of the compression is
+    added to the path. Returns (file, path).
+    """
+    output_path += COMPRESSION_EXTENSIONS[compression]
+    if compression == "gzip":
+        return gzip.open(output_path, "wt", encoding="utf-8", compresslevel=6), output_path
+    if compression == "zstd":
+        import zstandard
+        raw_file = open(output_path, "wb")
+        return zstandard.ZstdCompressor().stream_writer(raw_file, closefd=True), output_path
+    return open(output_path, "w", encoding="utf-8"), output_path
+
+def text_writer(file):
+    """
+    Write function taking str, zstd stream writers only take bytes.
+    """
+    if hasattr(file, "encoding"):
+        return file.write
+    return lambda text: file.write(text.encode("utf-8"))
+
+def escape(value):
+    return str(value).translate(XML_ESCAPES)
+
+def gexf_edge_order(sources, targets, directed):
+    """
+    Edge indexes in the order networkx writes them: grouped by the node that comes first in the node order,
+    then by insertion order. Undirected edges are written from that first node.
+    """
+    if directed:
+        return sorted(range(len(sources)), key=sources.__getitem__)
+    return sorted(range(len(sources)), key=lambda edge: min(sources[edge], targets[edge]))
+
+def write_gexf(file, names, sources, targets, weights, directed=True, compact=False, node_attributes=()):
+    """
+    Write a GEXF graph node by node and edge by edge, with the same layout as networkx.write_gexf.
+    """
+    edges = ((sources[edge], targets[edge], weights[edge]) for edge in gexf_edge_order(sources, targets, directed))
+    write_gexf_edges(file, names, edges, directed, compact, node_attributes)
+
+def write_gexf_edges(file, names, edges, directed=True, compact=False, node_attributes=()):
+    """
+    Write a GEXF graph from (source, target, weight) edges that are already in the order of gexf_edge_order.
+    node_attributes are (title, GEXF type, value of every node) of static node attributes.
+    """
+    indent = (lambda level: "") if compact else (lambda level: "\n" + "  " * level)
+    write = text_writer(file)
+
+    write(GEXF_HEADER.rstrip("\n") if not compact else GEXF_HEADER.replace("\n", ""))
+    write(f'{indent(1)}<meta lastmodifieddate="{time.strftime("%Y-%m-%d")}">{indent(2)}<creator>generadorp</creator>{indent(1)}</meta>')
+    edge_type = "directed" if directed else "undirected"
+    write(f'{indent(1)}<graph defaultedgetype="{edge_type}" mode="static" name="">')
+    # networkx writes the attributes of the nodes it has, and self-closing tags for no nodes or no edges
+    if node_attributes and names:
+        write(f'{indent(2)}<attributes mode="static" class="node">')
+        for attribute_id, (title, attribute_type, _) in enumerate(node_attributes):
+            write(f'{indent(3)}<attribute id="{attribute_id}" title="{escape(title)}" type="{attribute_type}" />')
+        write(f'{indent(2)}</attributes>')
+    write(f'{indent(2)}<nodes>' if names else f'{indent(2)}<nodes />')
+    for node, name in enumerate(names):
+        label = escape(name)
+        if not node_attributes:
+            write(f'{indent(3)}<node id="{label}" label="{label}" />')
+            continue
+        write(f'{indent(3)}<node id="{label}" label="{label}">{indent(4)}<attvalues>')
+        for attribute_id, (_, _, values) in enumerate(node_attributes):
+            write(f'{indent(5)}<attvalue for="{attribute_id}" value="{values[node]}" />')
+        write(f'{indent(4)}</attvalues>{indent(3)}</node>')
+    if names:
+        write(f'{indent(2)}</nodes>')
+
+    # Edges are a stream, <edges> is opened at the first one
+    edge_id = -1
+    for edge_id, (source, target, weight) in enumerate(edges):
+        if not edge_id:
+            write(f'{indent(2)}<edges>')
+        if not directed and target < source:
+            source, target = target, source
+        write(f'{indent(3)}<edge source="{escape(names[source])}" target="{escape(names[target])}" id="{edge_id}" weight="{weight}" />')
+    write(f'{indent(2)}<edges />' if edge_id < 0 else f'{indent(2)}</edges>')
+    write(f'{indent(1)}</graph>{indent(0)}</gexf>')
+    if not compact:
+        write("\n")
+
+def write_json_list(file, key, items, compact=False):
+    """
+    Write {key: [items]} one item at a time. The indented layout is the same as json.dump(data, file, indent=4).
+    """
+    write = text_writer(file)
+    if compact:
+        write(f"{{{json.dumps(key)}:[")
+        for index, item in enumerate(items):
+            write(("," if index else "") + json.dumps(item, separators=(",", ":")))
+        write("]}")
+        return
+
+    # Indented items are encoded chunk by chunk, a heavy hitter can hold hundreds of thousands of entries
+    encoder = json.JSONEncoder(indent=4)
+    write(f"{{\n    {json.dumps(key)}: [")
+    empty = True
+    for item in items:
+        write("\n        " if empty else ",\n        ")
+        for chunk in encoder.iterencode(item):
+            write(chunk.replace("\n", "\n        "))
+        empty = False
+    write("]\n}" if empty else "\n    ]\n}")
+
+def write_dynamic_gexf(file, names, node_spells, edges, directed=True, compact=False):
+    """
+    Write a dynamic GEXF graph. node_spells holds the (start, end) times of each node and edges are
+    (source, target, spells, [(start, end, weight)]), the weight of an edge changes over time. Times are ISO date
+    times and spells do not include their end.
+    """
+    indent = (lambda level: "") if compact else (lambda level: "\n" + "  " * level)
+    write = text_writer(file)
+
+    write(GEXF_HEADER.rstrip("\n") if not compact else GEXF_HEADER.replace("\n", ""))
+    write(f'{indent(1)}<meta lastmodifieddate="{time.strftime("%Y-%m-%d")}">{indent(2)}<creator>generadorp</creator>{indent(1)}</meta>')
+    edge_type = "directed" if directed else "undirected"
+    write(f'{indent(1)}<graph defaultedgetype="{edge_type}" mode="dynamic" timeformat="dateTime" name="">')
+    write(f'{indent(2)}<attributes class="edge" mode="dynamic">{indent(3)}<attribute id="weight" title="Weight" type="long" />{indent(2)}</attributes>')
+    write(f'{indent(2)}<nodes>' if names else f'{indent(2)}<nodes />')
+    for name, spells in zip(names, node_spells):
+        label = escape(name)
+        write(f'{indent(3)}<node id="{label}" label="{label}">{indent(4)}<spells>')
+        for start, end in spells:
+            write(f'{indent(5)}<spell start="{start}" end="{end}" endopen="true" />')
+        write(f'{indent(4)}</spells>{indent(3)}</node>')
+    if names:
+        write(f'{indent(2)}</nodes>')
+
+    write(f'{indent(2)}<edges>' if edges else f'{indent(2)}<edges />')
+    for edge_id, (source, target, spells, weights) in enumerate(edges):
+        write(f'{indent(3)}<edge source="{escape(names[source])}" target="{escape(names[target])}" id="{edge_id}">{indent(4)}<attvalues>')
+        for start, end, weight in weights:
+            write(f'{indent(5)}<attvalue for="weight" value="{weight}" start="{start}" end="{end}" endopen="true" />')
+        write(f'{indent(4)}</attvalues>{indent(4)}<spells>')
+        for start, end in spells:
+            write(f'{indent(5)}<spell start="{start}" end="{end}" endopen="true" />')
+        write(f'{indent(4)}</spells>{indent(3)}</edge>')
+    if edges:
+        write(f'{indent(2)}</edges>')
+    write(f'{indent(1)}</graph>{indent(0)}</gexf>')
+    if not compact:
+        write("\n")